@@ -0,0 +1,252 @@
+# benchmarks/bench_hot_paths.py
+"""
+Benchmarks des chemins critiques. Exécution et suivi d'une référence JSON :
+
+    pytest benchmarks --benchmark-autosave                         # enregistre dans benchmarks/.benchmarks
+    pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:25%
+"""
+import os
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.conftest import HeadlessWindow
+from core.conges.strategies import CongeAnnuelStrategy
+from utils.date_utils import get_holidays_set_for_period, jours_ouvres, invalidate_holidays_cache
+from utils.file_utils import export_agents_to_excel, export_all_conges_to_excel, export_previsions_to_excel, import_agents_from_excel
+
+
+@pytest.fixture(scope="module")
+def holidays_set(db):
+    return get_holidays_set_for_period(db, 2016, 2025)
+
+
+@pytest.fixture(scope="module")
+def sample_agent_ids(db):
+    """Agents ayant le plus de congés : ce sont eux qui coûtent le plus cher à afficher."""
+    rows = db.conn.execute("SELECT agent_id FROM conges GROUP BY agent_id ORDER BY COUNT(*) DESC, agent_id LIMIT 50").fetchall()
+    return [r[0] for r in rows]
+
+
+# --- Calculs de dates ---
+def test_jours_ouvres_one_year(benchmark, holidays_set):
+    result = benchmark(jours_ouvres, datetime(2024, 1, 1), datetime(2024, 12, 31), holidays_set)
+    assert 200 < result < 262
+
+
+def test_calculate_end_date_30_days(benchmark, holidays_set):
+    strategy = CongeAnnuelStrategy()
+    end = benchmark(strategy.calculate_end_date, datetime(2024, 7, 1), 30, holidays_set)
+    assert end > datetime(2024, 8, 1).date()
+
+
+def test_holidays_set_cold_cache(benchmark, db):
+    def load():
+        invalidate_holidays_cache()
+        return get_holidays_set_for_period(db, 2016, 2025)
+    assert benchmark(load)
+
+
+# --- Requêtes ---
+def test_get_overlapping_leaves(benchmark, db, sample_agent_ids):
+    def run():
+        return [db.get_overlapping_leaves(agent_id, datetime(2020, 1, 1), datetime(2020, 12, 31)) for agent_id in sample_agent_ids]
+    results = benchmark(run)
+    assert any(results)
+
+
+def test_agents_search(benchmark, db):
+    def run():
+        return db.get_agents(term="ben", limit=50, offset=0), db.get_agents_count(term="ben")
+    agents, count = benchmark(run)
+    assert agents and count >= len(agents)
+
+
+def test_agents_paging_middle(benchmark, db):
+    total = db.get_agents_count()
+    offset = (total // 2) // 50 * 50
+    agents = benchmark(db.get_agents, limit=50, offset=offset)
+    assert len(agents) == 50
+
+
+def test_agent_leave_years(benchmark, db, sample_agent_ids):
+    def run():
+        return [db.get_conges_for_year(agent_id, year, None) for agent_id in sample_agent_ids[:10]
+                for year, _, _ in db.get_conges_annees(agent_id)]
+    assert benchmark(run)
+
+
+def test_missing_certificates_page(benchmark, db):
+    def run():
+        return (db.get_maladies_sans_certificat(limit=101), db.count_maladies_sans_certificat(),
+                db.get_maladies_sans_certificat_par_agent())
+    rows, counts, par_agent = benchmark(run)
+    assert rows and counts[0] >= len(par_agent)
+
+
+def test_refresh_stats_loading(benchmark, db):
+    from ui.main_window import MainWindow
+    # Même chemin que le thread de fond de refresh_stats (connexion de lecture dédiée)
+    nb_agents, par_type = benchmark(MainWindow._load_stats, SimpleNamespace(db=db))
+    assert nb_agents > 0 and par_type
+
+
+def test_leave_frame_load(benchmark, db):
+    from db.leave_frame import LeaveFrame
+    frame = benchmark(LeaveFrame.load, db.conn)
+    assert len(frame) == db.conn.execute("SELECT COUNT(*) FROM conges").fetchone()[0]
+
+
+def test_leave_frame_aggregations(benchmark, db):
+    frame = db.get_leave_frame()
+    def run():
+        actifs = frame.statut(db.STATUT_ACTIF)
+        return actifs.group_by("type_id"), actifs.group_by(actifs.years()), actifs.absences_per_day(date(2020, 1, 1), date(2020, 12, 31))
+    (type_ids, counts, jours), _, par_jour = benchmark(run)
+    expected = db.conn.execute(f"SELECT type_id, COUNT(*), SUM(jours_pris) FROM conges WHERE statut_id = {db.STATUT_ACTIF} GROUP BY type_id").fetchall()
+    assert list(zip(type_ids.tolist(), counts.tolist(), jours.tolist())) == expected
+    assert len(par_jour) == 366 and par_jour.max() > 0
+
+
+def test_balance_forecast(benchmark, db, conge_manager):
+    import numpy as np
+    from core.conges.previsions import AccrualRules
+    db.get_leave_frame() # Instantané déjà en cache, comme après l'affichage des statistiques
+    target, today = date(2026, 12, 31), date(2024, 6, 15)
+    forecast = benchmark(conge_manager.forecast_soldes, target, today=today)
+    assert len(forecast) == db.get_agents_count()
+    apres = db.conn.execute(f"""SELECT COALESCE(SUM(jours_pris), 0) FROM conges WHERE statut_id = {db.STATUT_ACTIF}
+                               AND type_id IN {db.type_ids_sql('decompte_solde')} AND date_debut > ?""", (target.isoformat(),)).fetchone()[0]
+    assert forecast.apres.sum() == apres
+    if not AccrualRules.from_config().default["plafond"]: # Sans plafond : solde actuel + congés après la date + acquisitions
+        assert np.allclose(forecast.prevu, forecast.solde + forecast.apres + forecast.acquis)
+
+
+def test_certificate_scan(benchmark, db, tmp_path):
+    from core.conges.certificats import CertificateStore
+    store = CertificateStore(str(tmp_path / "magasin"))
+    for i in range(5000):
+        path = store.path_for(f"{i:064x}", ".pdf")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f: f.write(b"%PDF")
+    report = benchmark(store.scan, db)
+    assert report["nb_fichiers"] == 5000
+
+
+# --- Import / export Excel ---
+def test_export_agents(benchmark, db, headless_dialogs):
+    benchmark.pedantic(export_agents_to_excel, args=(HeadlessWindow(), db), rounds=3)
+    assert headless_dialogs["messages"][-1][0] == "showinfo"
+
+
+def test_export_all_conges(benchmark, db, headless_dialogs):
+    benchmark.pedantic(export_all_conges_to_excel, args=(HeadlessWindow(), db), rounds=3)
+    assert headless_dialogs["messages"][-1][0] == "showinfo"
+
+
+def test_import_agents(benchmark, db, headless_dialogs, tmp_path):
+    import openpyxl
+    existing = db.conn.execute("SELECT nom, prenom, ppr, grade, solde FROM agents WHERE ppr IS NOT NULL ORDER BY id LIMIT 500").fetchall()
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["nom", "prenom", "ppr", "grade", "solde"])
+    for row in existing: ws.append(list(row)) # Mises à jour
+    for i in range(500): ws.append([f"Import{i}", "Test", f"IMP{i:06d}", existing[0][3], 10]) # Ajouts
+    headless_dialogs["open"] = str(tmp_path / "import.xlsx")
+    wb.save(headless_dialogs["open"])
+
+    def reset():
+        db.execute_query("DELETE FROM agents WHERE ppr LIKE 'IMP%'")
+        db.invalidate_agent_cache()
+    benchmark.pedantic(import_agents_from_excel, args=(HeadlessWindow(), db), setup=reset, rounds=3)
+    assert headless_dialogs["messages"][-1][0] == "showinfo", headless_dialogs["messages"][-1]
+
+
+def test_import_agents_duplicates(db, headless_dialogs, tmp_path):
+    import openpyxl
+    existing = db.conn.execute("SELECT nom, prenom, ppr, grade FROM agents WHERE ppr IS NOT NULL ORDER BY id LIMIT 20").fetchall()
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["nom", "prenom", "ppr", "grade", "solde"])
+    for nom, prenom, ppr, grade in existing:
+        ws.append([nom.upper(), prenom + "e", None, grade, 10]) # Sans PPR, prénom mal saisi
+        ws.append([nom, prenom, ppr[:-1] + "X", grade, 10]) # PPR mal saisi
+    headless_dialogs["open"] = str(tmp_path / "doublons.xlsx")
+    headless_dialogs["answer"] = False # Doublons probables ignorés
+    wb.save(headless_dialogs["open"])
+    total = db.get_agents_count()
+    import_agents_from_excel(HeadlessWindow(), db)
+    kind, message = headless_dialogs["messages"][-1]
+    assert kind == "showinfo" and f"Doublons probables ignorés : {2 * len(existing)}" in message, message
+    assert headless_dialogs["messages"][-2][0] == "askyesnocancel" and db.get_agents_count() == total
+
+
+def test_duplicate_audit(benchmark, db):
+    from core.doublons import DuplicateDetector
+    rows = db.get_agents_rows()
+    originals = rows[::max(len(rows) // 50, 1)]
+    # Copies sans PPR : une lettre du prénom retirée ou ajoutée
+    injected = [(-k - 1, nom, prenom[:1] + prenom[2:] if k % 2 else prenom + "e", None, grade, solde)
+                for k, (_, nom, prenom, _, grade, solde) in enumerate(originals)]
+    detector = DuplicateDetector.from_config().index(rows + injected)
+    results = benchmark(detector.audit)
+    pairs = {(a[0], b[0]) for _, a, b, _ in results} | {(b[0], a[0]) for _, a, b, _ in results}
+    assert all((copy[0], original[0]) in pairs for copy, original in zip(injected, originals))
+
+
+def test_duplicate_find(benchmark, db):
+    from core.doublons import DuplicateDetector
+    rows = db.get_agents_rows()
+    detector = DuplicateDetector.from_config().index(rows)
+    sample = rows[::max(len(rows) // 200, 1)]
+    matches = benchmark(lambda: [detector.find(nom.lower(), prenom, None, limit=None) for _, nom, prenom, *_ in sample])
+    assert all(any(m[1][0] == row[0] for m in found) for row, found in zip(sample, matches))
+
+
+def test_export_previsions(benchmark, db, conge_manager, headless_dialogs):
+    forecast = conge_manager.forecast_soldes(date(2026, 12, 31), today=date(2024, 6, 15))
+    benchmark.pedantic(export_previsions_to_excel, args=(HeadlessWindow(), forecast, forecast.order("prevu", True)), rounds=3)
+    assert headless_dialogs["messages"][-1][0] == "showinfo", headless_dialogs["messages"][-1]
+
+
+# --- Fiches annuelles ---
+def test_annual_statements_full(benchmark, db, tmp_path):
+    from core.conges.fiches import StatementGenerator
+    generator = StatementGenerator(db, str(tmp_path), workers=2)
+    report = benchmark.pedantic(generator.generate, args=(2020,), kwargs={"complet": True}, rounds=1)
+    assert report["generes"] == report["agents"] == db.get_agents_count() and not report["erreurs"]
+
+
+def test_annual_statements_incremental(benchmark, db, tmp_path):
+    from core.conges.fiches import StatementGenerator
+    generator = StatementGenerator(db, str(tmp_path), par="grade", workers=2)
+    generator.generate(2020)
+    report = benchmark(generator.generate, 2020)
+    assert report["generes"] == 0 and report["inchanges"] == report["classeurs"]
+    agent = db.conn.execute("SELECT id, nom, prenom, ppr, grade, solde FROM agents WHERE grade IS NOT NULL ORDER BY id LIMIT 1").fetchone()
+    try:
+        db.modifier_agent(*agent[:5], agent[5] + 1)
+        report = generator.generate(2020)
+        assert report["generes"] == 1 and report["inchanges"] == report["classeurs"] - 1
+    finally:
+        db.modifier_agent(*agent)
+
+
+# --- Division / restauration ---
+def test_split_and_restore(benchmark, db, conge_manager):
+    row = db.conn.execute(f"""SELECT id FROM conges WHERE type_id = {db.type_id('Congé annuel')} AND statut_id = {db.STATUT_ACTIF}
+                             AND julianday(date_fin) - julianday(date_debut) >= 10 ORDER BY id LIMIT 1""").fetchone()
+    parent = db.get_conge_by_id(row[0])
+    debut = parent.date_debut + timedelta(days=3)
+    fin = debut + timedelta(days=2)
+    form_data = {'agent_id': parent.agent_id, 'type_conge': "Congé de maladie", 'justif': None, 'interim_id': None,
+                 'date_debut': debut.strftime('%Y-%m-%d'), 'date_fin': fin.strftime('%Y-%m-%d'), 'jours_pris': 3}
+
+    def split_and_restore():
+        conge_manager.split_or_replace_leaves([db.get_conge_by_id(parent.id)], form_data)
+        maladie_id = db.conn.execute("SELECT MAX(id) FROM conges WHERE agent_id = ? AND type_id = ?", (parent.agent_id, db.type_id('Congé de maladie'))).fetchone()[0]
+        return conge_manager.revoke_split_on_delete(maladie_id)
+
+    assert benchmark(split_and_restore)
+    assert db.get_conge_by_id(parent.id).statut == 'Actif'
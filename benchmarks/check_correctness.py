@@ -0,0 +1,460 @@
+# benchmarks/check_correctness.py
+"""
+Contrôles de résultats (et non de durée) des opérations qui modifient ou suppriment des
+données : chaque test travaille sur sa propre base (fixture fresh_db), jamais sur la base
+partagée des benchmarks.
+
+    pytest benchmarks -k correctness
+"""
+import os
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from db.models import Conge
+
+
+def _agent(db, solde=30, nom="Alaoui", prenom="Salma", ppr=None):
+    db.ajouter_agent(nom, prenom, ppr, "Administrateur", solde)
+    return db.conn.execute("SELECT MAX(id) FROM agents").fetchone()[0]
+
+
+def _conge(db, agent_id, debut, fin, jours, type_conge="Congé annuel", interim_id=None):
+    return db.ajouter_conge(Conge(None, agent_id, type_conge, None, interim_id, debut, fin, jours))
+
+
+def test_correctness_rollback_discards_cached_agent(fresh_db):
+    db = fresh_db
+    agent_id = _agent(db, solde=30)
+    cursor = db.conn.cursor()
+    db._ajouter_conge_no_commit(cursor, Conge(None, agent_id, "Congé annuel", None, None, "2024-03-04", "2024-03-08", 5))
+    assert db.get_agent_by_id(agent_id).solde == 25 # Relu dans la transaction : valeur non validée
+    db.rollback()
+    assert db.get_agent_by_id(agent_id).solde == 30
+
+
+def test_correctness_cached_agent_is_a_copy(fresh_db):
+    db = fresh_db
+    agent_id = _agent(db, solde=30)
+    db.get_agent_by_id(agent_id).solde = 0
+    assert db.get_agent_by_id(agent_id).solde == 30
+
+
+# --- Jours fériés : recalcul des congés en jours ouvrés ---
+@pytest.fixture
+def manager(fresh_db, tmp_path):
+    from core.conges.manager import CongeManager
+    return CongeManager(fresh_db, str(tmp_path / "certificats"))
+
+
+def test_correctness_holiday_added_then_removed(fresh_db, manager):
+    from core.events import JoursPrisRecalcules
+    from utils.date_utils import get_holidays_set_for_period, jours_ouvres, validate_date
+    db, rapports = fresh_db, []
+    db.events.subscribe(JoursPrisRecalcules, rapports.append)
+    jours = jours_ouvres(validate_date("2024-03-04"), validate_date("2024-03-15"), get_holidays_set_for_period(db, 2024, 2024))
+    agent_id = _agent(db, solde=30)
+    conge_id = _conge(db, agent_id, "2024-03-04", "2024-03-15", jours)
+    manuel_id = _conge(db, agent_id, "2024-03-18", "2024-03-22", 3) # Durée saisie à la main
+    assert db.get_agent_by_id(agent_id).solde == 30 - jours - 3
+
+    db.add_holiday("2024-03-11", "Test", "Personnalisé")
+    assert db.get_conge_by_id(conge_id).jours_pris == jours - 1
+    assert db.get_agent_by_id(agent_id).solde == 30 - jours - 3 + 1
+    assert rapports[-1].agents == ((agent_id, 1, -1),) and not rapports[-1].ignores
+
+    db.add_holiday("2024-03-19", "Test", "Personnalisé")
+    assert db.get_conge_by_id(manuel_id).jours_pris == 3
+    assert rapports[-1].ignores == ((agent_id, manuel_id, "durée saisie manuellement"),)
+
+    db.delete_holiday("2024-03-11")
+    assert db.get_conge_by_id(conge_id).jours_pris == jours
+    assert db.get_agent_by_id(agent_id).solde == 30 - jours - 3
+
+
+def test_correctness_holiday_removed_without_balance(fresh_db, manager):
+    from core.events import JoursPrisRecalcules
+    db, rapports = fresh_db, []
+    db.events.subscribe(JoursPrisRecalcules, rapports.append)
+    db.add_holiday("2024-03-11", "Test", "Personnalisé")
+    agent_id = _agent(db, solde=4)
+    conge_id = _conge(db, agent_id, "2024-03-11", "2024-03-15", 4)
+    assert db.get_agent_by_id(agent_id).solde == 0
+
+    db.delete_holiday("2024-03-11") # Un jour de plus à décompter, solde nul : rien n'est modifié, le congé est signalé
+    assert db.get_conge_by_id(conge_id).jours_pris == 4
+    assert db.get_agent_by_id(agent_id).solde == 0
+    assert rapports[-1].ignores == ((agent_id, conge_id, "solde insuffisant"),)
+
+
+# --- Certificats : fichier dédoublonné pendant une copie en cours ---
+def test_correctness_pending_certificate_survives_release(fresh_db, manager, tmp_path):
+    db = fresh_db
+    source = tmp_path / "certificat.pdf"
+    source.write_bytes(b"%PDF certificat")
+    agent_id = _agent(db)
+    premier = _conge(db, agent_id, "2024-03-04", "2024-03-05", 2, "Congé de maladie")
+    second = _conge(db, agent_id, "2024-04-01", "2024-04-02", 2, "Congé de maladie")
+    manager._attach_certificat(premier, 2, manager._store_certificat(str(source)))
+
+    stored = manager._store_certificat(str(source)) # Copie en fond terminée, ligne pas encore enregistrée
+    chemin = stored[1]
+    db.supprimer_conge(premier) # Dernière référence libérée entre-temps
+    assert os.path.exists(chemin)
+    manager._attach_certificat(second, 2, stored)
+    assert db.get_certificat_for_conge(second)[4] == chemin and os.path.exists(chemin)
+
+    db.supprimer_conge(second)
+    assert not os.path.exists(chemin)
+
+
+def test_correctness_quarantine_rechecks_orphans(fresh_db, manager, tmp_path, monkeypatch):
+    from core.conges.certificats import CertificateStore
+    db = fresh_db
+    monkeypatch.setattr(CertificateStore, "GRACE_SECONDS", 0)
+    agent_id = _agent(db)
+    conge_id = _conge(db, agent_id, "2024-03-04", "2024-03-05", 2, "Congé de maladie")
+    chemins = {}
+    for name in ("orphelin", "reutilise", "epingle"):
+        (tmp_path / f"{name}.pdf").write_bytes(name.encode())
+        chemins[name] = manager._store_certificat(str(tmp_path / f"{name}.pdf"))
+        db.unpin_certificat(chemins[name][0]) # Copies abandonnées : aucune ligne ne les référence
+    store = CertificateStore(manager.certificats_dir)
+    orphelins = [path for path, _ in store.scan(db)["orphelins"]]
+    assert sorted(orphelins) == sorted(os.path.normcase(os.path.abspath(c[1])) for c in chemins.values())
+
+    # Pendant la confirmation : une copie en fond réutilise un fichier et l'enregistre, une autre l'épingle
+    manager._attach_certificat(conge_id, 2, manager._store_certificat(str(tmp_path / "reutilise.pdf")))
+    db.pin_certificat(chemins["epingle"][0])
+    assert store.quarantine(orphelins, db) == 1
+    assert not os.path.exists(chemins["orphelin"][1])
+    assert os.path.exists(chemins["reutilise"][1]) and os.path.exists(chemins["epingle"][1])
+    assert db.get_certificat_for_conge(conge_id)[4] == chemins["reutilise"][1]
+
+
+def test_correctness_sha256_column_added_by_migration(tmp_path):
+    from db.database import DatabaseManager
+    from db.migrations import migrate
+    path = str(tmp_path / "ancienne.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE certificats_medicaux (id INTEGER PRIMARY KEY, conge_id INTEGER NOT NULL UNIQUE, nom_medecin TEXT, duree_jours INTEGER, chemin_fichier TEXT NOT NULL)")
+    conn.close()
+    db = DatabaseManager(path)
+    assert db.connect()
+    try:
+        db.create_db_tables()
+        migrate(db)
+        assert "sha256" in {row[1] for row in db.conn.execute("PRAGMA table_info(certificats_medicaux)")}
+        assert db.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_certificats_sha256'").fetchone()
+    finally:
+        db.close()
+
+
+# --- Sauvegardes ---
+def _dump(db_file):
+    conn = sqlite3.connect(db_file)
+    try:
+        return {table: conn.execute(f"SELECT * FROM {table} ORDER BY 1").fetchall() for table in ("agents", "conges", "jours_feries_personnalises")}
+    finally:
+        conn.close()
+
+
+def test_correctness_backup_restore_roundtrip(fresh_db, tmp_path):
+    from db.backup import BackupManager
+    db = fresh_db
+    agent_id = _agent(db, solde=30)
+    _conge(db, agent_id, "2024-03-04", "2024-03-08", 5)
+    db.add_holiday("2024-05-02", "Test", "Personnalisé")
+    backups = BackupManager(db.db_file, str(tmp_path / "sauvegardes"), pages=1, sleep=0)
+    saved = _dump(db.db_file)
+    path = backups.create_backup()
+    assert backups.verify(path) == (True, "Sauvegarde intègre.")
+
+    _conge(db, agent_id, "2024-06-03", "2024-06-04", 2) # Modifications postérieures à la sauvegarde
+    db.supprimer_agent(_agent(db, nom="Tazi", ppr="X1"))
+    modified = _dump(db.db_file)
+    db.close()
+    previous = backups.restore(path)
+    assert _dump(db.db_file) == saved
+    assert _dump(previous) == modified # L'ancienne base est conservée à côté
+
+
+def test_correctness_restore_refuses_altered_backup(fresh_db, tmp_path):
+    from db.backup import BackupManager
+    db = fresh_db
+    _agent(db)
+    backups = BackupManager(db.db_file, str(tmp_path / "sauvegardes"), sleep=0)
+    path = backups.create_backup()
+    with open(path, "r+b") as f:
+        f.seek(20); f.write(b"\x00\x01\x02")
+    assert not backups.verify(path)[0]
+    before = _dump(db.db_file)
+    with pytest.raises(ValueError):
+        backups.restore(path)
+    assert _dump(db.db_file) == before
+
+
+def test_correctness_backup_gives_up_when_restarted(fresh_db, tmp_path):
+    from db.backup import BackupManager, BackupRestarted
+    db = fresh_db
+    for i in range(50): _agent(db, nom=f"Agent{i}", prenom="X" * 500, ppr=f"P{i}")
+    backups = BackupManager(db.db_file, str(tmp_path / "sauvegardes"), pages=1, sleep=0)
+    steps = []
+
+    def write_between_steps(done, total): # Un agent enregistre à chaque pas : la copie recommence
+        steps.append(done)
+        db.conn.execute("UPDATE agents SET solde = solde + 1 WHERE id = 1"); db.commit()
+    with pytest.raises(BackupRestarted):
+        backups.create_backup(progress=write_between_steps)
+    assert len(steps) > BackupManager.MAX_RESTARTS
+    assert os.listdir(backups.backup_dir) == [] # Ni sauvegarde partielle ni fichier temporaire
+    assert backups.last_backup_time() is None # Reprise à la prochaine vérification du planificateur
+
+
+def test_correctness_backup_includes_archives(fresh_db, tmp_path):
+    import shutil
+    from db.backup import BackupManager
+    from db.database import DatabaseManager
+    db = fresh_db
+    agent_id = _agent(db)
+    archived = _conge(db, agent_id, "2023-03-06", "2023-03-10", 5)
+    db.archive_year(2023)
+    backups = BackupManager(db.db_file, str(tmp_path / "sauvegardes"), sleep=0, archive_dir=db.archive_dir)
+    path = backups.create_backup()
+    [(name, copy)] = backups.list_archive_backups()
+    assert name == "archive_2023.db" and backups.verify_archives() == [(name, True, "Sauvegarde intègre.")]
+    saved_at = os.path.getmtime(copy)
+    backups.create_backup() # Archive inchangée : pas de nouvelle copie
+    assert backups.list_archive_backups() == [(name, copy)] and os.path.getmtime(copy) == saved_at
+
+    db.close()
+    shutil.rmtree(db.archive_dir) # Perte du dossier des archives
+    backups.restore(path)
+    restored = DatabaseManager(db.db_file)
+    assert restored.connect()
+    try:
+        assert [c.id for c, _ in restored.get_conges_for_year(agent_id, 2023)] == [archived]
+    finally:
+        restored.close()
+
+    with open(copy, "r+b") as f:
+        f.seek(20); f.write(b"\x00\x01\x02")
+    assert not backups.verify_archives()[0][1]
+
+
+def test_correctness_backup_rotation(tmp_path):
+    from datetime import datetime, timedelta
+    from db.backup import BackupManager
+    backups = BackupManager(str(tmp_path / "conges.db"), str(tmp_path), daily=3, weekly=2)
+    start = datetime(2025, 1, 1, 8)
+    for day in range(30):
+        for hour in (0, 6): # Deux sauvegardes par jour
+            (tmp_path / f"conges-{(start + timedelta(days=day, hours=hour)):%Y%m%d-%H%M%S}.db.gz").write_bytes(b"")
+    backups.rotate()
+    kept = [when for when, _ in backups.list_backups()]
+    last = start + timedelta(days=29, hours=6)
+    assert kept[0] == last and len(kept) == len(set(kept))
+    assert {when.date() for when in kept} >= {(last - timedelta(days=d)).date() for d in range(3)}
+    assert all(when.hour == 14 for when in kept) # Seule la plus récente de chaque jour ou semaine est conservée
+    assert len(kept) <= 3 + 2
+
+
+# --- Entretien ---
+def test_correctness_maintenance_reclaims_space_and_records_run(fresh_db):
+    from db.maintenance import MaintenanceManager
+    db = fresh_db
+    ids = [_agent(db, nom=f"Agent{i}", prenom="X" * 200, ppr=f"P{i}") for i in range(300)]
+    for agent_id in ids: db.supprimer_agent(agent_id)
+    free_pages = db.conn.execute("PRAGMA freelist_count").fetchone()[0]
+    assert free_pages > 0
+    maintenance = MaintenanceManager(db.db_file)
+    assert maintenance.last_run() is None and maintenance.is_due(24) # Jamais exécuté : dû dès la première inactivité
+
+    report = maintenance.run(budget_seconds=30)
+    assert report["optimize"] == "ok" and report["check"] == "ok"
+    assert int(report["vacuum"].split()[0]) > 0 and report["libre_apres"] == 0 # ANALYZE réutilise une partie des pages libres
+    assert report["recupere"] > 0
+    # Date enregistrée dans la base : relue par une autre instance (session suivante de l'application)
+    again = MaintenanceManager(db.db_file)
+    assert again.last_run() is not None and not again.is_due(24) and again.is_due(0)
+
+
+def test_correctness_maintenance_out_of_budget_not_recorded(fresh_db):
+    from db.maintenance import MaintenanceManager
+    maintenance = MaintenanceManager(fresh_db.db_file)
+    report = maintenance.run(budget_seconds=0)
+    assert all(report[step] == "non exécuté (délai écoulé)" for step in MaintenanceManager.STEPS)
+    assert maintenance.last_run() is None
+
+
+# --- Archivage ---
+def test_correctness_archive_keeps_cross_year_leave_checked(fresh_db):
+    from datetime import date
+    db = fresh_db
+    agent_id, interim_id = _agent(db, solde=30), _agent(db, nom="Tazi", ppr="X1")
+    inside = _conge(db, agent_id, "2023-03-06", "2023-03-10", 5)
+    cross = _conge(db, agent_id, "2023-12-26", "2024-01-05", 8, interim_id=interim_id)
+    assert db.archive_year(2023) == 1
+    assert db.conn.execute("SELECT id FROM main.conges ORDER BY id").fetchall() == [(cross,)]
+
+    # Le congé à cheval sur janvier 2024 bloque toujours un chevauchement et son intérimaire
+    assert [c.id for c in db.get_overlapping_leaves(agent_id, date(2024, 1, 3), date(2024, 1, 4))] == [cross]
+    assert not db.is_agent_disponible(agent_id, date(2024, 1, 2), date(2024, 1, 2))
+    assert not db.is_agent_disponible(interim_id, date(2024, 1, 2), date(2024, 1, 8))
+    assert interim_id not in [a.id for a in db.get_agents_disponibles(date(2024, 1, 2), date(2024, 1, 8))]
+    # L'historique de 2023 montre les deux congés, archivé ou non
+    assert [c.id for c, _ in db.get_conges_for_year(agent_id, 2023)] == [inside, cross]
+    assert [c.id for c in db.get_conges(agent_id)] == [cross, inside]
+    assert db.get_conges_annees(agent_id) == [(2023, 2, 13)]
+
+
+# --- Compactage de l'historique ---
+def _split(db, manager, conge_id, debut, fin):
+    parent = db.get_conge_by_id(conge_id)
+    form_data = {'agent_id': parent.agent_id, 'type_conge': "Congé exceptionnel", 'justif': None, 'interim_id': None,
+                 'date_debut': debut, 'date_fin': fin, 'jours_pris': 2}
+    assert manager.split_or_replace_leaves([parent], form_data)
+    return db.get_overlapping_leaves(parent.agent_id, datetime.strptime(debut, "%Y-%m-%d"), datetime.strptime(debut, "%Y-%m-%d"))[0].id
+
+
+def test_correctness_compaction_keeps_history_and_recent_chains(fresh_db, manager):
+    from datetime import timedelta
+    from core.events import HistoriqueCompacte
+    from db.database import DatabaseManager
+    db = fresh_db
+    agent_id = _agent(db, solde=30)
+    old = _conge(db, agent_id, "2023-03-06", "2023-03-17", 10)
+    _split(db, manager, old, "2023-03-08", "2023-03-09")
+    recent_start = datetime.now().date() - timedelta(days=20)
+    recent = _conge(db, agent_id, str(recent_start), str(recent_start + timedelta(days=9)), 8)
+    exceptionnel = _split(db, manager, recent, str(recent_start + timedelta(days=3)), str(recent_start + timedelta(days=4)))
+    rows_2023 = [(c.id, c.statut) for c, _ in db.get_conges_for_year(agent_id, 2023)]
+    assert (old, "Annulé") in rows_2023 and len(rows_2023) == 4
+
+    # Compactage sur une connexion propre, comme la tâche de fond de l'entretien
+    background = DatabaseManager(db.db_file)
+    assert background.connect()
+    events = []
+    background.events.subscribe(HistoriqueCompacte, events.append)
+    try:
+        assert manager.compacter_historique(db=background) == (1, 1)
+    finally:
+        background.close()
+    assert events == [HistoriqueCompacte((agent_id,), 1, 1)]
+
+    # Le parent annulé de 2023 n'est plus restaurable mais reste visible dans l'historique et les exports
+    assert db.get_conge_by_id(old) is None
+    assert [(c.id, c.statut) for c, _ in db.get_conges_for_year(agent_id, 2023)] == [r for r in rows_2023 if r[0] != old]
+    [(_, compacte)] = db.get_historique_compacte(agent_id, 2023)
+    assert (compacte.id, compacte.statut, compacte.type_conge, compacte.jours_pris) == (None, db.STATUT_COMPACTE, "Congé annuel", 10)
+    assert compacte.date_debut == datetime(2023, 3, 6) and compacte.date_fin == datetime(2023, 3, 17)
+    assert [c for _, c in db.get_historique_compacte()][0].justif.endswith("(1 congé(s) annulé(s))")
+    assert dict((annee, nb) for annee, nb, _ in db.get_conges_annees(agent_id))[2023] == 4
+    # La division récente est intacte : sa suppression restaure toujours le congé d'origine
+    assert manager.revoke_split_on_delete(exceptionnel)
+    assert [c.id for c in db.get_overlapping_leaves(agent_id, datetime.combine(recent_start, datetime.min.time()), datetime.now())] == [recent]
+
+
+# --- Statistiques ---
+def test_correctness_stats_same_with_and_without_snapshot(fresh_db):
+    db = fresh_db
+    agent_id = _agent(db, solde=30)
+    _conge(db, agent_id, "2024-03-04", "2024-03-08", 5)
+    _conge(db, agent_id, "2024-04-01", "2024-04-02", 2, type_conge="Congé exceptionnel")
+    db.get_leave_frame()
+    assert db.get_conges_stats() == (1, [("Congé annuel", 1, 5), ("Congé exceptionnel", 1, 2)])
+    _conge(db, agent_id, "2024-05-06", "2024-05-07", 2) # Après une écriture : agrégat SQL, instantané non relu
+    frame = db._leave_frame
+    assert db.get_conges_stats() == (1, [("Congé annuel", 2, 7), ("Congé exceptionnel", 1, 2)])
+    assert db._leave_frame is frame
+
+
+# --- Fiches annuelles ---
+def test_correctness_fiches_data_unchanged_by_archiving(fresh_db, manager):
+    db = fresh_db
+    agent_id, interim_id = _agent(db, solde=60), _agent(db, nom="Tazi", ppr="X1")
+    _conge(db, agent_id, "2023-02-06", "2023-02-10", 5, interim_id=interim_id)
+    split = _conge(db, agent_id, "2022-12-26", "2023-01-13", 14)
+    _split(db, manager, split, "2023-01-04", "2023-01-05") # Chaîne de division à cheval sur 2022 : reste dans la base principale
+    maladie = _conge(db, agent_id, "2023-06-05", "2023-06-07", 3, type_conge="Congé de maladie")
+    db.conn.execute("INSERT INTO certificats_medicaux (conge_id, nom_medecin, duree_jours, chemin_fichier) VALUES (?, 'Dr Test', 3, 'cert.pdf')", (maladie,))
+    db.commit()
+    _conge(db, agent_id, "2023-12-26", "2024-01-05", 8) # À cheval sur 2024 : reste aussi
+    before = db.get_fiches_annuelles_data(2023)
+    assert len(before[2]) == 5 and sum(row[8] for row in before[2]) == 1
+
+    assert db.archive_year(2023) == 2
+    after = db.get_fiches_annuelles_data(2023)
+    assert after == before
+    conn = db.open_reader_connection() # Même lecture depuis une connexion de thread de fond
+    try:
+        assert db.get_fiches_annuelles_data(2023, conn) == before
+    finally:
+        conn.close()
+
+
+def test_correctness_fiches_incremental_generation(fresh_db, tmp_path):
+    import os
+    from core.conges.fiches import StatementGenerator
+    db = fresh_db
+    ids = [_agent(db, nom=f"Agent{i}", ppr=f"P{i}") for i in range(3)]
+    conge_id = _conge(db, ids[0], "2024-03-04", "2024-03-08", 5)
+    _conge(db, ids[1], "2024-04-01", "2024-04-02", 2, interim_id=ids[2])
+    generator = StatementGenerator(db, str(tmp_path / "fiches"), workers=1)
+    files = lambda: sorted(f for f in os.listdir(generator.year_dir(2024)) if f.endswith(".xlsx"))
+
+    first = generator.generate(2024)
+    assert (first["generes"], first["inchanges"], first["erreurs"]) == (3, 0, []) and len(files()) == 3
+    assert generator.generate(2024)["generes"] == 0 # Rien n'a changé
+
+    db.modifier_conge(conge_id, Conge(None, ids[0], "Congé annuel", None, None, "2024-03-04", "2024-03-07", 4))
+    second = generator.generate(2024)
+    assert (second["generes"], second["inchanges"]) == (1, 2)
+    db.supprimer_agent(ids[1]) # Son congé disparaît : la fiche de son intérimaire change aussi
+    third = generator.generate(2024)
+    assert (third["generes"], third["inchanges"], third["supprimes"]) == (1, 1, 1) and len(files()) == 2
+    assert generator.generate(2024, complet=True)["generes"] == 2
+
+
+def test_correctness_fiches_failed_rewrite_keeps_previous_file(fresh_db, tmp_path, monkeypatch):
+    from core.conges import fiches
+    db = fresh_db
+    ids = [_agent(db, nom=f"Agent{i}", ppr=f"P{i}") for i in range(2)]
+    generator = fiches.StatementGenerator(db, str(tmp_path / "fiches"), workers=1)
+    assert generator.generate(2024)["generes"] == 2
+    previous = {key: entry["fichier"] for key, entry in generator._load_manifest(2024)["fiches"].items()}
+
+    db.modifier_agent(ids[0], "Agent0", "Salma", "P0", None, 12) # Solde modifié : fiche à refaire
+    write = fiches._write_workbook
+    def failing(path, *args):
+        raise PermissionError("fichier ouvert dans Excel")
+    monkeypatch.setattr(fiches, "_write_workbook", failing)
+    report = generator.generate(2024)
+    assert (report["generes"], report["supprimes"], len(report["erreurs"])) == (0, 0, 1)
+    assert os.path.exists(os.path.join(generator.year_dir(2024), previous[str(ids[0])])) # L'ancienne fiche reste en place
+    assert generator._load_manifest(2024)["fiches"][str(ids[0])]["fichier"] == previous[str(ids[0])]
+
+    monkeypatch.setattr(fiches, "_write_workbook", write)
+    report = generator.generate(2024) # Refaite au passage suivant (ancienne empreinte)
+    assert (report["generes"], report["inchanges"], report["supprimes"], report["erreurs"]) == (1, 1, 0, [])
+
+
+# --- Profilage SQL ---
+def test_correctness_slow_executemany_is_recorded(tmp_path):
+    from db.instrumentation import QueryProfiler, connect
+    profiler = QueryProfiler(enabled=True, slow_query_ms=0) # Tout est « lent »
+    conn = connect(str(tmp_path / "profil.db"), profiler)
+    try:
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v INTEGER)")
+        conn.executemany("INSERT INTO t (id, v) VALUES (?, ?)", ((i, i) for i in range(100)))
+        conn.executemany("UPDATE t SET v = v + 1 WHERE id = ?", [(i,) for i in range(0, 100, 2)])
+        conn.commit()
+        assert conn.execute("SELECT SUM(v) FROM t").fetchone()[0] == sum(range(100)) + 50
+    finally:
+        conn.close()
+    slow = {entry["sql"]: entry for entry in profiler.report()[1]}
+    update = slow["UPDATE t SET v = v + ? WHERE id = ?"]
+    assert update["executions"] == 50 and any("USING INTEGER PRIMARY KEY" in step for step in update["plan"])
+    assert slow["INSERT INTO t (id, v) VALUES (?, ?)"]["executions"] == 100
+    assert "executions" not in slow["SELECT SUM(v) FROM t"]
@@ -0,0 +1,318 @@
+# benchmarks/check_query_plans.py
+"""
+Garde-fou sur les plans d'exécution : chaque scénario appelle DatabaseManager / CongeManager
+sur la base peuplée des benchmarks, toutes les requêtes émises sont capturées
+(set_trace_callback, paramètres inclus) puis passées à EXPLAIN QUERY PLAN.
+Un parcours complet de conges, agents ou jours_feries_personnalises fait échouer le scénario :
+"SCAN conges" sans index, ou parcours intégral d'un index ("SCAN conges USING INDEX ...") hors
+requête bornée par LIMIT (pagination dans l'ordre de l'index). Les parcours inhérents à une
+requête figurent dans ALLOWED_SCANS (motif de la seule requête concernée) avec leur justification.
+Chaque méthode publique des deux classes doit être appelée par un scénario, sauf celles de
+UNCHECKED_METHODS ; les scénarios qui suppriment ou archivent travaillent sur une copie de la base.
+
+    pytest benchmarks -k query_plan
+"""
+import functools
+import inspect
+import os
+import re
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+from core.conges.manager import CongeManager
+from db.database import DatabaseManager
+from db.instrumentation import normalize_sql
+from db.models import Conge
+
+GUARDED_TABLES = {"conges", "agents", "jours_feries_personnalises"}
+_RE_SCAN = re.compile(r"^SCAN (\w+)( USING (?:COVERING )?INDEX \w+)?$")
+_RE_LIMIT = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+_RE_TABLE_ALIAS = re.compile(r"\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+# Objets qui n'existent que le temps d'une opération (table temporaire, archive attachée puis détachée)
+_RE_TRANSIENT = re.compile(r"\b(?:temp|archive_\d{4}|archive_fiches)\.", re.IGNORECASE)
+_SQL_KEYWORDS = {"where", "set", "order", "group", "limit", "join", "left", "inner", "on", "values", "select", "union"}
+
+# Requêtes dont le parcours complet est inhérent : motif (re.search sur la requête normalisée) -> justification.
+# Seule la requête concernée est tolérée ; les autres requêtes du même scénario restent contrôlées.
+ALLOWED_SCANS = {
+    r"\(LOWER\(nom\) LIKE \?": "LIKE '%terme%' : aucun index ne peut servir un motif commençant par %",
+    r"^SELECT COUNT\(\*\) FROM agents$": "COUNT(*) sans filtre : parcours de l'index le plus petit",
+    r"^SELECT id, nom, prenom, ppr, grade, solde FROM agents ORDER BY id$": "Tous les agents (prévision des soldes, fiches annuelles)",
+    r"^SELECT id, agent_id, type_id, justif, interim_id, date_debut, date_fin, jours_pris, statut_id FROM conges ORDER BY date_debut DESC$":
+        "Export complet : toutes les lignes sont lues",
+    r"^SELECT id, agent_id, type_id, CAST\(julianday\(date_debut\).* FROM conges ORDER BY id$": "Instantané colonnaire : tous les congés sont lus",
+    r"GROUP BY c\.agent_id\) m JOIN agents a": "Agrégat par agent de tous les congés de maladie actifs sans certificat",
+    r"^SELECT t\.libelle, s\.nb, s\.jours FROM \(SELECT type_id, COUNT\(\*\) AS nb": "Statistiques après écriture : agrégat de tous les congés actifs (index partiel)",
+    r"^SELECT id, agent_id, date_debut, date_fin, jours_pris, type_id FROM conges c WHERE statut_id = \? AND type_id IN":
+        "Compactage (tâche de fond) : congés annulés, sur l'index partiel qui leur est réservé",
+}
+
+# Méthodes publiques sans requête propre sur les tables surveillées (aucun scénario requis)
+UNCHECKED_METHODS = {
+    "DatabaseManager.connect": "Connexion",
+    "DatabaseManager.open_reader_connection": "Connexion",
+    "DatabaseManager.close": "Connexion",
+    "DatabaseManager.write_query_report": "Rapport du profilage, sans requête",
+    "DatabaseManager.get_agent_cache_stats": "Compteurs du cache, sans requête",
+    "DatabaseManager.rollback": "Transaction, sans requête propre",
+    "DatabaseManager.release_certificat_file": "Mise en attente jusqu'au commit (voir count_certificat_references)",
+    "DatabaseManager.pin_certificat": "Épinglage en mémoire, sans requête",
+    "DatabaseManager.unpin_certificat": "Épinglage en mémoire, sans requête",
+    "DatabaseManager.create_db_tables": "Schéma (DDL), au démarrage",
+    "DatabaseManager.create_conges_indexes": "Schéma (DDL), au démarrage",
+    "DatabaseManager.create_reference_tables": "Schéma (DDL), au démarrage",
+    "CongeManager.set_ui": "Rattachement de la fenêtre, sans requête",
+}
+
+class QueryCollector:
+    """Capture les requêtes exécutées sur une connexion, avec leurs paramètres substitués."""
+    def __init__(self, conn):
+        self.conn = conn
+        self.statements = []
+
+    def __enter__(self):
+        self.conn.set_trace_callback(self.statements.append)
+        return self
+
+    def __exit__(self, *exc):
+        self.conn.set_trace_callback(None)
+
+
+def table_aliases(sql):
+    """Correspondance nom ou alias -> table, d'après les clauses FROM/JOIN/UPDATE/INTO."""
+    aliases = {}
+    for table, alias in _RE_TABLE_ALIAS.findall(sql):
+        aliases[table.lower()] = table.lower()
+        if alias and alias.lower() not in _SQL_KEYWORDS:
+            aliases[alias.lower()] = table.lower()
+    return aliases
+
+
+def full_scans(conn, sql):
+    """Parcours complets de tables surveillées effectués par la requête (lignes du plan concernées)."""
+    if not sql.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT", "REPLACE", "WITH")):
+        return []
+    plan = [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()]
+    aliases = table_aliases(sql)
+    bounded = bool(_RE_LIMIT.search(sql))
+    scans = []
+    for detail in plan:
+        match = _RE_SCAN.match(detail)
+        if not match or aliases.get(match.group(1).lower(), match.group(1).lower()) not in GUARDED_TABLES: continue
+        if match.group(2) is None or not bounded:
+            scans.append(detail)
+    return scans
+
+
+@pytest.fixture(scope="module")
+def sample(db):
+    """Valeurs réelles de la base : un agent chargé, un de ses congés annuels longs, un PPR."""
+    conge_id, agent_id = db.conn.execute(f"""SELECT id, agent_id FROM conges WHERE type_id = {db.type_id('Congé annuel')} AND statut_id = {db.STATUT_ACTIF}
+                                            AND julianday(date_fin) - julianday(date_debut) >= 10 ORDER BY id DESC LIMIT 1""").fetchone()
+    ppr = db.conn.execute("SELECT ppr FROM agents WHERE ppr IS NOT NULL ORDER BY id LIMIT 1").fetchone()[0]
+    grade = db.conn.execute("SELECT grade FROM agents LIMIT 1").fetchone()[0]
+    return {"agent_id": agent_id, "conge_id": conge_id, "ppr": ppr, "grade": grade,
+            "debut": datetime(2020, 3, 1), "fin": datetime(2020, 3, 31)}
+
+
+@pytest.fixture(scope="module")
+def db_copy(db, tmp_path_factory):
+    """Copie de la base partagée pour les scénarios qui suppriment ou archivent : mêmes données, donc mêmes plans."""
+    path = str(tmp_path_factory.mktemp("plans") / "copie.db")
+    target = sqlite3.connect(path)
+    db.conn.backup(target)
+    target.close()
+    copy = DatabaseManager(path)
+    assert copy.connect()
+    yield copy
+    copy.close()
+
+
+@pytest.fixture(scope="module")
+def copy_manager(db_copy, tmp_path_factory):
+    return CongeManager(db_copy, str(tmp_path_factory.mktemp("certificats_copie")))
+
+
+@pytest.fixture(scope="module")
+def called_methods():
+    """Méthodes publiques de DatabaseManager et CongeManager appelées par les scénarios (appels internes compris)."""
+    called = set()
+    def spy(cls, name, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            called.add(f"{cls.__name__}.{name}")
+            return func(*args, **kwargs)
+        return wrapper
+    with pytest.MonkeyPatch.context() as mp:
+        for cls in (DatabaseManager, CongeManager):
+            for name, func in list(vars(cls).items()):
+                if inspect.isfunction(func) and not name.startswith("_"): mp.setattr(cls, name, spy(cls, name, func))
+        yield called
+
+
+@pytest.fixture
+def auto_confirm(monkeypatch):
+    """Confirmations de CongeManager acceptées, messages ignorés."""
+    import core.conges.manager as manager_module
+    monkeypatch.setattr(manager_module.messagebox, "askyesno", lambda *args, **kwargs: True)
+    for name in ("showinfo", "showwarning", "showerror"):
+        monkeypatch.setattr(manager_module.messagebox, name, lambda *args, **kwargs: None)
+
+
+def _split_and_restore(db, manager, s):
+    parent = db.get_conge_by_id(s["conge_id"])
+    debut = parent.date_debut + timedelta(days=3)
+    form_data = {'agent_id': parent.agent_id, 'type_conge': "Congé de maladie", 'justif': None, 'interim_id': None,
+                 'date_debut': debut.strftime('%Y-%m-%d'), 'date_fin': (debut + timedelta(days=1)).strftime('%Y-%m-%d'), 'jours_pris': 2}
+    manager.split_or_replace_leaves([parent], form_data)
+    maladie = db.get_overlapping_leaves(parent.agent_id, debut, debut)
+    manager.revoke_split_on_delete(maladie[0].id)
+
+
+def _conge_cycle(db, manager, s):
+    """Ajout, modification puis suppression d'un congé sur une période libre."""
+    conge = Conge(None, s["agent_id"], "Congé exceptionnel", None, None, "2031-05-05", "2031-05-06", 2)
+    conge_id = db.ajouter_conge(conge)
+    conge_id = db.modifier_conge(conge_id, Conge(None, s["agent_id"], "Congé exceptionnel", None, None, "2031-05-05", "2031-05-07", 3))
+    db.supprimer_conge(conge_id)
+
+
+def _conge_form(db, manager, s):
+    """Saisie par le formulaire (contrôles de disponibilité et de chevauchement), puis suppression confirmée."""
+    form_data = {'agent_id': s["agent_id"], 'type_conge': "Congé exceptionnel", 'justif': None, 'interim_id': s["agent_id"] - 1,
+                 'date_debut': "2031-06-02", 'date_fin': "2031-06-03", 'jours_pris': 2}
+    assert manager.handle_conge_submission(form_data, False)
+    conge_id = db.get_overlapping_leaves(s["agent_id"], datetime(2031, 6, 2), datetime(2031, 6, 2))[0].id
+    manager.delete_conge_with_confirmation(conge_id)
+
+
+def _agent_cycle(db, manager, s):
+    manager.save_agent({'nom': "Plan", 'prenom': "Requête", 'ppr': "PLAN-0001", 'grade': s["grade"], 'solde': 10})
+    agent = db.get_agent_by_ppr("PLAN-0001")
+    manager.save_agent({'id': agent.id, 'nom': "Plan", 'prenom': "Requête", 'ppr': "PLAN-0001", 'grade': s["grade"], 'solde': 12}, is_modification=True)
+    manager.delete_agent_with_confirmation(agent.id, agent.nom)
+    db.ajouter_agent("Plan", "Requête", "PLAN-0002", s["grade"], 0)
+    db.supprimer_agent(db.get_agent_by_ppr("PLAN-0002").id)
+
+
+def _holiday_cycle(db, manager, s):
+    """Jour férié ajouté puis retiré : recalcul des congés en jours ouvrés qui le couvrent (HolidaysChanged)."""
+    db.add_holiday("2024-03-11", "Plan", "Personnalisé")
+    db.delete_holiday("2024-03-11")
+
+
+def _compact_and_read(db, manager, s):
+    """Compactage de toutes les chaînes de division, puis lecture de l'historique compacté d'un agent."""
+    manager.compacter_historique(retention_jours=0)
+    agent_id = db.execute_query("SELECT MIN(agent_id) FROM conges_historique", fetch="one")[0] or s["agent_id"]
+    manager.get_conges_annees(agent_id)
+    manager.get_historique_compacte(agent_id, 2020, "Congé annuel")
+
+
+def _dispose_file(db, manager, s):
+    """Fichier de certificat qu'aucune ligne ne référence : contrôlé par empreinte et par chemin, puis supprimé."""
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    assert db.dispose_certificat_file(path, "0" * 64, os.remove) and not os.path.exists(path)
+
+
+def _archive_and_read(db, manager, s):
+    """Archivage de la plus ancienne année, puis lectures qui passent par les archives."""
+    year = min(db.get_archivable_years())
+    db.archive_year(year)
+    assert db.is_year_archived(year) and year in db.get_archived_years()
+    conge_id = db.execute_query(f"SELECT MIN(conge_id) FROM archives_certificats WHERE annee = ?", (year,), fetch="one")[0]
+    db.attach_archives([year])
+    db.get_conges(s["agent_id"])
+    db.get_conges_annees(s["agent_id"])
+    db.get_conges_for_year(s["agent_id"], year)
+    db.get_certificat_for_conge(conge_id, year)
+    db.get_fiches_annuelles_data(year)
+
+
+SCENARIOS = {
+    "agent_par_id": lambda db, m, s: (db.invalidate_agent_cache(), m.get_agent_by_id(s["agent_id"])),
+    "agent_par_ppr": lambda db, m, s: (db.invalidate_agent_cache(), db.get_agent_by_ppr(s["ppr"])),
+    "agents_par_ids": lambda db, m, s: (db.invalidate_agent_cache(), db.get_agents_by_ids(range(s["agent_id"], s["agent_id"] + 20))),
+    "page_agents": lambda db, m, s: m.get_all_agents(limit=50, offset=500),
+    "types_conge": lambda db, m, s: (db.invalidate_types_cache(), m.get_types_conge()),
+    "comptage_agents": lambda db, m, s: db.get_agents_count(),
+    "recherche_agents": lambda db, m, s: db.get_agents(term="ben", limit=50, offset=0),
+    "comptage_recherche_agents": lambda db, m, s: db.get_agents_count(term="ben"),
+    "lignes_agents": lambda db, m, s: db.get_agents_rows(),
+    "conges_agent": lambda db, m, s: m.get_conges_for_agent(s["agent_id"]),
+    "annees_conges_agent": lambda db, m, s: m.get_conges_annees(s["agent_id"]),
+    "conges_agent_annee": lambda db, m, s: m.get_conges_for_year(s["agent_id"], 2020, "Congé annuel"),
+    "conge_par_id": lambda db, m, s: m.get_conge_by_id(s["conge_id"]),
+    "certificat_du_conge": lambda db, m, s: db.get_certificat_for_conge(s["conge_id"]),
+    "references_certificat": lambda db, m, s: db.count_certificat_references("0" * 64),
+    "liberation_fichier_certificat": _dispose_file,
+    "chevauchements": lambda db, m, s: db.get_overlapping_leaves(s["agent_id"], s["debut"], s["fin"], s["conge_id"]),
+    "disponibilite_interim": lambda db, m, s: db.is_agent_disponible(s["agent_id"], s["debut"], s["fin"], s["conge_id"]),
+    "agents_disponibles_grade": lambda db, m, s: m.get_agents_disponibles(s["debut"], s["fin"], exclude_id=s["agent_id"], grade=s["grade"], limit=50),
+    "agents_disponibles_recherche": lambda db, m, s: m.get_agents_disponibles(s["debut"], s["fin"], term="ben", limit=50),
+    "division_et_restauration": _split_and_restore,
+    "ajout_modification_suppression_conge": _conge_cycle,
+    "saisie_et_suppression_formulaire": _conge_form,
+    "ajout_modification_suppression_agent": _agent_cycle,
+    "modification_agent": lambda db, m, s: db.modifier_agent(*db.conn.execute("SELECT id, nom, prenom, ppr, grade, solde FROM agents WHERE id = ?", (s["agent_id"],)).fetchone()),
+    "jours_feries_annee": lambda db, m, s: db.get_holidays_for_year(2020),
+    "synchronisation_jours_feries": lambda db, m, s: db.sync_official_holidays([2020], force=True),
+    "ajout_et_retrait_jour_ferie": _holiday_cycle,
+    "recalcul_jours_pris": lambda db, m, s: m.recalculer_jours_pris(["2025-03-10"]),
+    "conges_couvrant_jour_ferie": lambda db, m, s: db.get_conges_ouvres_actifs_couvrant(["2025-03-10"]),
+    "certificats_manquants": lambda db, m, s: db.get_maladies_sans_certificat(en_retard_seulement=True, apres=("2024-01-01", 10**9)),
+    "certificats_manquants_agent": lambda db, m, s: db.get_maladies_sans_certificat(agent_id=s["agent_id"]),
+    "certificats_manquants_par_agent": lambda db, m, s: db.get_maladies_sans_certificat_par_agent(),
+    "comptage_certificats_manquants": lambda db, m, s: db.count_maladies_sans_certificat(),
+    "compactage_historique": _compact_and_read,
+    "archivage_et_lecture": _archive_and_read,
+    "export_tous_conges": lambda db, m, s: (db.get_conges(), m.get_historique_compacte()),
+    "statistiques": lambda db, m, s: (setattr(db, "_leave_frame", None), db.get_conges_stats()),
+    "statistiques_instantane": lambda db, m, s: (db.get_leave_frame(), db.get_conges_stats()),
+    "instantane_conges": lambda db, m, s: (setattr(db, "_leave_frame", None), db.get_leave_frame()),
+    "prevision_soldes": lambda db, m, s: (db.invalidate_types_cache(), setattr(db, "_leave_frame", None), m.forecast_soldes(datetime(2026, 12, 31))),
+    "fiches_annuelles": lambda db, m, s: db.get_fiches_annuelles_data(2020),
+}
+# Scénarios qui suppriment ou archivent des données : exécutés sur une copie de la base
+ON_COPY = {"ajout_modification_suppression_agent", "compactage_historique", "archivage_et_lecture", "ajout_et_retrait_jour_ferie", "recalcul_jours_pris"}
+_ran = set()
+
+
+@pytest.mark.parametrize("scenario", sorted(SCENARIOS))
+def test_query_plan_uses_indexes(scenario, db, conge_manager, db_copy, copy_manager, sample, called_methods, auto_confirm):
+    target, manager = (db_copy, copy_manager) if scenario in ON_COPY else (db, conge_manager)
+    with QueryCollector(target.conn) as collector:
+        SCENARIOS[scenario](target, manager, sample)
+    _ran.add(scenario)
+    assert collector.statements, "Aucune requête capturée"
+    violations = {}
+    for sql in collector.statements:
+        normalized = normalize_sql(sql)
+        if any(re.search(pattern, normalized) for pattern in ALLOWED_SCANS): continue
+        try:
+            scans = full_scans(target.conn, sql)
+        except sqlite3.OperationalError:
+            if _RE_TRANSIENT.search(sql): continue # Plus rien à expliquer après coup
+            raise
+        if scans: violations[normalized] = scans
+    assert not violations, "Parcours complet de table :\n" + "\n".join(f"  {sql}\n    -> {', '.join(scans)}" for sql, scans in violations.items())
+
+
+def test_query_plan_scenarios_cover_every_method(called_methods):
+    """Chaque méthode publique de DatabaseManager et CongeManager passe par au moins un scénario (ou figure dans UNCHECKED_METHODS)."""
+    if _ran != set(SCENARIOS): pytest.skip("Tous les scénarios doivent avoir été exécutés")
+    public = {f"{cls.__name__}.{name}" for cls in (DatabaseManager, CongeManager)
+              for name, func in vars(cls).items() if inspect.isfunction(func) and not name.startswith("_")}
+    missing = sorted(public - called_methods - UNCHECKED_METHODS.keys())
+    assert not missing, "Méthodes sans scénario de plan d'exécution : " + ", ".join(missing)
+
+
+def test_guard_detects_non_sargable_filter(db):
+    """Le garde-fou lui-même : une colonne enveloppée dans date() doit être signalée."""
+    assert full_scans(db.conn, "SELECT * FROM conges c WHERE date(c.date_debut) >= '2020-01-01'") == ["SCAN c"]
+    assert not full_scans(db.conn, "SELECT * FROM conges WHERE agent_id = 1 AND date_debut >= '2020-01-01'")
+    assert full_scans(db.conn, "SELECT date FROM jours_feries_personnalises WHERE strftime('%Y', date) = '2020' ORDER BY date")
@@ -0,0 +1,93 @@
+# benchmarks/conftest.py
+"""
+Fixtures partagées des benchmarks. La base est générée une fois par session,
+avec une taille réglable par variables d'environnement :
+
+    CONGE_BENCH_AGENTS   (défaut 2000)
+    CONGE_BENCH_CONGES   (défaut 40000)
+    CONGE_BENCH_DB       base existante à utiliser telle quelle (ex. générée avec
+                         "python -m benchmarks.generate_data --agents 100000 --conges 1000000 ...")
+
+Tout s'exécute sans affichage : les boîtes de dialogue Tk sont remplacées par des
+réponses automatiques.
+"""
+import os
+import shutil
+import sys
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from benchmarks.generate_data import generate_database, _load_default_config
+
+_load_default_config()
+
+from db.database import DatabaseManager
+from core.conges.manager import CongeManager
+
+
+class HeadlessWindow:
+    """Remplace la MainWindow pour les fonctions d'import/export Excel."""
+    def config(self, **kwargs): pass
+    def update_idletasks(self): pass
+    def set_status(self, message): pass
+
+
+@pytest.fixture(scope="session")
+def bench_db_file(tmp_path_factory):
+    existing = os.environ.get("CONGE_BENCH_DB")
+    if existing:
+        # Copie de travail : les benchmarks d'écriture ne modifient pas la base de référence
+        path = str(tmp_path_factory.mktemp("bench") / os.path.basename(existing))
+        shutil.copyfile(existing, path)
+        return path
+    path = str(tmp_path_factory.mktemp("bench") / "bench.db")
+    generate_database(path, agents=int(os.environ.get("CONGE_BENCH_AGENTS", 2000)),
+                      conges=int(os.environ.get("CONGE_BENCH_CONGES", 40000)))
+    return path
+
+
+@pytest.fixture(scope="session")
+def db(bench_db_file):
+    manager = DatabaseManager(bench_db_file)
+    assert manager.connect()
+    manager.create_db_tables()
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def fresh_db(tmp_path):
+    """Base vide propre au test (schéma et migrations appliqués) : pour les contrôles qui modifient ou suppriment des données."""
+    from db.migrations import migrate
+    manager = DatabaseManager(str(tmp_path / "conges.db"))
+    assert manager.connect()
+    manager.create_db_tables()
+    migrate(manager)
+    yield manager
+    manager.close()
+
+
+@pytest.fixture(scope="session")
+def conge_manager(db, tmp_path_factory):
+    return CongeManager(db, str(tmp_path_factory.mktemp("certificats")))
+
+
+@pytest.fixture
+def headless_dialogs(monkeypatch, tmp_path):
+    """Neutralise messagebox/filedialog de utils.file_utils ; renvoie le chemin de fichier proposé."""
+    import utils.file_utils as file_utils
+    target = {"save": str(tmp_path / "export.xlsx"), "open": None}
+    monkeypatch.setattr(file_utils.filedialog, "asksaveasfilename", lambda **kwargs: target["save"])
+    monkeypatch.setattr(file_utils.filedialog, "askopenfilename", lambda **kwargs: target["open"])
+    messages = []
+    for name in ("showinfo", "showwarning", "showerror"):
+        monkeypatch.setattr(file_utils.messagebox, name, lambda title, message, _n=name, **kwargs: messages.append((_n, message)))
+    target["answer"] = True # Réponse aux confirmations (doublons probables à l'import)
+    monkeypatch.setattr(file_utils.messagebox, "askyesnocancel",
+                        lambda title, message, **kwargs: messages.append(("askyesnocancel", message)) or target["answer"])
+    target["messages"] = messages
+    return target
@@ -0,0 +1,178 @@
+# benchmarks/generate_data.py
+"""
+Générateur de bases de données synthétiques pour les benchmarks.
+
+Le schéma est créé par DatabaseManager.create_db_tables() puis les migrations (comme l'application) ;
+les lignes sont ensuite insérées en masse (executemany, une transaction par lot).
+La génération est reproductible : même graine => même base.
+
+    python -m benchmarks.generate_data --agents 100000 --conges 1000000 bench_100k.db
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from utils.config_loader import CONFIG, load_config
+from utils.date_utils import get_holidays_set_for_period, jours_ouvres
+
+NOMS = ["Alaoui", "Bennani", "El Amrani", "Berrada", "Tazi", "Fassi", "Idrissi", "Chraibi", "Benjelloun", "Lahlou",
+        "Mansouri", "Ouazzani", "Sqalli", "Kettani", "Benkirane", "El Khatib", "Naciri", "Zniber", "Hajji", "Amrani",
+        "Bouzidi", "Cherkaoui", "Daoudi", "Filali", "Guessous", "Haddad", "Jaidi", "Kabbaj", "Lamrani", "Mernissi"]
+PRENOMS = ["Mohammed", "Fatima", "Ahmed", "Khadija", "Youssef", "Aicha", "Omar", "Meryem", "Hassan", "Salma",
+           "Karim", "Nadia", "Rachid", "Samira", "Hamza", "Imane", "Mehdi", "Sanaa", "Anas", "Hiba",
+           "Said", "Laila", "Amine", "Zineb", "Driss", "Houda", "Tarik", "Asmae", "Yassine", "Kenza"]
+
+# Répartition des types de congés (poids relatifs)
+TYPES_PONDERES = [("Congé annuel", 60), ("Congé exceptionnel", 15), ("Congé de maladie", 20),
+                  ("Congé de maternité", 3), ("Congé de paternité", 2)]
+DUREES = {"Congé annuel": (1, 22), "Congé exceptionnel": (1, 4), "Congé de maladie": (1, 30),
+          "Congé de maternité": (98, 98), "Congé de paternité": (15, 15)}
+
+BATCH_SIZE = 50000
+
+
+def _load_default_config():
+    if not CONFIG:
+        load_config(os.path.join(BASE_DIR, "config.yaml"))
+
+
+def generate_database(db_file, agents=10000, conges=100000, seed=42, start_year=2016, end_year=2025,
+                      split_ratio=0.02, interim_ratio=0.15, certificat_ratio=0.8, custom_holidays_per_year=3,
+                      progress=None):
+    """
+    Crée (ou complète) la base db_file avec des données réalistes :
+    agents, congés sans chevauchement par agent, intérims, certificats médicaux,
+    jours fériés personnalisés et chaînes de division (congé annuel annulé, segments
+    actifs et congé de maladie intercalé). Renvoie le nombre de lignes créées par table.
+    """
+    _load_default_config()
+    from db.database import DatabaseManager
+    from db.migrations import migrate
+
+    report = progress or (lambda message: None)
+    rng = random.Random(seed)
+    db = DatabaseManager(db_file)
+    if not db.connect():
+        raise RuntimeError(f"Connexion impossible à {db_file}")
+    db.create_db_tables()
+    migrate(db)
+    conn = db.conn
+    counts = {"agents": 0, "conges": 0, "certificats_medicaux": 0, "jours_feries_personnalises": 0, "divisions": 0}
+    try:
+        # --- Jours fériés personnalisés ---
+        holidays_rows = []
+        for year in range(start_year, end_year + 1):
+            for day in rng.sample(range(1, 365), custom_holidays_per_year):
+                d = date(year, 1, 1) + timedelta(days=day)
+                holidays_rows.append((d.strftime('%Y-%m-%d'), f"Fermeture exceptionnelle {d.strftime('%d/%m')}", "Personnalisé"))
+        conn.executemany("INSERT OR IGNORE INTO jours_feries_personnalises (date, nom, type) VALUES (?, ?, ?)", holidays_rows)
+        db.commit()
+        counts["jours_feries_personnalises"] = len(holidays_rows)
+        holidays_set = get_holidays_set_for_period(db, start_year, end_year)
+
+        # --- Agents ---
+        grades = CONFIG['ui']['grades']
+        first_id = (conn.execute("SELECT COALESCE(MAX(id), 0) FROM agents").fetchone()[0]) + 1
+        for batch_start in range(0, agents, BATCH_SIZE):
+            rows = []
+            for i in range(batch_start, min(agents, batch_start + BATCH_SIZE)):
+                agent_id = first_id + i
+                ppr = f"{seed % 100:02d}{agent_id:08d}" if rng.random() > 0.02 else None # Quelques agents sans PPR
+                rows.append((agent_id, rng.choice(NOMS), rng.choice(PRENOMS), ppr, rng.choice(grades), round(rng.uniform(0, 60), 1)))
+            conn.executemany("INSERT INTO agents (id, nom, prenom, ppr, grade, solde) VALUES (?, ?, ?, ?, ?, ?)", rows)
+            db.commit()
+            counts["agents"] += len(rows)
+            report(f"Agents : {counts['agents']}/{agents}")
+        agent_ids = range(first_id, first_id + agents)
+
+        # --- Congés : chaque agent reçoit des créneaux disjoints sur la période ---
+        period_start = date(start_year, 1, 1)
+        period_days = (date(end_year, 12, 31) - period_start).days + 1
+        types, weights = zip(*TYPES_PONDERES)
+        per_agent = max(1, conges // max(agents, 1))
+        extra = conges - per_agent * agents
+        next_conge_id = (conn.execute("SELECT COALESCE(MAX(id), 0) FROM conges").fetchone()[0]) + 1
+        conge_rows, cert_rows = [], []
+
+        def flush():
+            conn.executemany("INSERT INTO conges (id, agent_id, type_id, justif, interim_id, date_debut, date_fin, jours_pris, statut_id) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", conge_rows)
+            conn.executemany("INSERT INTO certificats_medicaux (conge_id, nom_medecin, duree_jours, chemin_fichier) VALUES (?, ?, ?, ?)", cert_rows)
+            db.commit()
+            counts["conges"] += len(conge_rows); counts["certificats_medicaux"] += len(cert_rows)
+            conge_rows.clear(); cert_rows.clear()
+            report(f"Congés : {counts['conges']}/{conges}")
+
+        types_conge = {t.libelle: t for t in db.get_types_conge()}
+
+        def add_conge(agent_id, type_conge, debut, fin, statut=db.STATUT_ACTIF, interim_id=None):
+            nonlocal next_conge_id
+            conge_id = next_conge_id; next_conge_id += 1
+            regles = types_conge[type_conge]
+            jours = jours_ouvres(debut, fin, holidays_set) if regles.jours_ouvres else (fin - debut).days + 1
+            conge_rows.append((conge_id, agent_id, regles.id, None, interim_id, debut.strftime('%Y-%m-%d'), fin.strftime('%Y-%m-%d'), jours, statut))
+            if regles.certificat_requis and rng.random() < certificat_ratio:
+                cert_rows.append((conge_id, f"Dr {rng.choice(NOMS)}", jours, os.path.join(CONFIG['db']['certificates_dir'], f"cert_{agent_id}_{conge_id}.pdf")))
+            return conge_id
+
+        for index, agent_id in enumerate(agent_ids):
+            nb = per_agent + (1 if index < extra else 0)
+            slot = period_days // nb
+            if slot < 2: raise ValueError(f"Trop de congés par agent ({nb}) pour {period_days} jours.")
+            for k in range(nb):
+                type_conge = rng.choices(types, weights)[0]
+                low, high = DUREES[type_conge]
+                duree = min(rng.randint(low, high), slot - 1)
+                debut = period_start + timedelta(days=k * slot + rng.randint(0, slot - 1 - duree))
+                fin = debut + timedelta(days=duree - 1)
+                interim_id = rng.choice(agent_ids) if agents > 1 and rng.random() < interim_ratio else None
+                if interim_id == agent_id: interim_id = None
+                if type_conge == "Congé annuel" and duree >= 5 and rng.random() < split_ratio:
+                    # Chaîne de division : parent annulé, deux segments actifs et une maladie au milieu
+                    add_conge(agent_id, type_conge, debut, fin, statut=db.STATUT_ANNULE, interim_id=interim_id)
+                    milieu_debut = debut + timedelta(days=duree // 3)
+                    milieu_fin = milieu_debut + timedelta(days=max(1, duree // 3) - 1)
+                    add_conge(agent_id, type_conge, debut, milieu_debut - timedelta(days=1))
+                    add_conge(agent_id, "Congé de maladie", milieu_debut, milieu_fin)
+                    if milieu_fin < fin: add_conge(agent_id, type_conge, milieu_fin + timedelta(days=1), fin)
+                    counts["divisions"] += 1
+                else:
+                    add_conge(agent_id, type_conge, debut, fin, interim_id=interim_id)
+            if len(conge_rows) >= BATCH_SIZE: flush()
+        flush()
+        conn.execute("ANALYZE")
+        return counts
+    finally:
+        db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Génère une base de congés synthétique pour les benchmarks.")
+    parser.add_argument("db_file", help="Fichier SQLite à créer (complété s'il existe déjà)")
+    parser.add_argument("--agents", type=int, default=10000)
+    parser.add_argument("--conges", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--start-year", type=int, default=2016)
+    parser.add_argument("--end-year", type=int, default=2025)
+    parser.add_argument("--split-ratio", type=float, default=0.02, help="Part des congés annuels divisés")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    counts = generate_database(args.db_file, agents=args.agents, conges=args.conges, seed=args.seed,
+                               start_year=args.start_year, end_year=args.end_year, split_ratio=args.split_ratio,
+                               progress=lambda message: print(f"\r{message:<40}", end="", flush=True))
+    print()
+    for table, count in counts.items():
+        print(f"  {table:<28}: {count}")
+    print(f"Base générée en {time.perf_counter() - t0:.1f} s : {args.db_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# core/conges/certificats.py
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+
+
+class CertificateStore:
+    """
+    Stockage des certificats médicaux par contenu : chaque fichier est rangé sous
+    <racine>/<aa>/<bb>/<sha256><ext>, où aa et bb sont les premiers caractères de son empreinte.
+    Un même fichier joint plusieurs fois n'est donc copié qu'une fois ; les lignes de
+    certificats_medicaux qui le partagent sont comptées par leur colonne sha256 avant
+    toute suppression (voir DatabaseManager.release_certificat_file).
+    """
+    CHUNK_SIZE = 1024 * 1024
+    TMP_DIR = ".tmp"
+    QUARANTINE_DIR = "_quarantaine"
+    GRACE_SECONDS = 600 # Fichiers plus récents ignorés par le contrôle : copie peut-être en cours
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+
+    def path_for(self, sha256, extension=""):
+        return os.path.join(self.root_dir, sha256[:2], sha256[2:4], sha256 + extension.lower())
+
+    def contains(self, path):
+        """Indique si path est déjà un fichier du magasin (rien à copier)."""
+        try:
+            return os.path.commonpath([os.path.abspath(path), os.path.abspath(self.root_dir)]) == os.path.abspath(self.root_dir)
+        except ValueError:
+            return False # Lecteurs différents sous Windows
+
+    @classmethod
+    def hash_file(cls, path, progress=None):
+        digest = hashlib.sha256()
+        total, done = os.path.getsize(path), 0
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(cls.CHUNK_SIZE), b""):
+                digest.update(chunk)
+                done += len(chunk)
+                if progress: progress(done, total)
+        return digest.hexdigest()
+
+    def store(self, source_path, progress=None, pin=None):
+        """
+        Copie source_path dans le magasin en calculant son empreinte au fil de la lecture
+        (une seule lecture du fichier, qui peut être sur un lecteur réseau). Si le contenu est
+        déjà présent, la copie temporaire est abandonnée. Renvoie (sha256, chemin stocké).
+        progress(octets copiés, taille totale) est appelé après chaque bloc ; pin(sha256) avant de
+        chercher le contenu dans le magasin (voir DatabaseManager.pin_certificat).
+        """
+        extension = os.path.splitext(source_path)[1]
+        if self.contains(source_path):
+            sha256 = self.hash_file(source_path, progress)
+            if pin: pin(sha256)
+            return sha256, os.path.abspath(source_path)
+
+        tmp_dir = os.path.join(self.root_dir, ".tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        total, done = os.path.getsize(source_path), 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix=extension)
+        try:
+            with open(source_path, "rb") as src, os.fdopen(fd, "wb") as dst:
+                for chunk in iter(lambda: src.read(self.CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    dst.write(chunk)
+                    done += len(chunk)
+                    if progress: progress(done, total)
+            sha256 = digest.hexdigest()
+            if pin: pin(sha256) # Un fichier déjà présent ne doit plus être supprimé d'ici l'enregistrement de la ligne
+            dest_path = self.path_for(sha256, extension)
+            if os.path.exists(dest_path):
+                os.remove(tmp_path) # Contenu déjà stocké : dédoublonnage
+                logging.info(f"Certificat déjà présent dans le magasin : {dest_path}")
+            else:
+                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                os.replace(tmp_path, dest_path)
+            return sha256, dest_path
+        except BaseException:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            raise
+
+    # --- Contrôle d'intégrité ---
+    @staticmethod
+    def _normalize(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def _iter_files(self):
+        """Parcourt le magasin avec os.scandir (hors quarantaine) : (chemin normalisé, taille, date de modification)."""
+        stack = [self.root_dir]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name != self.QUARANTINE_DIR: stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            st = entry.stat(follow_symlinks=False)
+                            yield self._normalize(entry.path), st.st_size, st.st_mtime
+            except FileNotFoundError:
+                continue
+
+    def scan(self, db_manager, progress=None):
+        """
+        Compare le contenu du répertoire des certificats à la colonne certificats_medicaux.chemin_fichier,
+        par différences d'ensembles, en un seul parcours de chacun. Utilisable depuis un thread de fond
+        (connexion de lecture dédiée). Renvoie un dictionnaire :
+          orphelins : [(chemin, taille)] fichiers qu'aucune ligne ne référence (dont les copies .tmp abandonnées)
+          manquants : [(conge_id, chemin)] lignes dont le fichier n'existe pas
+          nb_fichiers, taille_totale, taille_orphelins, nb_references, ignores_recents
+        """
+        started = time.time()
+        conn = db_manager.open_reader_connection()
+        try:
+            # Les certificats des années archivées restent référencés (archives_certificats)
+            rows = conn.execute("SELECT conge_id, chemin_fichier FROM certificats_medicaux UNION ALL SELECT conge_id, chemin_fichier FROM archives_certificats").fetchall()
+        finally:
+            conn.close()
+        references = {}
+        for conge_id, chemin in rows:
+            if chemin: references.setdefault(self._normalize(chemin), []).append(conge_id)
+
+        files, recent, total_size = {}, set(), 0
+        for count, (path, size, mtime) in enumerate(self._iter_files(), 1):
+            files[path] = size
+            total_size += size
+            if mtime > started - self.GRACE_SECONDS: recent.add(path)
+            if progress and count % 10000 == 0: progress(count)
+
+        orphans = sorted(files.keys() - references.keys() - recent)
+        # Références hors du magasin (anciens emplacements) : vérifiées une à une, elles sont rares
+        root = self._normalize(self.root_dir) + os.sep
+        missing_paths = {p for p in references.keys() - files.keys() if p.startswith(root) or not os.path.isfile(p)}
+        report = {
+            "orphelins": [(path, files[path]) for path in orphans],
+            "manquants": sorted((conge_id, path) for path in missing_paths for conge_id in references[path]),
+            "nb_fichiers": len(files),
+            "taille_totale": total_size,
+            "taille_orphelins": sum(files[path] for path in orphans),
+            "nb_references": len(rows),
+            "ignores_recents": len(recent - references.keys()),
+        }
+        logging.info(f"Contrôle des certificats : {report['nb_fichiers']} fichier(s), {len(report['orphelins'])} orphelin(s), "
+                     f"{len(report['manquants'])} référence(s) sans fichier ({time.time() - started:.1f} s).")
+        return report
+
+    def quarantine(self, paths, db_manager):
+        """
+        Déplace des fichiers orphelins dans <racine>/_quarantaine/<horodatage>/ ; renvoie le nombre déplacé.
+        Chaque fichier est recontrôlé juste avant son déplacement (DatabaseManager.dispose_certificat_file) :
+        depuis le contrôle, une copie en cours a pu le réutiliser pour un nouveau certificat.
+        """
+        target_root = os.path.join(self.root_dir, self.QUARANTINE_DIR, datetime.now().strftime("%Y%m%d-%H%M%S"))
+
+        def move(path):
+            dest = os.path.join(target_root, os.path.relpath(path, self.root_dir))
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.replace(path, dest)
+
+        moved = skipped = 0
+        for path in paths:
+            if os.path.relpath(path, self.root_dir).startswith(os.pardir): continue # Jamais en dehors du magasin
+            name = os.path.splitext(os.path.basename(path))[0]
+            sha256 = name if len(name) == 64 and all(c in "0123456789abcdef" for c in name) else None
+            try:
+                if db_manager.dispose_certificat_file(path, sha256, move): moved += 1
+                else: skipped += 1
+            except OSError as e:
+                logging.error(f"Mise en quarantaine impossible pour {path}: {e}")
+        if moved: logging.info(f"{moved} certificat(s) orphelin(s) mis en quarantaine dans {target_root}.")
+        if skipped: logging.info(f"{skipped} fichier(s) de nouveau utilisé(s) depuis le contrôle : laissé(s) en place.")
+        return moved
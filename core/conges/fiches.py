@@ -0,0 +1,306 @@
+# core/conges/fiches.py
+"""
+Fiches de congés annuelles ("fiche de congés") de tous les agents, générées en lot.
+
+Les données sont lues en quelques requêtes ensemblistes (DatabaseManager.get_fiches_annuelles_data),
+découpées par classeur (un par agent, ou un par grade avec une feuille par agent), puis écrites par
+un ProcessPoolExecutor : l'écriture openpyxl, gourmande en CPU, est ainsi répartie sur les cœurs.
+Chaque classeur a une empreinte de son contenu, notée dans <dossier>/<année>/manifeste.json :
+une nouvelle génération ne réécrit que les classeurs dont les données ont changé depuis.
+
+    python -m core.conges.fiches 2024
+    python -m core.conges.fiches 2024 --par grade --workers 4 --complet
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+try:
+    from utils.config_loader import CONFIG
+except ImportError:
+    CONFIG = {}
+
+MANIFEST_FILE = "manifeste.json"
+FORMAT_VERSION = 1 # À incrémenter quand la mise en page change : tout est alors régénéré
+_RE_UNSAFE = re.compile(r'[\\/:*?"<>|\[\]\s]+')
+
+
+def _safe_name(text, max_length=60):
+    return _RE_UNSAFE.sub("_", str(text or "").strip()).strip("_")[:max_length] or "sans_nom"
+
+
+def _display_date(date_sql):
+    return f"{date_sql[8:10]}/{date_sql[5:7]}/{date_sql[:4]}" if date_sql else ""
+
+
+# --- Écriture (processus de travail : uniquement des données simples, picklables) ---
+def _write_agent_sheet(wb, title, year, types, fiche):
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    ws = wb.create_sheet(title)
+    for column, width in zip("ABCDEFG", (24, 12, 12, 8, 30, 28, 10)):
+        ws.column_dimensions[column].width = width
+
+    font = Font(bold=True)
+    def bold(*values):
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(ws, value=value); cell.font = font; cells.append(cell)
+        return cells
+
+    agent_id, nom, prenom, ppr, grade, solde = fiche["agent"]
+    conges, interims = fiche["conges"], fiche["interims"]
+    decomptes = sum(c[3] for c in conges if types[c[0]][1])
+    maladie = sum(c[3] for c in conges if types[c[0]][2])
+    sans_certificat = sum(1 for c in conges if types[c[0]][2] and not c[6])
+    ws.append(bold(f"Fiche de congés {year}"))
+    ws.append([])
+    for label, value in (("Agent", f"{nom} {prenom or ''}".strip()), ("PPR", ppr or ""), ("Grade", grade or ""), ("Solde actuel", solde),
+                         (f"Jours décomptés du solde en {year}", decomptes), ("Jours de maladie", maladie), ("Certificats manquants", sans_certificat)):
+        ws.append(bold(label) + [value])
+
+    ws.append([])
+    ws.append(bold("Congés"))
+    ws.append(bold("Type", "Début", "Fin", "Jours", "Justification", "Intérimaire", "Certificat"))
+    for type_id, debut, fin, jours, justif, interim, certificat in conges:
+        ws.append([types[type_id][0], _display_date(debut), _display_date(fin), jours, justif or "", interim or "",
+                   ("Oui" if certificat else "Non") if types[type_id][2] else ""])
+    if not conges: ws.append(["Aucun congé"])
+
+    ws.append([])
+    ws.append(bold("Intérims assurés"))
+    ws.append(bold("Agent remplacé", "Début", "Fin", "Jours", "Type"))
+    for remplace, type_id, debut, fin, jours in interims:
+        ws.append([remplace, _display_date(debut), _display_date(fin), jours, types[type_id][0]])
+    if not interims: ws.append(["Aucun intérim"])
+
+    ws.append([])
+    ws.append(bold("Récapitulatif par type", "Nombre", "Jours"))
+    recap = {}
+    for c in conges:
+        nb, jours = recap.get(c[0], (0, 0)); recap[c[0]] = (nb + 1, jours + c[3])
+    for type_id, (nb, jours) in sorted(recap.items()):
+        ws.append([types[type_id][0], nb, jours])
+
+
+def _write_workbook(path, year, types, fiches):
+    """Écrit un classeur (une feuille par fiche) dans un fichier temporaire, substitué à l'ancien une fois complet."""
+    import openpyxl
+    wb = openpyxl.Workbook(write_only=True)
+    for fiche in fiches:
+        agent_id, nom, prenom = fiche["agent"][:3]
+        _write_agent_sheet(wb, _safe_name(f"{agent_id} {nom} {prenom or ''}", 31), year, types, fiche)
+    tmp_path = path + ".tmp"
+    wb.save(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def write_batch(output_dir, year, types, jobs):
+    """
+    Tâche d'un processus de travail : écrit les classeurs d'un lot [(clé, fichier, empreinte, fiches)].
+    Renvoie [(clé, fichier, empreinte, erreur)] ; un classeur en échec (fichier ouvert dans Excel...)
+    n'interrompt pas le lot.
+    """
+    results = []
+    for key, filename, fingerprint, fiches in jobs:
+        try:
+            _write_workbook(os.path.join(output_dir, filename), year, types, fiches)
+            results.append((key, filename, fingerprint, None))
+        except Exception as e:
+            results.append((key, filename, fingerprint, str(e)))
+    return results
+
+
+# --- Préparation et orchestration (processus principal) ---
+class StatementGenerator:
+    BATCH_SIZE = 20 # Classeurs par tâche envoyée à un processus
+    MIN_BATCHES_FOR_POOL = 2 # En dessous, l'écriture se fait sur place (démarrer les processus coûte plus cher)
+
+    def __init__(self, db_manager, output_dir, par="agent", workers=0, batch_size=None):
+        if par not in ("agent", "grade"):
+            raise ValueError(f"Regroupement inconnu : {par} (agent ou grade)")
+        self.db = db_manager
+        self.output_dir = output_dir
+        self.par = par
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size or self.BATCH_SIZE
+
+    @classmethod
+    def from_config(cls, db_manager, config=None, **overrides):
+        conf = (config if config is not None else CONFIG).get('fiches') or {}
+        output_dir = conf.get('dir', 'fiches')
+        if not os.path.isabs(output_dir):
+            output_dir = os.path.join(os.path.dirname(os.path.abspath(db_manager.db_file)), output_dir)
+        options = {"par": conf.get('par', 'agent'), "workers": conf.get('workers', 0), "batch_size": conf.get('lot')}
+        options.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(db_manager, output_dir, **options)
+
+    def year_dir(self, year):
+        return os.path.join(self.output_dir, str(int(year)))
+
+    def _build_fiches(self, agents, conges):
+        """Regroupe les lignes par agent : congés pris et intérims assurés, noms des agents résolus."""
+        names = {a[0]: f"{a[1]} {a[2] or ''}".strip() for a in agents}
+        fiches = {a[0]: {"agent": tuple(a), "conges": [], "interims": []} for a in agents}
+        for agent_id, conge_id, type_id, debut, fin, jours, justif, interim_id, certificat in conges:
+            if agent_id not in fiches: continue
+            interim = names.get(interim_id, "Agent supprimé") if interim_id else ""
+            fiches[agent_id]["conges"].append((type_id, debut, fin, jours, justif, interim, bool(certificat)))
+            if interim_id in fiches:
+                fiches[interim_id]["interims"].append((names[agent_id], type_id, debut, fin, jours))
+        return fiches
+
+    def _build_jobs(self, year, types, fiches):
+        """Classeurs à produire : {clé: (fichier, empreinte, fiches)}."""
+        groups = {}
+        for fiche in fiches.values():
+            agent_id, nom, prenom, ppr, grade = fiche["agent"][:5]
+            if self.par == "agent":
+                key, filename = str(agent_id), f"fiche_{year}_{agent_id}_{_safe_name(nom)}_{_safe_name(prenom)}.xlsx"
+            else:
+                key = grade or "Sans grade"; filename = f"fiches_{year}_{_safe_name(key)}.xlsx"
+            groups.setdefault(key, (filename, []))[1].append(fiche)
+        salt = repr((FORMAT_VERSION, int(year), sorted(types.items())))
+        return {key: (filename, hashlib.sha256((salt + repr(group)).encode("utf-8")).hexdigest(), group)
+                for key, (filename, group) in groups.items()}
+
+    def _load_manifest(self, year):
+        try:
+            with open(os.path.join(self.year_dir(year), MANIFEST_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, year, manifest):
+        path = os.path.join(self.year_dir(year), MANIFEST_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(path + ".tmp", path)
+
+    def generate(self, year, complet=False, progress=None):
+        """
+        Génère les fiches de l'année dans <dossier>/<année>/. Sans complet, seuls les classeurs dont
+        l'empreinte diffère du manifeste (ou dont le fichier manque) sont réécrits ; les classeurs
+        d'agents disparus sont supprimés. progress(classeurs écrits, à écrire) est appelé après chaque lot.
+        Renvoie le rapport de la génération (nombres, durées, débit), aussi enregistré dans le manifeste.
+        """
+        started = time.perf_counter()
+        year = int(year)
+        conn = self.db.open_reader_connection()
+        try:
+            types, agents, conges = self.db.get_fiches_annuelles_data(year, conn)
+        finally:
+            conn.close()
+        jobs = self._build_jobs(year, types, self._build_fiches(agents, conges))
+        read_time = time.perf_counter() - started
+
+        target_dir = self.year_dir(year)
+        os.makedirs(target_dir, exist_ok=True)
+        manifest = self._load_manifest(year)
+        previous = manifest.get("fiches", {})
+        if complet or manifest.get("version") != FORMAT_VERSION or manifest.get("par") != self.par:
+            reusable = {}
+        else:
+            reusable = {key: entry for key, entry in previous.items() if key in jobs and entry.get("empreinte") == jobs[key][1]
+                        and entry.get("fichier") == jobs[key][0] and os.path.exists(os.path.join(target_dir, entry["fichier"]))}
+        todo = [(key, filename, fingerprint, group) for key, (filename, fingerprint, group) in jobs.items() if key not in reusable]
+        batches = [todo[i:i + self.batch_size] for i in range(0, len(todo), self.batch_size)]
+        workers = min(self.workers, len(batches))
+
+        entries, errors = dict(reusable), []
+        try:
+            if workers <= 1 or len(batches) < self.MIN_BATCHES_FOR_POOL:
+                workers = 1 if batches else 0
+                results = (write_batch(target_dir, year, types, batch) for batch in batches)
+                self._collect(results, jobs, entries, errors, len(todo), progress)
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    futures = [pool.submit(write_batch, target_dir, year, types, batch) for batch in batches]
+                    self._collect((future.result() for future in as_completed(futures)), jobs, entries, errors, len(todo), progress)
+        finally:
+            # Le manifeste est enregistré même après une interruption : les classeurs écrits ne sont pas refaits.
+            # Un classeur en erreur ou pas encore atteint garde son fichier précédent (et son ancienne empreinte : refait au prochain passage)
+            kept = {key: previous[key] for key in jobs if key not in entries and key in previous}
+            removed = self._remove_stale(target_dir, previous, {**entries, **kept})
+            duration = time.perf_counter() - started
+            report = {"annee": year, "par": self.par, "classeurs": len(jobs), "agents": len(agents), "conges": len(conges),
+                      "generes": len(entries) - len(reusable), "inchanges": len(reusable), "supprimes": removed, "erreurs": errors,
+                      "processus": workers, "lecture_s": round(read_time, 3), "duree_s": round(duration, 3),
+                      "classeurs_par_s": round((len(entries) - len(reusable)) / max(duration - read_time, 1e-6), 1)}
+            self._save_manifest(year, {"version": FORMAT_VERSION, "annee": year, "par": self.par,
+                                       "genere_le": datetime.now().isoformat(timespec="seconds"), "fiches": {**entries, **kept}, "rapport": report})
+        logging.info(f"Fiches {year} : {report['generes']} classeur(s) écrit(s), {report['inchanges']} inchangé(s), "
+                     f"{report['supprimes']} supprimé(s), {len(errors)} erreur(s) en {report['duree_s']} s "
+                     f"({report['classeurs_par_s']} classeurs/s, {workers} processus).")
+        return report
+
+    @staticmethod
+    def _collect(results, jobs, entries, errors, total, progress):
+        done = 0
+        for batch_results in results:
+            for key, filename, fingerprint, error in batch_results:
+                done += 1
+                if error:
+                    errors.append(f"{filename} : {error}")
+                    logging.error(f"Fiche {filename} non écrite : {error}")
+                else:
+                    entries[key] = {"fichier": filename, "empreinte": fingerprint, "nb_agents": len(jobs[key][2])}
+            if progress: progress(done, total)
+
+    @staticmethod
+    def _remove_stale(target_dir, previous, entries):
+        """Supprime les classeurs du manifeste précédent qui ne correspondent plus à aucun classeur actuel ou conservé."""
+        current = {entry["fichier"] for entry in entries.values()}
+        removed = 0
+        for entry in previous.values():
+            filename = entry.get("fichier")
+            if not filename or filename in current: continue
+            try:
+                os.remove(os.path.join(target_dir, filename)); removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.warning(f"Ancienne fiche non supprimée ({filename}) : {e}")
+        return removed
+
+
+def main(argv=None):
+    import argparse
+    from utils.config_loader import load_config
+    base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    load_config(os.path.join(base_dir, "config.yaml"))
+    from db.database import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Génère les fiches de congés annuelles de tous les agents.")
+    parser.add_argument("annee", type=int)
+    parser.add_argument("--db", default=os.path.join(base_dir, CONFIG['db']['filename']), help="Base concernée")
+    parser.add_argument("--dossier", help="Dossier de sortie (défaut : fiches.dir de config.yaml)")
+    parser.add_argument("--par", choices=("agent", "grade"), help="Un classeur par agent ou par grade")
+    parser.add_argument("--workers", type=int, help="Nombre de processus (défaut : nombre de cœurs)")
+    parser.add_argument("--complet", action="store_true", help="Régénère toutes les fiches, même inchangées")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    db = DatabaseManager(args.db)
+    if not db.connect(): return 1
+    try:
+        generator = StatementGenerator.from_config(db, par=args.par, workers=args.workers)
+        if args.dossier: generator.output_dir = args.dossier
+        report = generator.generate(args.annee, complet=args.complet,
+                                    progress=lambda done, total: print(f"\rClasseurs : {done}/{total}", end="", flush=True))
+        print()
+        print(f"{report['generes']} classeur(s) écrit(s), {report['inchanges']} inchangé(s), {report['supprimes']} supprimé(s) "
+              f"en {report['duree_s']} s ({report['classeurs_par_s']} classeurs/s, {report['processus']} processus) : {generator.year_dir(args.annee)}")
+        for error in report['erreurs']: print(f"  Erreur : {error}")
+        return 1 if report['erreurs'] else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
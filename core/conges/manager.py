@@ -4,18 +4,29 @@ import sqlite3
 from tkinter import messagebox
 import logging
 import os
-import shutil
+from collections import defaultdict
 from datetime import datetime, timedelta
 
-from utils.date_utils import get_holidays_set_for_period, jours_ouvres, validate_date
+from utils.date_utils import get_holidays_set_for_period, invalidate_holidays_cache, jours_ouvres, validate_date
 from utils.config_loader import CONFIG
-from db.models import Agent, Conge
+from db.models import Agent, Conge, Certificat
+from core.conges.certificats import CertificateStore
+from core.conges.strategies import strategy_for_type
+from utils.background import BackgroundTask
+from core.events import AgentUpdated, CongeUpdated, HolidaysChanged, JoursPrisRecalcules
 
 
 class CongeManager:
     def __init__(self, db_manager, certificats_dir):
         self.db = db_manager
         self.certificats_dir = certificats_dir
+        self.certificats = CertificateStore(certificats_dir)
+        self.ui = None # Fenêtre principale : tâches de fond et barre d'état (voir set_ui)
+        self.db.events.subscribe(HolidaysChanged, self._on_holidays_changed)
+
+    def set_ui(self, main_window):
+        """Rattache la fenêtre principale (sans elle, les certificats sont copiés de façon synchrone)."""
+        self.ui = main_window
 
     # --- Les fonctions de base ne changent pas ---
     def get_all_agents(self, **kwargs):
@@ -24,6 +35,9 @@ class CongeManager:
     def get_agent_by_id(self, agent_id):
         return self.db.get_agent_by_id(agent_id)
 
+    def get_agents_disponibles(self, start_date, end_date, **kwargs):
+        return self.db.get_agents_disponibles(start_date, end_date, **kwargs)
+
     def save_agent(self, agent_data, is_modification=False):
         if is_modification:
             return self.db.modifier_agent(
@@ -41,8 +55,26 @@ class CongeManager:
             return self.db.supprimer_agent(agent_id)
         return False
 
+    def get_types_conge(self):
+        return self.db.get_types_conge()
+
+    def forecast_soldes(self, target, conn=None, token=None, today=None):
+        """
+        Soldes prévus de tous les agents à la date target (BalanceForecast), d'après les congés enregistrés
+        et les règles d'acquisition de conges.acquisition. conn et token : voir DatabaseManager.get_leave_frame.
+        """
+        from core.conges.previsions import AccrualRules, forecast_balances # NumPy n'est chargé qu'au premier besoin
+        frame = self.db.get_leave_frame(conn, token)
+        return forecast_balances(frame, self.db.get_agents_rows(conn), target, today, AccrualRules.from_config(), statut_actif=self.db.STATUT_ACTIF)
+
     def get_conges_for_agent(self, agent_id):
         return self.db.get_conges(agent_id=agent_id)
+
+    def get_conges_annees(self, agent_id, type_conge=None):
+        return self.db.get_conges_annees(agent_id, type_conge)
+
+    def get_conges_for_year(self, agent_id, year, type_conge=None):
+        return self.db.get_conges_for_year(agent_id, year, type_conge)
         
     def get_conge_by_id(self, conge_id):
         return self.db.get_conge_by_id(conge_id)
@@ -67,8 +99,7 @@ class CongeManager:
                 if conge.statut == 'Annulé':
                     # Cas 1: Suppression simple pour un congé déjà annulé (nettoyage)
                     logging.info(f"Suppression simple du congé annulé ID {conge_id}.")
-                    self.db.execute_query("DELETE FROM conges WHERE id=?", (conge_id,))
-                    return True
+                    return self.db.supprimer_conge(conge_id) # Libère aussi son certificat
                 else:
                     # Cas 2: Logique complexe de restauration pour un congé actif
                     return self.revoke_split_on_delete(conge_id)
@@ -86,35 +117,37 @@ class CongeManager:
         agent_id = conge_to_delete.agent_id
         try:
             parent_conge_row = self.db.execute_query(
-                """SELECT * FROM conges 
-                   WHERE agent_id = ? AND type_conge = 'Congé annuel' AND statut = 'Annulé' 
-                   AND ( (date(date_debut) <= date(?) AND date(date_fin) >= date(?)) OR (date(date_debut) >= date(?) AND date(date_fin) <= date(?)) )
+                f"""SELECT {self.db.CONGE_COLUMNS} FROM conges 
+                   WHERE agent_id = ? AND type_id IN {self.db.type_ids_sql('decompte_solde')} AND statut_id = {self.db.STATUT_ANNULE} 
+                   AND ( (date_debut <= ? AND date_fin >= ?) OR (date_debut >= ? AND date_fin <= ?) )
                    ORDER BY date_debut DESC LIMIT 1""",
                 (agent_id, conge_to_delete.date_debut.strftime('%Y-%m-%d'), conge_to_delete.date_fin.strftime('%Y-%m-%d'),
                  conge_to_delete.date_debut.strftime('%Y-%m-%d'), conge_to_delete.date_fin.strftime('%Y-%m-%d')),
                 fetch="one"
             )
             if parent_conge_row:
-                parent_conge = Conge.from_db_row(parent_conge_row)
+                parent_conge = self.db._conge_from_row(parent_conge_row)
                 logging.info(f"Restauration détectée. Parent ID: {parent_conge.id}.")
                 self.db.conn.execute('BEGIN TRANSACTION')
                 cursor = self.db.conn.cursor()
                 self.db._supprimer_conge_no_commit(cursor, conge_id_to_delete)
-                all_active_conges = [Conge.from_db_row(r) for r in cursor.execute("SELECT * FROM conges WHERE agent_id=? AND statut='Actif'", (agent_id,)).fetchall()]
+                all_active_conges = [self.db._conge_from_row(r) for r in cursor.execute(f"SELECT {self.db.CONGE_COLUMNS} FROM conges WHERE agent_id=? AND statut_id = {self.db.STATUT_ACTIF}", (agent_id,)).fetchall()]
                 for conge in all_active_conges:
                     if conge.date_debut >= parent_conge.date_debut and conge.date_fin <= parent_conge.date_fin:
                          self.db._supprimer_conge_no_commit(cursor, conge.id)
-                cursor.execute("UPDATE conges SET statut = 'Actif' WHERE id = ?", (parent_conge.id,))
-                if parent_conge.type_conge in CONFIG['conges']['types_decompte_solde']:
+                cursor.execute(f"UPDATE conges SET statut_id = {self.db.STATUT_ACTIF} WHERE id = ?", (parent_conge.id,))
+                self.db.queue_event(CongeUpdated(agent_id, parent_conge.id, parent_conge.date_debut.year))
+                if self.db.get_type_conge(parent_conge.type_conge).decompte_solde:
                     cursor.execute("UPDATE agents SET solde = solde - ? WHERE id = ?", (parent_conge.jours_pris, agent_id))
-                self.db.conn.commit()
+                    self.db.invalidate_agent_cache(agent_id)
+                self.db.commit()
                 return True
             else:
                 logging.info(f"Aucun parent trouvé. Suppression simple.")
                 self.db.supprimer_conge(conge_id_to_delete)
                 return True
         except (sqlite3.Error, ValueError) as e:
-            if self.db.conn.in_transaction: self.db.conn.rollback()
+            if self.db.conn.in_transaction: self.db.rollback()
             logging.error(f"Échec de la transaction: {e}", exc_info=True); raise e
 
     def handle_conge_submission(self, form_data, is_modification):
@@ -122,13 +155,17 @@ class CongeManager:
         try:
             start_date = validate_date(form_data['date_debut'])
             end_date = validate_date(form_data['date_fin'])
-            if not all([form_data['type_conge'], start_date, end_date]) or end_date < start_date or form_data['jours_pris'] <= 0:
+            type_conge = self.db.get_type_conge(form_data['type_conge'])
+            if not all([type_conge, start_date, end_date]) or end_date < start_date or form_data['jours_pris'] <= 0:
                 raise ValueError("Veuillez vérifier le type, les dates et la durée du congé.")
             conge_id_exclu = form_data.get('conge_id') if is_modification else None
+            if form_data.get('interim_id') and not self.db.is_agent_disponible(form_data['interim_id'], start_date, end_date, conge_id_exclu):
+                raise ValueError("L'intérimaire choisi n'est pas disponible sur cette période (congé ou autre intérim).")
             overlaps = self.db.get_overlapping_leaves(form_data['agent_id'], start_date, end_date, conge_id_exclu)
             if overlaps:
-                annual_overlaps = [c for c in overlaps if c.type_conge == 'Congé annuel']
-                if form_data['type_conge'] == 'Congé annuel' or len(annual_overlaps) != len(overlaps):
+                # Seuls les congés décomptés du solde (congé annuel) peuvent être divisés, par un congé d'un autre type
+                annual_overlaps = [c for c in overlaps if self.db.get_type_conge(c.type_conge).decompte_solde]
+                if type_conge.decompte_solde or len(annual_overlaps) != len(overlaps):
                     raise ValueError("Chevauchement invalide. Vous ne pouvez remplacer des congés annuels que par un autre type de congé.")
                 if messagebox.askyesno("Confirmation de Remplacement", "Ce congé va modifier un ou plusieurs congés annuels. Continuer ?"):
                     return self.split_or_replace_leaves(annual_overlaps, form_data)
@@ -139,7 +176,7 @@ class CongeManager:
                                 jours_pris=form_data['jours_pris'])
             if is_modification: conge_id = self.db.modifier_conge(form_data['conge_id'], conge_model)
             else: conge_id = self.db.ajouter_conge(conge_model)
-            if conge_id and form_data['type_conge'] == "Congé de maladie":
+            if conge_id and type_conge.certificat_requis:
                  self._handle_certificat_save(form_data, is_modification, conge_id)
             return True if conge_id else False
         except (ValueError, sqlite3.Error) as e:
@@ -158,55 +195,175 @@ class CongeManager:
             new_end = validate_date(form_data['date_fin'])
             holidays_set = get_holidays_set_for_period(self.db, new_start.year - 1, new_end.year + 2)
             for conge in annual_overlaps:
-                cursor.execute("UPDATE conges SET statut = 'Annulé' WHERE id=?", (conge.id,))
-                if conge.type_conge in CONFIG['conges']['types_decompte_solde']:
+                cursor.execute(f"UPDATE conges SET statut_id = {self.db.STATUT_ANNULE} WHERE id=?", (conge.id,))
+                self.db.queue_event(CongeUpdated(conge.agent_id, conge.id, conge.date_debut.year))
+                if self.db.get_type_conge(conge.type_conge).decompte_solde:
                     cursor.execute("UPDATE agents SET solde = solde + ? WHERE id=?", (conge.jours_pris, conge.agent_id))
+                    self.db.invalidate_agent_cache(conge.agent_id)
                 if conge.date_debut < new_start:
                     end_part1 = new_start - timedelta(days=1)
-                    self._creer_segment(cursor, conge.agent_id, conge.date_debut, end_part1, holidays_set)
+                    self._creer_segment(cursor, conge, conge.date_debut, end_part1, holidays_set)
                 if conge.date_fin > new_end:
                     start_part2 = new_end + timedelta(days=1)
-                    self._creer_segment(cursor, conge.agent_id, start_part2, conge.date_fin, holidays_set)
+                    self._creer_segment(cursor, conge, start_part2, conge.date_fin, holidays_set)
             new_conge_model = Conge(id=None, agent_id=form_data['agent_id'], type_conge=form_data['type_conge'],
                                     justif=form_data.get('justif'), interim_id=form_data.get('interim_id'),
                                     date_debut=new_start.strftime('%Y-%m-%d'), date_fin=new_end.strftime('%Y-%m-%d'),
                                     jours_pris=form_data['jours_pris'])
             new_conge_id = self.db._ajouter_conge_no_commit(cursor, new_conge_model)
-            if new_conge_id and form_data['type_conge'] == "Congé de maladie":
+            self.db.commit()
+            if new_conge_id and self.db.get_type_conge(form_data['type_conge']).certificat_requis:
                 self._handle_certificat_save(form_data, False, new_conge_id)
-            self.db.conn.commit()
             return True
         except (sqlite3.Error, ValueError) as e:
-            self.db.conn.rollback(); raise e
+            self.db.rollback(); raise e
 
-    def _creer_segment(self, cursor, agent_id, date_debut, date_fin, holidays_set):
-        # ... (cette fonction ne change pas, elle est stable)
+    def compacter_historique(self, retention_jours=None, db=None):
+        """
+        Compacte les chaînes de division terminées depuis plus de retention_jours (conges.compactage_retention_jours).
+        db : DatabaseManager à utiliser à la place de celui du gestionnaire (connexion propre à un thread de fond).
+        """
+        if retention_jours is None: retention_jours = CONFIG['conges'].get('compactage_retention_jours', 365)
+        limite = (datetime.now() - timedelta(days=retention_jours)).strftime('%Y-%m-%d')
+        return (db or self.db).compact_cancelled_chains(limite)
+
+    def get_historique_compacte(self, agent_id=None, year=None, type_conge=None):
+        return self.db.get_historique_compacte(agent_id, year, type_conge)
+
+    def _on_holidays_changed(self, event):
+        if event.dates: self.recalculer_jours_pris(event.dates)
+
+    def recalculer_jours_pris(self, dates):
+        """
+        Recalcule les jours ouvrés des congés actifs comptés en jours ouvrés couvrant les dates données (jours
+        fériés ajoutés ou retirés) et ajuste les soldes, le tout en une transaction. Ne sont pas modifiés, et sont
+        signalés : les congés dont la durée ne correspondait pas au calcul d'avant le changement (saisie manuelle),
+        et ceux d'un agent dont le solde ne couvre pas les jours supplémentaires (même règle qu'à la saisie).
+        Renvoie (rapport, ignorés) : [(agent_id, nombre de congés modifiés, écart décompté du solde en jours)]
+        et [(agent_id, conge_id, motif)].
+        """
+        dates = sorted({str(d)[:10] for d in dates})
+        if not dates: return [], []
+        invalidate_holidays_cache({d[:4] for d in dates}) # Les jours fériés doivent être relus avant le calcul
+        conges = self.db.get_conges_ouvres_actifs_couvrant(dates)
+        if not conges: return [], []
+        holidays_set = get_holidays_set_for_period(self.db, min(c.date_debut.year for c in conges), max(c.date_fin.year for c in conges))
+        # Jours fériés d'avant le changement : une date encore fériée vient d'être ajoutée, les autres ont été retirées
+        anciens = holidays_set ^ {datetime.strptime(d, '%Y-%m-%d').date() for d in dates}
+        par_agent, ignores = defaultdict(list), []
+        for conge in conges:
+            jours = jours_ouvres(conge.date_debut, conge.date_fin, holidays_set)
+            if jours == conge.jours_pris: continue
+            if jours_ouvres(conge.date_debut, conge.date_fin, anciens) != conge.jours_pris:
+                ignores.append((conge.agent_id, conge.id, "durée saisie manuellement")); continue
+            par_agent[conge.agent_id].append((jours, conge))
+
+        agents = self.db.get_agents_by_ids(par_agent)
+        updates, report = [], []
+        for agent_id, items in sorted(par_agent.items()):
+            ecart = sum(jours - conge.jours_pris for jours, conge in items if self.db.get_type_conge(conge.type_conge).decompte_solde)
+            agent = agents.get(agent_id)
+            if agent and ecart > agent.solde: # Un jour férié retiré peut dépasser le solde restant
+                ignores.extend((agent_id, conge.id, "solde insuffisant") for _, conge in items); continue
+            updates.extend(items)
+            report.append((agent_id, len(items), ecart))
+        try:
+            cursor = self.db.conn.cursor()
+            cursor.executemany("UPDATE conges SET jours_pris = ? WHERE id = ?", [(jours, conge.id) for jours, conge in updates])
+            cursor.executemany("UPDATE agents SET solde = solde - ? WHERE id = ?", [(ecart, agent_id) for agent_id, _, ecart in report if ecart])
+            for _, conge in updates:
+                self.db.queue_event(CongeUpdated(conge.agent_id, conge.id, conge.date_debut.year))
+            for agent_id, _, _ in report:
+                self.db.invalidate_agent_cache(agent_id)
+                self.db.queue_event(AgentUpdated(agent_id))
+            self.db.queue_event(JoursPrisRecalcules(tuple(dates), tuple(report), tuple(ignores)))
+            self.db.commit()
+        except sqlite3.Error as e:
+            self.db.rollback()
+            logging.error(f"Échec du recalcul des jours pris pour {dates}: {e}", exc_info=True); raise e
+        logging.info(f"Jours fériés modifiés ({', '.join(dates)}) : {len(updates)} congé(s) en jours ouvrés recalculé(s) pour {len(report)} agent(s).")
+        for agent_id, conge_id, motif in ignores:
+            logging.warning(f"Agent {agent_id}, congé {conge_id} : non recalculé après modification des jours fériés ({motif}).")
+        return report, ignores
+
+    def _creer_segment(self, cursor, parent, date_debut, date_fin, holidays_set):
+        """Partie restante d'un congé divisé : même type, durée recalculée selon ses règles."""
         if date_debut > date_fin: return
-        jours = jours_ouvres(date_debut, date_fin, holidays_set)
+        jours = strategy_for_type(self.db.get_type_conge(parent.type_conge)).calculate_days(date_debut, date_fin, holidays_set)
         if jours > 0:
-            segment = Conge(None, agent_id, 'Congé annuel', None, None, date_debut.strftime('%Y-%m-%d'), date_fin.strftime('%Y-%m-%d'), jours)
+            segment = Conge(None, parent.agent_id, parent.type_conge, None, None, date_debut.strftime('%Y-%m-%d'), date_fin.strftime('%Y-%m-%d'), jours)
             self.db._ajouter_conge_no_commit(cursor, segment)
 
     def _handle_certificat_save(self, form_data, is_modification, conge_id):
-        # ... (cette fonction ne change pas, elle est stable)
+        """
+        Rattache (ou retire) le certificat du congé. Le fichier est copié dans le magasin de
+        certificats sur un thread de fond lorsque l'interface est disponible : l'enregistrement
+        du congé n'attend jamais une copie depuis un lecteur réseau.
+        """
         new_path = form_data.get('cert_path')
         original_path = form_data.get('original_cert_path')
-        if not new_path or not conge_id: return
-        if os.path.exists(new_path) and new_path != original_path:
-            try:
-                filename = f"cert_{form_data['agent_ppr']}_{conge_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}{os.path.splitext(new_path)[1]}"
-                dest_path = os.path.join(self.certificats_dir, filename)
-                shutil.copy(new_path, dest_path)
-                cert_model = type('Certificat', (object,), {'duree_jours': form_data['jours_pris'], 'chemin_fichier': dest_path})()
-                self.db.execute_query("REPLACE INTO certificats_medicaux (conge_id, duree_jours, chemin_fichier) VALUES (?, ?, ?)",
-                                      (conge_id, cert_model.duree_jours, cert_model.chemin_fichier))
-                if original_path and os.path.exists(original_path): os.remove(original_path)
-            except Exception as e:
-                logging.error(f"Erreur sauvegarde certificat: {e}", exc_info=True)
-                messagebox.showwarning("Erreur Certificat", f"Le congé a été sauvegardé, mais le certificat n'a pas pu être copié:\n{e}")
+        if not conge_id: return
+        if new_path and new_path != original_path:
+            if not os.path.exists(new_path):
+                messagebox.showwarning("Erreur Certificat", f"Le congé a été sauvegardé, mais le fichier est introuvable :\n{new_path}")
+                return
+            on_done = lambda stored: self._attach_certificat(conge_id, form_data['jours_pris'], stored)
+            if self.ui is None:
+                try: on_done(self._store_certificat(new_path))
+                except (OSError, sqlite3.Error) as e: self._on_certificat_error(e)
+                return
+            self.ui.set_status(f"Copie du certificat {os.path.basename(new_path)}...")
+            BackgroundTask(self.ui, self._store_certificat, new_path, on_done=on_done, on_error=self._on_certificat_error,
+                           on_progress=self._on_certificat_progress).start()
         elif not new_path and original_path:
             try:
-                self.db.execute_query("DELETE FROM certificats_medicaux WHERE conge_id = ?", (conge_id,))
-                if os.path.exists(original_path): os.remove(original_path)
-            except Exception as e:
-                logging.error(f"Impossible de supprimer l'ancien certificat pour conge_id {conge_id}: {e}")
\ No newline at end of file
+                cursor = self.db.conn.cursor()
+                cert = cursor.execute("SELECT chemin_fichier, sha256 FROM certificats_medicaux WHERE conge_id = ?", (conge_id,)).fetchone()
+                cursor.execute("DELETE FROM certificats_medicaux WHERE conge_id = ?", (conge_id,))
+                if cert: self.db.release_certificat_file(*cert)
+                self.db.commit()
+            except sqlite3.Error as e:
+                self.db.rollback()
+                logging.error(f"Impossible de supprimer l'ancien certificat pour conge_id {conge_id}: {e}")
+
+    def _store_certificat(self, source_path, progress=None):
+        """
+        Copie dans le magasin (thread de fond) ; l'empreinte reste épinglée jusqu'à l'enregistrement de la ligne
+        par _attach_certificat, pour qu'un commit intermédiaire ne supprime pas un fichier dédoublonné.
+        """
+        pinned = []
+        def pin(sha256):
+            self.db.pin_certificat(sha256); pinned.append(sha256)
+        try:
+            return self.certificats.store(source_path, progress, pin=pin)
+        except BaseException:
+            for sha256 in pinned: self.db.unpin_certificat(sha256)
+            raise
+
+    def _attach_certificat(self, conge_id, duree_jours, stored):
+        """Enregistre le certificat copié (empreinte, chemin) ; appelé dans le thread principal."""
+        sha256, chemin = stored
+        try:
+            cursor = self.db.conn.cursor()
+            conge = cursor.execute("SELECT agent_id, date_debut FROM conges WHERE id = ?", (conge_id,)).fetchone()
+            if conge:
+                self.db._add_or_update_certificat_no_commit(cursor, conge_id, Certificat(None, conge_id, None, duree_jours, chemin, sha256))
+                self.db.queue_event(CongeUpdated(conge[0], conge_id, int(conge[1][:4])))
+            self.db.unpin_certificat(sha256) # Avant le commit : la ligne compte désormais, ou le fichier peut partir
+            if not conge:
+                self.db.release_certificat_file(chemin, sha256) # Congé supprimé pendant la copie
+            self.db.commit()
+        except sqlite3.Error as e:
+            self.db.unpin_certificat(sha256)
+            self.db.rollback()
+            self._on_certificat_error(e)
+            return
+        if self.ui is not None: self.ui.set_status("Certificat enregistré.")
+
+    def _on_certificat_progress(self, done, total):
+        if total: self.ui.set_status(f"Copie du certificat... {done * 100 // total}%")
+
+    def _on_certificat_error(self, error):
+        logging.error(f"Erreur sauvegarde certificat: {error}", exc_info=error)
+        if self.ui is not None: self.ui.set_status("Échec de la copie du certificat.")
+        messagebox.showwarning("Erreur Certificat", f"Le congé a été sauvegardé, mais le certificat n'a pas pu être copié:\n{error}")
@@ -0,0 +1,140 @@
+# core/conges/previsions.py
+"""
+Prévision des soldes de tous les agents à une date future.
+
+agents.solde est déjà diminué de tous les congés enregistrés, y compris ceux qui n'ont pas
+encore commencé. Le solde prévu à la date D part donc du solde "brut" (solde + congés à venir
+décomptés du solde), puis parcourt dans l'ordre les dates d'acquisition comprises entre
+aujourd'hui et D : congés commençant avant chaque date retirés, droits crédités (dans la limite
+du plafond). Les congés enregistrés qui commencent après D ne sont pas encore pris à cette date.
+
+Le calcul est vectorisé sur tous les agents (LeaveFrame, tableaux NumPy) : une seule boucle,
+sur les dates d'acquisition (quelques dizaines au plus), jamais sur les agents ni les congés.
+"""
+from datetime import date
+
+import numpy as np
+
+try:
+    from utils.config_loader import CONFIG
+except ImportError:
+    CONFIG = {}
+
+
+class AccrualRules:
+    """
+    Règles d'acquisition des droits à congé (section conges.acquisition de config.yaml) : jours crédités
+    chaque 1er janvier (annuel) et chaque 1er du mois (mensuel), solde maximal après crédit (plafond,
+    0 : sans plafond), avec des valeurs propres à certains grades (par_grade).
+    """
+    KEYS = ("annuel", "mensuel", "plafond")
+
+    def __init__(self, annuel=0.0, mensuel=0.0, plafond=0.0, par_grade=None):
+        self.default = {"annuel": float(annuel or 0), "mensuel": float(mensuel or 0), "plafond": float(plafond or 0)}
+        self.par_grade = {grade: {key: float(rules.get(key, self.default[key]) or 0) for key in self.KEYS}
+                          for grade, rules in (par_grade or {}).items()}
+
+    @classmethod
+    def from_config(cls, config=None):
+        conf = ((config if config is not None else CONFIG).get('conges') or {}).get('acquisition') or {}
+        return cls(conf.get('annuel', 0), conf.get('mensuel', 0), conf.get('plafond', 0), conf.get('par_grade'))
+
+    def per_agent(self, grades):
+        """Tableaux (annuel, mensuel, plafond) alignés sur la liste des grades des agents."""
+        rules = [self.default] + list(self.par_grade.values())
+        index = {grade: i for i, grade in enumerate(self.par_grade, 1)}
+        codes = np.fromiter((index.get(g, 0) for g in grades), dtype=np.int32, count=len(grades))
+        return tuple(np.array([r[key] for r in rules])[codes] for key in self.KEYS)
+
+    @staticmethod
+    def credit_dates(today, target):
+        """Premiers du mois dans ]today, target] (ordinaux croissants) et indicateur 1er janvier pour chacun."""
+        dates, january = [], []
+        year, month = (today.year, today.month + 1) if today.month < 12 else (today.year + 1, 1)
+        while (year, month) <= (target.year, target.month):
+            dates.append(date(year, month, 1).toordinal()); january.append(month == 1)
+            year, month = (year, month + 1) if month < 12 else (year + 1, 1)
+        return np.array(dates, dtype=np.int64), np.array(january, dtype=bool)
+
+
+class BalanceForecast:
+    """
+    Soldes prévus (une ligne par agent, colonnes NumPy) : solde actuel, congés à venir retirés d'ici la date,
+    droits acquis, solde prévu, et congés enregistrés commençant après la date (non encore pris).
+    """
+    COLUMNS = ("agent_id", "nom", "prenom", "ppr", "grade", "solde", "a_venir", "acquis", "prevu", "apres")
+    TEXT_COLUMNS = ("nom", "prenom", "ppr", "grade")
+
+    def __init__(self, target, today, columns):
+        self.target = target
+        self.today = today
+        for name in self.COLUMNS:
+            setattr(self, name, columns[name])
+
+    def __len__(self):
+        return len(self.agent_id)
+
+    def order(self, column, reverse=False):
+        """Indices des lignes triées sur une colonne (tri stable, textes sans tenir compte de la casse)."""
+        values = getattr(self, column)
+        if column in self.TEXT_COLUMNS:
+            values = np.array([str(v or "").lower() for v in values])
+        order = np.argsort(values, kind="stable")
+        return order[::-1] if reverse else order
+
+    def rows(self, indices=None):
+        """Lignes (tuples dans l'ordre de COLUMNS) pour les indices donnés (toutes par défaut)."""
+        indices = range(len(self)) if indices is None else indices
+        columns = [getattr(self, name) for name in self.COLUMNS]
+        return [tuple(col[i].item() if isinstance(col[i], np.generic) else col[i] for col in columns) for i in indices]
+
+
+def forecast_balances(frame, agents, target, today=None, rules=None, decompte_type_ids=None, statut_actif=1):
+    """
+    Solde prévu de chaque agent au soir de target (date). frame : LeaveFrame des congés ; agents :
+    [(id, nom, prénom, ppr, grade, solde)] triés par id ; rules : AccrualRules (config par défaut).
+    """
+    today = today or date.today()
+    target = target.date() if hasattr(target, "date") else target
+    if target < today:
+        raise ValueError("La date de prévision doit être postérieure ou égale à aujourd'hui.")
+    rules = rules or AccrualRules.from_config()
+    ids = np.fromiter((a[0] for a in agents), dtype=np.int64, count=len(agents))
+    solde = np.fromiter((a[5] or 0 for a in agents), dtype=np.float64, count=len(agents))
+    annuel, mensuel, plafond = rules.per_agent([a[4] for a in agents])
+    n = len(ids)
+
+    # Congés actifs décomptés du solde qui n'ont pas encore commencé, rattachés à leur agent
+    decompte = decompte_type_ids if decompte_type_ids is not None else frame.type_ids("decompte_solde")
+    future = (frame.statut_id == statut_actif) & np.isin(frame.type_id, decompte) & (frame.debut > today.toordinal())
+    agent_ids, debut, jours = frame.agent_id[future], frame.debut[future], frame.jours_pris[future].astype(np.float64)
+    idx = np.minimum(np.searchsorted(ids, agent_ids), max(n - 1, 0))
+    known = (ids[idx] == agent_ids) if n else np.zeros(0, dtype=bool)
+    idx, debut, jours = idx[known], debut[known], jours[known]
+
+    after = debut > target.toordinal()
+    apres = np.bincount(idx[after], weights=jours[after], minlength=n)
+    # Congés jusqu'à la date, répartis entre les dates d'acquisition (un congé commençant un 1er suit le crédit du jour)
+    credit_days, january = rules.credit_dates(today, target)
+    idx, debut, jours = idx[~after], debut[~after], jours[~after]
+    bucket = np.searchsorted(credit_days, debut, side="right")
+    order = np.argsort(bucket, kind="stable")
+    idx, jours, bucket = idx[order], jours[order], bucket[order]
+    bounds = np.searchsorted(bucket, np.arange(len(credit_days) + 2))
+
+    balance = solde + apres + np.bincount(idx, weights=jours, minlength=n)
+    acquis = np.zeros(n)
+    capped = plafond > 0
+    for k in range(len(credit_days) + 1):
+        taken = slice(bounds[k], bounds[k + 1])
+        balance -= np.bincount(idx[taken], weights=jours[taken], minlength=n)
+        if k == len(credit_days): break
+        credit = mensuel + (annuel if january[k] else 0)
+        credited = balance + credit
+        credited = np.where(capped, np.maximum(balance, np.minimum(credited, plafond)), credited) # Le plafond limite le crédit, pas le solde existant
+        acquis += credited - balance
+        balance = credited
+    return BalanceForecast(target, today, {
+        "agent_id": ids, "nom": [a[1] for a in agents], "prenom": [a[2] for a in agents], "ppr": [a[3] for a in agents],
+        "grade": [a[4] for a in agents], "solde": solde, "a_venir": np.bincount(idx, weights=jours, minlength=n),
+        "acquis": acquis, "prevu": balance, "apres": apres})
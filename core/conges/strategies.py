@@ -3,9 +3,8 @@ from abc import ABC, abstractmethod
 from datetime import datetime, timedelta
 import os
 
-# Import des fonctions et de la configuration depuis vos modules utilitaires
+# Import des fonctions depuis vos modules utilitaires
 from utils.date_utils import jours_ouvres
-from utils.config_loader import CONFIG
 
 class CongeStrategy(ABC):
     """
@@ -61,9 +60,10 @@ class CongeStrategy(ABC):
 
 
 # --- Implémentations concrètes des stratégies ---
+# Chaque type de congé (table types_conge) en reçoit une selon ses règles : voir strategy_for_type.
 
 class CongeAnnuelStrategy(CongeStrategy):
-    """Stratégie pour les congés annuels, calculés en jours ouvrés."""
+    """Stratégie pour les congés calculés en jours ouvrés (congé annuel)."""
     def calculate_end_date(self, start_date, days_to_add, holidays_set):
         if days_to_add <= 0: return start_date
         temp_date = start_date.date()
@@ -87,38 +87,9 @@ class CongeCalendaireStrategy(CongeStrategy):
     def calculate_days(self, start_date, end_date, holidays_set):
         return (end_date - start_date).days + 1
 
-class CongeMaladieStrategy(CongeCalendaireStrategy):
-    """Stratégie pour le congé maladie. Hérite du calcul calendaire et ajoute le besoin d'un certificat."""
-    def __init__(self):
-        super().__init__()
-        self.requires_certificat = True
-
-class CongeMaterniteStrategy(CongeCalendaireStrategy):
-    """Stratégie pour le congé maternité, avec une durée fixe chargée depuis la configuration."""
-    def __init__(self):
-        super().__init__()
-        self.days_value = str(CONFIG['conges']['maternite_duree'])
-        # ================== MODIFICATION APPLIQUÉE ICI ==================
-        # Les champs sont maintenant modifiables par l'utilisateur.
-        self.days_state = "normal"
-        self.end_date_state = "normal"
-        # ================================================================
-
-    def calculate_days(self, start_date, end_date, holidays_set):
-        # On utilise le calcul de la classe parente (calendaire) pour rester flexible.
-        return super().calculate_days(start_date, end_date, holidays_set)
-
-class CongePaterniteStrategy(CongeCalendaireStrategy):
-    """Stratégie pour le congé paternité, avec une durée fixe chargée depuis la configuration."""
-    def __init__(self):
-        super().__init__()
-        self.days_value = str(CONFIG['conges']['paternite_duree'])
-        # ================== MODIFICATION APPLIQUÉE ICI ==================
-        # Les champs sont maintenant modifiables par l'utilisateur.
-        self.days_state = "normal"
-        self.end_date_state = "normal"
-        # ================================================================
-
-    def calculate_days(self, start_date, end_date, holidays_set):
-        # On utilise le calcul de la classe parente (calendaire) pour rester flexible.
-        return super().calculate_days(start_date, end_date, holidays_set)
\ No newline at end of file
+def strategy_for_type(type_conge):
+    """Stratégie d'un type de congé (table types_conge) : calcul en jours ouvrés ou calendaires, certificat, durée proposée."""
+    strategy = CongeAnnuelStrategy() if type_conge.jours_ouvres else CongeCalendaireStrategy()
+    strategy.requires_certificat = type_conge.certificat_requis
+    if type_conge.duree_defaut: strategy.days_value = str(type_conge.duree_defaut)
+    return strategy
@@ -0,0 +1,250 @@
+# core/doublons.py
+"""
+Détection des doublons probables parmi les agents (import Excel et audit de toute la base).
+
+Comparer toutes les paires d'agents est quadratique. Les agents sont donc d'abord regroupés par
+nom normalisé (sans accents, casse ni espaces) : les homonymes exacts forment un seul groupe.
+Chaque nom distinct reçoit des clés de blocage (code phonétique des deux noms, dans un ordre
+indépendant de l'inversion nom/prénom, débuts et fins de nom et de prénom) ; seuls les noms
+partageant une clé sont comparés, avec difflib.SequenceMatcher. Entre deux groupes de noms
+proches, les PPR sont rapprochés par fragments (deux chiffres voisins masqués) plutôt que paire
+par paire : une faute de frappe laisse au moins un fragment intact.
+
+Deux agents dont les PPR sont connus et clairement différents ne sont jamais des doublons
+(homonymes) ; un PPR manquant, ou deux PPR à une faute de frappe près, le permettent.
+"""
+import logging
+import re
+import time
+import unicodedata
+from difflib import SequenceMatcher
+
+try:
+    from utils.config_loader import CONFIG
+except ImportError:
+    CONFIG = {}
+
+_RE_NON_ALNUM = re.compile(r"[^\w]+")
+_PHONETIC_RULES = (("ph", "f"), ("kh", "k"), ("gh", "g"), ("sch", "s"), ("ch", "s"), ("sh", "s"), ("dj", "j"), ("ou", "u"),
+                   ("ck", "k"), ("q", "k"), ("c", "k"), ("z", "s"), ("x", "ks"), ("w", "u"), ("y", "i"))
+_SILENT = set("aeiouh") | set("اأإآويىةءئؤ") # Voyelles (latines et longues arabes) et h muet
+
+
+def normalize(text):
+    """Minuscules, sans accents ni signes diacritiques (y compris les voyelles brèves arabes), mots séparés par une espace."""
+    decomposed = unicodedata.normalize("NFKD", str(text or "").lower())
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _RE_NON_ALNUM.sub(" ", stripped).replace("_", " ").strip()
+
+
+def phonetic(word):
+    """Code phonétique simple, adapté aux transcriptions : Mohamed, Mohammed et Mhamed donnent le même code."""
+    word = word.replace(" ", "")
+    for old, new in _PHONETIC_RULES:
+        word = word.replace(old, new)
+    code = word[:1]
+    for ch in word[1:]:
+        if ch not in _SILENT and ch != code[-1:]: code += ch
+    return code[:6]
+
+
+def ppr_close(a, b):
+    """Deux PPR distants d'une faute de frappe : un caractère remplacé, ajouté, retiré, ou deux voisins inversés."""
+    if a == b: return True
+    if len(a) == len(b):
+        diffs = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(diffs) == 1 or (len(diffs) == 2 and diffs[1] == diffs[0] + 1 and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]])
+    if abs(len(a) - len(b)) != 1: return False
+    short, long_ = (a, b) if len(a) < len(b) else (b, a)
+    i = 0
+    while i < len(short) and short[i] == long_[i]: i += 1
+    return short[i:] == long_[i + 1:]
+
+
+class DuplicateDetector:
+    """
+    Index des agents pour la recherche de doublons. rows : lignes (id, nom, prénom, ppr, ...) ;
+    l'id peut être None (ligne d'un fichier importé pas encore enregistrée).
+    """
+    PPR_NAME_FACTOR = 0.85 # Deux PPR à une faute près : seuil de similarité des noms abaissé d'autant
+
+    def __init__(self, seuil=0.85, max_bloc=200, fenetre=20):
+        self.seuil = seuil
+        self.seuil_ppr = seuil * self.PPR_NAME_FACTOR
+        self.max_bloc = max_bloc
+        self.fenetre = fenetre
+        self.rows = []
+        self._groups = {}      # nom normalisé -> indices des agents (homonymes exacts)
+        self._name_keys = {}   # clé de blocage -> noms normalisés
+        self._ppr_keys = {}    # nom normalisé -> (un agent sans PPR ?, {fragment de PPR: indices}), construit à la demande
+        self._names = {}       # (nom, prénom) bruts -> nom normalisé
+
+    @classmethod
+    def from_config(cls, config=None):
+        conf = (config if config is not None else CONFIG).get('doublons') or {}
+        return cls(conf.get('seuil', 0.85), conf.get('max_bloc', 200), conf.get('fenetre', 20))
+
+    # --- Index ---
+    def _name(self, nom, prenom):
+        """Nom normalisé compact "nom prénom" (les espaces internes ne comptent pas : El Amrani = Elamrani)."""
+        name = self._names.get((nom, prenom))
+        if name is None:
+            name = self._names[(nom, prenom)] = f"{normalize(nom).replace(' ', '')} {normalize(prenom).replace(' ', '')}".strip()
+        return name
+
+    @staticmethod
+    def _keys_for_name(name):
+        """Clés de blocage : chacune résiste à une faute dans une partie différente du nom ou du prénom."""
+        nom, _, prenom = name.partition(" ")
+        return {"p:" + "|".join(sorted((phonetic(nom), phonetic(prenom)))), # Transcriptions, nom et prénom inversés
+                "a:" + nom[:3] + "|" + prenom[:3], "b:" + nom[-3:] + "|" + prenom[:3], "c:" + nom[:3] + "|" + prenom[-3:],
+                "d:" + nom + "|" + prenom[:1]} # Prénom court avec une faute au milieu
+
+    @staticmethod
+    def ppr_fragments(ppr):
+        """PPR avec deux chiffres voisins masqués : une faute de frappe (remplacement, inversion) en garde un intact."""
+        return {ppr[:i] + "**" + ppr[i + 2:] for i in range(max(len(ppr) - 1, 1))}
+
+    def add(self, row):
+        index = len(self.rows)
+        self.rows.append(row)
+        name = self._name(row[1], row[2])
+        group = self._groups.setdefault(name, [])
+        if not group:
+            for key in self._keys_for_name(name): self._name_keys.setdefault(key, []).append(name)
+        group.append(index)
+        self._ppr_keys.pop(name, None)
+        return index
+
+    def index(self, rows):
+        for row in rows: self.add(row)
+        return self
+
+    def _ppr(self, index):
+        ppr = self.rows[index][3]
+        return str(ppr).strip() if ppr else ""
+
+    def _group_ppr_keys(self, name):
+        info = self._ppr_keys.get(name)
+        if info is None:
+            missing, keys = False, {}
+            for index in self._groups[name]:
+                ppr = self._ppr(index)
+                if not ppr:
+                    missing = True
+                    continue
+                for fragment in self.ppr_fragments(ppr): keys.setdefault(fragment, []).append(index)
+            info = self._ppr_keys[name] = (missing, keys)
+        return info
+
+    # --- Comparaisons ---
+    def name_score(self, a, b, seuil=None):
+        """Similarité de deux noms normalisés, nom et prénom éventuellement inversés (0 sous le seuil)."""
+        if a == b: return 1.0
+        seuil = self.seuil if seuil is None else seuil
+        nom, _, prenom = b.partition(" ")
+        best = 0.0
+        for candidate in (b, f"{prenom} {nom}"):
+            matcher = SequenceMatcher(None, a, candidate, autojunk=False)
+            if matcher.real_quick_ratio() >= seuil and matcher.quick_ratio() >= seuil:
+                best = max(best, matcher.ratio())
+        return best if best >= seuil else 0.0
+
+    def _block_pairs(self, names, info):
+        """
+        Paires de noms d'un bloc à comparer, sans parcourir toutes les paires : chaque groupe comptant un agent
+        sans PPR face aux autres noms (les voisins dans l'ordre alphabétique si le bloc dépasse max_bloc), et les
+        groupes ayant un fragment de PPR en commun. Deux groupes dont tous les PPR sont connus et éloignés sont
+        des homonymes : ils ne sont pas comparés. Rend (a, b, PPR proches ?).
+        """
+        large = len(names) > self.max_bloc
+        if large: names = sorted(names)
+        by_fragment = {}
+        for x, a in enumerate(names):
+            missing, keys = info[a]
+            if missing:
+                for b in (names[max(x - self.fenetre, 0):x + self.fenetre + 1] if large else names):
+                    if b != a: yield a, b, not keys.keys().isdisjoint(info[b][1])
+            for fragment in keys:
+                by_fragment.setdefault(fragment, []).append(a)
+        for members in by_fragment.values():
+            for x in range(1, len(members)):
+                for y in range(x):
+                    if members[x] != members[y]: yield members[x], members[y], True
+
+    def _group_pairs(self, a, b, score):
+        """
+        Paires d'agents probablement identiques entre les groupes de noms a et b (a == b : homonymes exacts) :
+        un PPR manquant (noms assez proches), ou deux PPR à une faute près, trouvés par leurs fragments.
+        """
+        if score >= self.seuil:
+            for x, y in ((a, b), (b, a)):
+                for i in self._groups[x]:
+                    if self._ppr(i): continue
+                    for j in self._groups[y]:
+                        if i != j: yield i, j, ("Même nom, PPR manquant" if score == 1.0 else "Noms proches, PPR manquant")
+        keys_a, keys_b = self._group_ppr_keys(a)[1], self._group_ppr_keys(b)[1]
+        for fragment, members in keys_a.items():
+            for i in members:
+                for j in keys_b.get(fragment, ()):
+                    if i != j and ppr_close(self._ppr(i), self._ppr(j)):
+                        yield i, j, "PPR identique" if self._ppr(i) == self._ppr(j) else "Noms et PPR proches"
+
+    def audit(self, progress=None):
+        """
+        Doublons probables de tout l'index : [(score, ligne a, ligne b, raison)], du plus sûr au moins sûr.
+        progress(blocs traités, total) est appelé régulièrement.
+        """
+        started = time.perf_counter()
+        found, compared = {}, set()
+
+        def report(a, b, score):
+            for i, j, reason in self._group_pairs(a, b, score):
+                key = (i, j) if i < j else (j, i)
+                if score > found.get(key, (0,))[0]: found[key] = (score, reason)
+
+        info = {name: self._group_ppr_keys(name) for name in self._groups}
+        blocks = [names for names in self._name_keys.values() if len(names) > 1]
+        for count, names in enumerate(blocks, 1):
+            for a, b, close in self._block_pairs(names, info):
+                pair = (a, b) if a < b else (b, a)
+                if pair in compared: continue
+                compared.add(pair)
+                score = self.name_score(a, b, self.seuil_ppr if close else self.seuil)
+                if score: report(a, b, score)
+            if progress and count % 5000 == 0: progress(count, len(blocks))
+        for name, members in self._groups.items():
+            if len(members) > 1: report(name, name, 1.0)
+        if progress: progress(len(blocks), len(blocks))
+
+        results = sorted(((score, self.rows[i], self.rows[j], reason) for (i, j), (score, reason) in found.items()),
+                         key=lambda r: (-r[0], r[1][0] or 0, r[2][0] or 0))
+        logging.info(f"Audit des doublons : {len(self.rows)} agent(s), {len(self._groups)} nom(s) distinct(s), "
+                     f"{len(compared)} paire(s) de noms comparée(s), {len(results)} doublon(s) probable(s) "
+                     f"en {time.perf_counter() - started:.2f} s.")
+        return results
+
+    def find(self, nom, prenom, ppr=None, limit=5):
+        """Agents de l'index qui pourraient être la même personne : [(score, ligne, raison)], du plus sûr au moins sûr."""
+        name = self._name(nom, prenom)
+        ppr = str(ppr).strip() if ppr else ""
+        fragments = self.ppr_fragments(ppr) if ppr else ()
+        candidates = {name} if name in self._groups else set()
+        for key in self._keys_for_name(name):
+            candidates.update(self._name_keys.get(key, ()))
+        matches = {}
+        for other in candidates:
+            missing, keys = self._group_ppr_keys(other)
+            close = any(fragment in keys for fragment in fragments)
+            if ppr and not (missing or close): continue
+            score = self.name_score(name, other, self.seuil_ppr if close else self.seuil)
+            if not score: continue
+            if score >= self.seuil:
+                for index in self._groups[other]:
+                    if not ppr or not self._ppr(index):
+                        matches[index] = (score, "Même nom, PPR manquant" if score == 1.0 else "Noms proches, PPR manquant")
+            for fragment in fragments:
+                for index in keys.get(fragment, ()):
+                    if ppr_close(ppr, self._ppr(index)):
+                        matches[index] = (score, "PPR identique" if ppr == self._ppr(index) else "Noms et PPR proches")
+        return sorted(((score, self.rows[index], reason) for index, (score, reason) in matches.items()), key=lambda m: -m[0])[:limit]
@@ -0,0 +1,82 @@
+# core/events.py
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+
+
+# --- Événements de modification des données ---
+# Ils sont publiés après le commit de la transaction qui les a produits,
+# pour que les vues ne mettent à jour que les lignes concernées.
+
+@dataclass(frozen=True)
+class AgentAdded:
+    agent_id: int
+
+@dataclass(frozen=True)
+class AgentUpdated:
+    agent_id: int
+
+@dataclass(frozen=True)
+class AgentDeleted:
+    agent_id: int
+
+@dataclass(frozen=True)
+class CongeAdded:
+    agent_id: int
+    conge_id: int
+    annee: int
+
+@dataclass(frozen=True)
+class CongeUpdated:
+    """Changement d'un congé existant (statut, durée) ; le solde de l'agent a pu changer."""
+    agent_id: int
+    conge_id: int
+    annee: int
+
+@dataclass(frozen=True)
+class CongeDeleted:
+    agent_id: int
+    conge_id: int
+    annee: int
+
+@dataclass(frozen=True)
+class HolidaysChanged:
+    dates: tuple = ()
+
+@dataclass(frozen=True)
+class JoursPrisRecalcules:
+    """
+    Rapport du recalcul après un changement de jours fériés : (agent_id, nb congés, écart en jours) par agent,
+    et congés laissés tels quels : (agent_id, conge_id, motif).
+    """
+    dates: tuple = ()
+    agents: tuple = ()
+    ignores: tuple = ()
+
+@dataclass(frozen=True)
+class HistoriqueCompacte:
+    """Chaînes de division anciennes remplacées par un enregistrement de conges_historique."""
+    agents: tuple = ()
+    nb_chaines: int = 0
+    nb_lignes: int = 0
+
+
+class EventBus:
+    """Bus de publication/abonnement minimal, par type d'événement."""
+    def __init__(self):
+        self._subscribers = defaultdict(list)
+
+    def subscribe(self, event_type, callback):
+        self._subscribers[event_type].append(callback)
+
+    def unsubscribe(self, event_type, callback):
+        if callback in self._subscribers[event_type]:
+            self._subscribers[event_type].remove(callback)
+
+    def publish(self, event):
+        for callback in list(self._subscribers[type(event)]):
+            try:
+                callback(event)
+            except Exception as e:
+                # Un abonné défaillant ne doit pas faire échouer l'écriture déjà validée
+                logging.error(f"Erreur dans l'abonné {callback!r} pour {event!r}: {e}", exc_info=True)
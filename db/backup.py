@@ -0,0 +1,407 @@
+# db/backup.py
+"""
+Sauvegardes à chaud de la base, sans bloquer les écritures de l'application.
+
+La copie utilise l'API de sauvegarde de SQLite (Connection.backup) par petits pas de
+pages, avec une pause entre deux pas : le verrou de lecture n'est tenu que le temps
+d'un pas. Une copie sans cesse relancée par les écritures est abandonnée (BackupRestarted)
+et reprise à la vérification suivante, jamais terminée en un seul pas : sur une grosse base,
+le verrou tenu pendant toute la copie ferait échouer les écritures des agents ("database is
+locked"). La copie est vérifiée (PRAGMA integrity_check), compressée (gzip) et
+accompagnée de son empreinte (<fichier>.sha256, format sha256sum). Les sauvegardes
+sont ensuite renouvelées : la plus récente de chacun des N derniers jours et des
+M dernières semaines est conservée.
+
+Les archives des années clôturées (archives/archive_AAAA.db), qui ne changent plus après leur
+création, sont copiées une seule fois, de la même façon, dans <sauvegardes>/archives/ lors de la
+première sauvegarde qui suit l'archivage ; verify et restore les couvrent aussi.
+
+    python -m db.backup create
+    python -m db.backup list
+    python -m db.backup verify sauvegardes/conges_v3-20250101-120000.db.gz
+    python -m db.backup restore sauvegardes/conges_v3-20250101-120000.db.gz   (application fermée)
+"""
+import gzip
+import hashlib
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+try:
+    from utils.config_loader import CONFIG
+except ImportError:
+    CONFIG = {}
+
+_RE_BACKUP = re.compile(r"^(?P<base>.+)-(?P<stamp>\d{8}-\d{6})\.db\.gz$")
+_RE_ARCHIVE = re.compile(r"^archive_\d{4}\.db$")
+
+
+class BackupAborted(Exception):
+    """Sauvegarde interrompue (fermeture de l'application)."""
+
+
+class BackupRestarted(Exception):
+    """Copie relancée trop souvent par des écritures concurrentes : à refaire plus tard."""
+
+
+class BackupManager:
+    CHUNK_SIZE = 1024 * 1024
+    MAX_RESTARTS = 3 # Copie reprise à zéro (écritures concurrentes) avant d'être abandonnée
+    ARCHIVES_DIR = "archives" # Sous-dossier des copies d'archives annuelles, hors rétention
+
+    def __init__(self, db_file, backup_dir, daily=7, weekly=4, pages=256, sleep=0.02, archive_dir=None):
+        self.db_file = db_file
+        self.backup_dir = backup_dir
+        self.archive_dir = archive_dir # Archives annuelles de la base (None : aucune)
+        self.daily = daily
+        self.weekly = weekly
+        self.pages = pages
+        self.sleep = sleep
+        self.base_name = os.path.splitext(os.path.basename(db_file))[0]
+
+    @classmethod
+    def from_config(cls, db_file, config=None):
+        db_conf = (config if config is not None else CONFIG).get('db') or {}
+        conf = db_conf.get('backup') or {}
+        base_dir = os.path.dirname(os.path.abspath(db_file))
+        backup_dir = os.path.join(base_dir, conf.get('dir', 'sauvegardes')) # Chemin absolu conservé tel quel
+        return cls(db_file, backup_dir, daily=conf.get('daily', 7), weekly=conf.get('weekly', 4),
+                   pages=conf.get('pages', 256), sleep=conf.get('sleep_ms', 20) / 1000.0,
+                   archive_dir=os.path.join(base_dir, db_conf.get('archive_dir', 'archives')))
+
+    # --- Création ---
+    def _copy(self, dest_path, progress=None, should_stop=None, source=None):
+        """Copie la base (ou source) page par page dans dest_path ; BackupRestarted si elle est sans cesse relancée."""
+        state = {"remaining": None, "restarts": 0}
+
+        def on_step(status, remaining, total):
+            if should_stop and should_stop(): raise BackupAborted()
+            if state["remaining"] is not None and remaining >= state["remaining"]:
+                state["restarts"] += 1 # La base a été modifiée par une autre connexion : SQLite recommence (aucune page gagnée)
+                if state["restarts"] > self.MAX_RESTARTS:
+                    raise BackupRestarted(f"Sauvegarde relancée {state['restarts']} fois par des écritures : abandonnée.")
+            state["remaining"] = remaining
+            if progress: progress(total - remaining, total)
+            if self.sleep: time.sleep(self.sleep) # Laisse passer les écritures entre deux pas
+
+        src = sqlite3.connect(source or self.db_file)
+        try:
+            dst = sqlite3.connect(dest_path)
+            try:
+                src.backup(dst, pages=self.pages, progress=on_step)
+            finally:
+                dst.close()
+        finally:
+            src.close()
+
+    @staticmethod
+    def _integrity_error(db_path):
+        """None si la base est saine, sinon le message d'integrity_check."""
+        conn = sqlite3.connect(db_path)
+        try:
+            result = [row[0] for row in conn.execute("PRAGMA integrity_check").fetchall()]
+        except sqlite3.DatabaseError as e:
+            return str(e)
+        finally:
+            conn.close()
+        return None if result == ["ok"] else "; ".join(result[:5])
+
+    @classmethod
+    def file_sha256(cls, path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(cls.CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def create_backup(self, progress=None, should_stop=None):
+        """Crée une sauvegarde vérifiée et compressée, puis copie les archives annuelles nouvelles ; renvoie son chemin."""
+        os.makedirs(self.backup_dir, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        final_path = os.path.join(self.backup_dir, f"{self.base_name}-{stamp}.db.gz")
+        started = time.perf_counter()
+        self._write_backup(final_path, progress, should_stop)
+        logging.info(f"Sauvegarde créée : {final_path} ({os.path.getsize(final_path) / 1024 / 1024:.1f} Mo, "
+                     f"{time.perf_counter() - started:.1f} s)")
+        try:
+            self.backup_archives(should_stop)
+        except (OSError, sqlite3.Error) as e: # Refait à la sauvegarde suivante : la copie manque toujours
+            logging.error(f"Sauvegarde des archives annuelles impossible : {e}")
+        return final_path
+
+    def _write_backup(self, final_path, progress=None, should_stop=None, source=None):
+        """Copie, contrôle, compresse et signe (<fichier>.sha256) la base ou source dans final_path."""
+        fd, raw_path = tempfile.mkstemp(dir=os.path.dirname(final_path), suffix=".db.tmp")
+        os.close(fd)
+        gz_tmp = final_path + ".tmp"
+        try:
+            self._copy(raw_path, progress, should_stop, source)
+            error = self._integrity_error(raw_path)
+            if error: raise sqlite3.DatabaseError(f"Copie incohérente : {error}")
+            with open(raw_path, "rb") as src, gzip.open(gz_tmp, "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, self.CHUNK_SIZE)
+            sha256 = self.file_sha256(gz_tmp)
+            with open(final_path + ".sha256", "w", encoding="utf-8") as f:
+                f.write(f"{sha256}  {os.path.basename(final_path)}\n")
+            os.replace(gz_tmp, final_path)
+        finally:
+            for path in (raw_path, gz_tmp):
+                if os.path.exists(path): os.remove(path)
+
+    # --- Archives des années clôturées ---
+    def archives_backup_dir(self):
+        return os.path.join(self.backup_dir, self.ARCHIVES_DIR)
+
+    def list_archive_backups(self):
+        """[(nom de l'archive, chemin de sa copie)] des archives annuelles sauvegardées, par nom."""
+        directory = self.archives_backup_dir()
+        if not os.path.isdir(directory): return []
+        return sorted((entry.name[:-3], entry.path) for entry in os.scandir(directory)
+                      if entry.name.endswith(".gz") and _RE_ARCHIVE.match(entry.name[:-3]))
+
+    def backup_archives(self, should_stop=None):
+        """Copie une fois chaque archive annuelle qui n'a pas encore de copie ; renvoie les chemins créés."""
+        if not self.archive_dir or not os.path.isdir(self.archive_dir): return []
+        saved = dict(self.list_archive_backups())
+        created = []
+        for entry in sorted(os.scandir(self.archive_dir), key=lambda e: e.name):
+            if not _RE_ARCHIVE.match(entry.name) or entry.name in saved: continue
+            os.makedirs(self.archives_backup_dir(), exist_ok=True)
+            final_path = os.path.join(self.archives_backup_dir(), entry.name + ".gz")
+            self._write_backup(final_path, should_stop=should_stop, source=entry.path)
+            created.append(final_path)
+            logging.info(f"Archive {entry.name} sauvegardée : {final_path}")
+        return created
+
+    def verify_archives(self):
+        """[(nom de l'archive, ok, message)] pour chaque copie d'archive annuelle."""
+        return [(name, *self.verify(path)) for name, path in self.list_archive_backups()]
+
+    def restore_archives(self, archive_dir=None):
+        """
+        Remet en place les archives annuelles absentes de archive_dir (défaut : celui de la base) depuis leurs
+        copies vérifiées ; une archive présente n'est pas remplacée (elle ne change plus après sa création).
+        Renvoie (archives restaurées, [(archive, message)] des copies refusées).
+        """
+        archive_dir = archive_dir or self.archive_dir
+        restored, refused = [], []
+        for name, path in self.list_archive_backups():
+            target = os.path.join(archive_dir, name)
+            if os.path.exists(target): continue
+            os.makedirs(archive_dir, exist_ok=True)
+            ok, message, raw_path = self._verified_copy(path, archive_dir)
+            if not ok:
+                refused.append((name, message)); logging.error(f"Archive {name} non restaurée : {message}")
+                continue
+            os.replace(raw_path, target)
+            restored.append(name)
+        if restored: logging.info(f"Archive(s) restaurée(s) dans {archive_dir} : {', '.join(restored)}.")
+        return restored, refused
+
+    # --- Inventaire et renouvellement ---
+    def list_backups(self):
+        """[(date, chemin)] des sauvegardes de cette base, de la plus récente à la plus ancienne."""
+        if not os.path.isdir(self.backup_dir): return []
+        backups = []
+        for entry in os.scandir(self.backup_dir):
+            match = _RE_BACKUP.match(entry.name)
+            if match and match.group("base") == self.base_name:
+                backups.append((datetime.strptime(match.group("stamp"), "%Y%m%d-%H%M%S"), entry.path))
+        return sorted(backups, reverse=True)
+
+    def rotate(self):
+        """Garde la plus récente sauvegarde de chacun des `daily` derniers jours et des `weekly` dernières semaines."""
+        backups = self.list_backups()
+        keep, days, weeks = set(), {}, {}
+        for when, path in backups:
+            days.setdefault(when.date(), path)
+            weeks.setdefault(when.isocalendar()[:2], path)
+        keep.update(list(days.values())[:self.daily])
+        keep.update(list(weeks.values())[:self.weekly])
+        if backups: keep.add(backups[0][1])
+        removed = 0
+        for _, path in backups:
+            if path in keep: continue
+            for victim in (path, path + ".sha256"):
+                try:
+                    if os.path.exists(victim): os.remove(victim)
+                except OSError as e:
+                    logging.error(f"Suppression de l'ancienne sauvegarde {victim} impossible : {e}")
+            removed += 1
+        if removed: logging.info(f"{removed} ancienne(s) sauvegarde(s) supprimée(s).")
+        return removed
+
+    def last_backup_time(self):
+        backups = self.list_backups()
+        return backups[0][0] if backups else None
+
+    # --- Vérification et restauration ---
+    def _decompress(self, backup_path, dest_dir):
+        fd, raw_path = tempfile.mkstemp(dir=dest_dir, suffix=".db.tmp")
+        os.close(fd)
+        with gzip.open(backup_path, "rb") as src, open(raw_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, self.CHUNK_SIZE)
+        return raw_path
+
+    def _verified_copy(self, backup_path, dest_dir):
+        """Contrôle l'empreinte puis l'intégrité de la base décompressée dans dest_dir : (ok, message, copie ou None)."""
+        sidecar = backup_path + ".sha256"
+        if not os.path.exists(sidecar): return False, "Fichier d'empreinte absent.", None
+        with open(sidecar, encoding="utf-8") as f:
+            expected = f.read().split()[0]
+        if self.file_sha256(backup_path) != expected:
+            return False, "Empreinte sha256 différente : fichier altéré ou incomplet.", None
+        raw_path = None
+        try:
+            raw_path = self._decompress(backup_path, dest_dir)
+            error = self._integrity_error(raw_path)
+            if not error: return True, "Sauvegarde intègre.", raw_path
+            message = f"Base corrompue : {error}"
+        except (OSError, EOFError) as e:
+            message = f"Décompression impossible : {e}"
+        if raw_path and os.path.exists(raw_path): os.remove(raw_path)
+        return False, message, None
+
+    def verify(self, backup_path):
+        """Renvoie (ok, message) ; la copie décompressée servant au contrôle est supprimée."""
+        ok, message, raw_path = self._verified_copy(backup_path, self.backup_dir)
+        if raw_path: os.remove(raw_path)
+        return ok, message
+
+    def restore(self, backup_path, target=None):
+        """
+        Remplace la base (application fermée) par une sauvegarde vérifiée. L'ancienne base est
+        conservée à côté (<base>.avant-restauration-<horodatage>). Les archives annuelles manquantes
+        sont remises en place (restore_archives). Renvoie le chemin de l'ancienne base.
+        """
+        target = target or self.db_file
+        ok, message, raw_path = self._verified_copy(backup_path, os.path.dirname(os.path.abspath(target)))
+        if not ok: raise ValueError(f"Restauration refusée : {message}")
+        previous = None
+        if os.path.exists(target):
+            previous = f"{target}.avant-restauration-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+            os.replace(target, previous)
+        for suffix in ("-journal", "-wal", "-shm"): # Journaux de l'ancienne base : ne doivent pas s'appliquer à la nouvelle
+            if os.path.exists(target + suffix): os.replace(target + suffix, (previous or target) + suffix)
+        os.replace(raw_path, target)
+        logging.info(f"Base restaurée depuis {backup_path} (ancienne base : {previous}).")
+        if self.archive_dir:
+            # Une base restaurée ailleurs reçoit ses archives à côté d'elle, dans un dossier du même nom
+            same_place = os.path.abspath(target) == os.path.abspath(self.db_file)
+            self.restore_archives(None if same_place else os.path.join(os.path.dirname(os.path.abspath(target)), os.path.basename(self.archive_dir)))
+        return previous
+
+
+class BackupScheduler:
+    """
+    Thread de fond qui crée une sauvegarde lorsque la dernière date de plus de interval_hours,
+    puis applique la rétention. stop() interrompt une sauvegarde en cours au pas suivant.
+    """
+    CHECK_INTERVAL = 600 # s entre deux vérifications
+    INITIAL_DELAY = 60   # s après le démarrage : laisse l'application se charger
+
+    def __init__(self, manager, interval_hours=24):
+        self.manager = manager
+        self.interval = timedelta(hours=interval_hours)
+        self.running = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="BackupScheduler", daemon=True)
+
+    @classmethod
+    def from_config(cls, db_file, config=None):
+        conf = ((config if config is not None else CONFIG).get('db') or {}).get('backup') or {}
+        if not conf.get('enabled', False): return None
+        return cls(BackupManager.from_config(db_file, config), conf.get('interval_hours', 24))
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def is_due(self):
+        last = self.manager.last_backup_time()
+        return last is None or datetime.now() - last >= self.interval
+
+    def run_now(self):
+        self.running = True
+        try:
+            path = self.manager.create_backup(should_stop=self._stop.is_set)
+            self.manager.rotate()
+            return path
+        finally:
+            self.running = False
+
+    def _run(self):
+        delay = self.INITIAL_DELAY
+        while not self._stop.wait(delay):
+            delay = self.CHECK_INTERVAL
+            try:
+                if self.is_due(): self.run_now()
+            except BackupAborted:
+                logging.info("Sauvegarde interrompue par la fermeture de l'application.")
+            except BackupRestarted as e:
+                logging.warning(f"{e} Nouvel essai à la prochaine vérification.")
+            except Exception as e:
+                logging.error(f"Échec de la sauvegarde automatique : {e}", exc_info=True)
+
+
+def main(argv=None):
+    import argparse
+    import sys
+    from utils.config_loader import load_config
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    load_config(os.path.join(base_dir, "config.yaml"))
+
+    parser = argparse.ArgumentParser(description="Sauvegarde, vérification et restauration de la base.")
+    parser.add_argument("--db", default=os.path.join(base_dir, CONFIG['db']['filename']), help="Base concernée")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("create", help="Crée une sauvegarde puis applique la rétention")
+    sub.add_parser("list", help="Liste les sauvegardes")
+    sub.add_parser("verify", help="Vérifie une sauvegarde").add_argument("backup")
+    restore = sub.add_parser("restore", help="Restaure une sauvegarde (application fermée)")
+    restore.add_argument("backup")
+    restore.add_argument("--target", help="Base à remplacer (défaut : --db)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    manager = BackupManager.from_config(args.db)
+    if args.command == "create":
+        try:
+            manager.create_backup(progress=lambda done, total: print(f"\rPages : {done}/{total}", end="", flush=True))
+        except BackupRestarted as e:
+            print(f"\n{e}")
+            return 1
+        print()
+        manager.rotate()
+    elif args.command == "list":
+        for when, path in manager.list_backups():
+            print(f"{when:%d/%m/%Y %H:%M:%S}  {os.path.getsize(path) / 1024 / 1024:8.1f} Mo  {path}")
+        for name, path in manager.list_archive_backups():
+            print(f"{'archive':<19}  {os.path.getsize(path) / 1024 / 1024:8.1f} Mo  {path}")
+    elif args.command == "verify":
+        ok, message = manager.verify(args.backup)
+        print(message)
+        for name, archive_ok, archive_message in manager.verify_archives():
+            print(f"{name} : {archive_message}")
+            ok = ok and archive_ok
+        return 0 if ok else 1
+    elif args.command == "restore":
+        try:
+            previous = manager.restore(args.backup, args.target)
+        except ValueError as e:
+            print(e)
+            return 1
+        print(f"Base restaurée. Ancienne base conservée : {previous}" if previous else "Base restaurée.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,23 +1,89 @@
 # db/database.py
+import bisect
+import copy
 import sqlite3
 from tkinter import messagebox
+import hashlib
+import heapq
+import json
 import logging
 import os
+import threading
+import time
+from datetime import datetime
+from collections import OrderedDict
+from pathlib import Path
 
-from db.models import Agent, Conge
+from db.models import Agent, Conge, Certificat, TypeConge
+from db.instrumentation import QueryProfiler, connect as instrumented_connect
+from core.events import (EventBus, AgentAdded, AgentUpdated, AgentDeleted,
+                         CongeAdded, CongeDeleted, HolidaysChanged, HistoriqueCompacte)
 try:
     from utils.config_loader import CONFIG
 except ImportError:
     CONFIG = {'conges': {'types_decompte_solde': ['Congé annuel']}}
 
 class DatabaseManager:
+    AGENT_CACHE_SIZE = 2048  # Nombre max. d'agents gardés en mémoire (LRU)
+    MAX_ATTACHED_ARCHIVES = 8  # SQLite limite à 10 le nombre de bases attachées
+    CONGE_COLUMNS = "id, agent_id, type_id, justif, interim_id, date_debut, date_fin, jours_pris, statut_id"
+    CERTIFICAT_COLUMNS = "id, conge_id, nom_medecin, duree_jours, chemin_fichier, sha256"
+    DATA_VERSION_CHECK_INTERVAL = 2.0  # s entre deux vérifications de PRAGMA data_version
+    STATUT_ACTIF, STATUT_ANNULE = 1, 2  # Codes de la table statuts (écrits en clair dans les requêtes : index partiels)
+    STATUT_COMPACTE = "Compacté"        # Libellé des chaînes de division compactées (conges_historique)
+    # Types de congé créés avec la base : (code, libellé, jours ouvrés, certificat requis, clé de durée par défaut).
+    # Le décompte du solde vient de conges.types_decompte_solde ; les types ajoutés ensuite dans
+    # types_conge sont pris en compte sans changement de code.
+    TYPES_CONGE_INITIAUX = [
+        (1, "Congé annuel", 1, 0, None),
+        (2, "Congé exceptionnel", 0, 0, None),
+        (3, "Congé de maladie", 0, 1, None),
+        (4, "Congé de maternité", 0, 0, "maternite_duree"),
+        (5, "Congé de paternité", 0, 0, "paternite_duree"),
+    ]
+    # Tables portant les codes de types et de statuts ({table} : nom, pour les reconstructions de la migration 004)
+    TABLE_SQL = {
+        "conges": """CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY, agent_id INTEGER NOT NULL, type_id INTEGER NOT NULL REFERENCES types_conge(id), justif TEXT, interim_id INTEGER, date_debut TEXT NOT NULL, date_fin TEXT NOT NULL, jours_pris INTEGER NOT NULL CHECK(jours_pris >= 0), statut_id INTEGER NOT NULL DEFAULT 1 REFERENCES statuts(id), FOREIGN KEY (agent_id) REFERENCES agents(id) ON DELETE CASCADE, FOREIGN KEY (interim_id) REFERENCES agents(id) ON DELETE SET NULL)""",
+        "conges_historique": """CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY, agent_id INTEGER NOT NULL, type_id INTEGER NOT NULL, date_debut TEXT NOT NULL, date_fin TEXT NOT NULL, jours_pris INTEGER NOT NULL, nb_lignes INTEGER NOT NULL, details TEXT NOT NULL, compacte_le TEXT NOT NULL, FOREIGN KEY (agent_id) REFERENCES agents(id) ON DELETE CASCADE)""",
+        "archives_resume": """CREATE TABLE IF NOT EXISTS {table} (agent_id INTEGER NOT NULL, annee INTEGER NOT NULL, type_id INTEGER NOT NULL, nb INTEGER NOT NULL, jours_annuels_actifs INTEGER NOT NULL, PRIMARY KEY (agent_id, annee, type_id))""",
+        "conges_archive": """CREATE TABLE {table} (id INTEGER PRIMARY KEY, agent_id INTEGER NOT NULL, type_id INTEGER NOT NULL, justif TEXT, interim_id INTEGER,
+                             date_debut TEXT NOT NULL, date_fin TEXT NOT NULL, jours_pris INTEGER NOT NULL, statut_id INTEGER NOT NULL)""",
+    }
+
     def __init__(self, db_file):
         self.db_file = db_file
         self.conn = None
+        # Cache d'identité des agents : id -> Agent (ordre LRU) et PPR -> id.
+        # Invalidé par les écritures sur agents (y compris les soldes) et lorsque
+        # PRAGMA data_version signale une modification faite par une autre connexion.
+        self._agent_cache = OrderedDict()
+        self._agent_ppr_index = {}
+        self._data_version = None
+        self._data_version_checked_at = 0.0
+        self.agent_cache_hits = 0
+        self.agent_cache_misses = 0
+        # Événements de modification, publiés seulement une fois la transaction validée
+        self.events = EventBus()
+        self._pending_events = []
+        self._released_files = [] # Certificats à supprimer après le commit s'ils ne sont plus référencés
+        # Empreintes des certificats copiés en fond et pas encore enregistrés : leur fichier n'est jamais supprimé
+        self._pinned_certificats = set()
+        self._certificats_lock = threading.Lock()
+        # Archives des années clôturées : année -> fichier, et archives attachées (ordre LRU)
+        self.archive_dir = os.path.join(os.path.dirname(os.path.abspath(db_file)), (CONFIG.get('db') or {}).get('archive_dir', 'archives'))
+        self._archive_years = None
+        self._attached_archives = OrderedDict()
+        # Tables de référence types_conge et statuts, lues une fois : code -> TypeConge / libellé
+        self._types = None
+        self._statuts = None
+        # Instantané colonnaire des congés (LeaveFrame) et jeton de version de la base à sa lecture
+        self._leave_frame = None
+        # Mesure des requêtes (désactivée par défaut : connexion standard, sans surcoût)
+        self.profiler = QueryProfiler.from_config(CONFIG)
 
     def connect(self):
         try:
-            self.conn = sqlite3.connect(self.db_file)
+            self.conn = instrumented_connect(self.db_file, self.profiler)
             self.conn.execute("PRAGMA foreign_keys = ON")
             return True
         except sqlite3.Error as e:
@@ -25,8 +91,127 @@ class DatabaseManager:
             return False
 
     def close(self):
+        if self.profiler.enabled: self.write_query_report()
         if self.conn: self.conn.close()
 
+    def write_query_report(self, path=None):
+        """Journalise le résumé du profilage SQL et l'exporte (JSON ou CSV) à côté de la base."""
+        logging.info("Profil des requêtes SQL :\n" + self.profiler.format_report())
+        report_file = ((CONFIG.get('db') or {}).get('profiling') or {}).get('report_file', 'rapport_requetes.json')
+        path = path or os.path.join(os.path.dirname(os.path.abspath(self.db_file)), report_file)
+        try:
+            return self.profiler.export_report(path)
+        except OSError as e:
+            logging.error(f"Impossible d'écrire le rapport de requêtes {path}: {e}")
+
+    def open_reader_connection(self):
+        """Connexion séparée (lecture seule) pour les requêtes exécutées dans un thread de fond."""
+        return instrumented_connect(f"{Path(self.db_file).resolve().as_uri()}?mode=ro", self.profiler, uri=True)
+
+    # --- Transactions et événements ---
+    def queue_event(self, event):
+        """Met en attente un événement jusqu'au prochain commit (abandonné en cas de rollback)."""
+        self._pending_events.append(event)
+
+    def commit(self):
+        self.conn.commit()
+        released, self._released_files = self._released_files, []
+        if released: self._purge_released_files(released)
+        events, self._pending_events = self._pending_events, []
+        for event in events: self.events.publish(event)
+
+    def rollback(self):
+        self.conn.rollback()
+        self._pending_events.clear()
+        self._released_files.clear()
+        # Les agents relus pendant la transaction portent des valeurs non validées ; data_version
+        # ne change pas pour les écritures de cette connexion
+        self.invalidate_agent_cache()
+
+    # --- Fichiers des certificats (comptage des références) ---
+    def release_certificat_file(self, chemin_fichier, sha256=None):
+        """Signale qu'une ligne ne référence plus ce fichier ; il sera supprimé au commit si plus aucune ne le fait."""
+        if chemin_fichier: self._released_files.append((chemin_fichier, sha256))
+
+    def count_certificat_references(self, sha256=None, chemin_fichier=None):
+        # Les certificats des années archivées comptent aussi (archives_certificats, dans la base principale)
+        column, value = ("sha256", sha256) if sha256 else ("chemin_fichier", chemin_fichier)
+        q = f"SELECT (SELECT COUNT(*) FROM certificats_medicaux WHERE {column} = ?) + (SELECT COUNT(*) FROM archives_certificats WHERE {column} = ?)"
+        return self.conn.execute(q, (value, value)).fetchone()[0]
+
+    def pin_certificat(self, sha256):
+        """
+        Protège le fichier de ce contenu jusqu'à unpin_certificat : appelé par la copie en fond avant de chercher
+        le contenu dans le magasin, car la ligne qui le référencera n'est enregistrée qu'ensuite (thread principal).
+        """
+        with self._certificats_lock: self._pinned_certificats.add(sha256)
+
+    def unpin_certificat(self, sha256):
+        with self._certificats_lock: self._pinned_certificats.discard(sha256)
+
+    def dispose_certificat_file(self, chemin, sha256, dispose):
+        """
+        Appelle dispose(chemin) (suppression, mise en quarantaine) si le fichier existe et n'est ni épinglé par
+        une copie en cours, ni référencé par une ligne ; le contrôle et l'action se font sous le même verrou
+        que pin_certificat. Renvoie True si dispose a été appelé.
+        """
+        with self._certificats_lock:
+            if sha256 in self._pinned_certificats or not os.path.exists(chemin): return False
+            if sha256 and self.count_certificat_references(sha256=sha256): return False
+            if self.count_certificat_references(chemin_fichier=chemin): return False
+            dispose(chemin)
+            return True
+
+    def _purge_released_files(self, released):
+        for chemin, sha256 in dict.fromkeys(released):
+            try: self.dispose_certificat_file(chemin, sha256, os.remove)
+            except OSError as e: logging.error(f"Erreur suppression du certificat {chemin}: {e}")
+
+    # --- Cache des agents ---
+    def _check_data_version(self):
+        now = time.monotonic()
+        if now - self._data_version_checked_at < self.DATA_VERSION_CHECK_INTERVAL: return
+        self._data_version_checked_at = now
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            if self._data_version is not None: self.invalidate_agent_cache()
+            self._data_version = version
+
+    def change_token(self):
+        """
+        Jeton qui change à chaque écriture validée : PRAGMA data_version (autres connexions)
+        et total_changes (cette connexion). Permet de ne relire une vue que si la base a changé.
+        """
+        return self.conn.execute("PRAGMA data_version").fetchone()[0], self.conn.total_changes
+
+    def _cache_agent(self, agent):
+        # Copies en entrée et en sortie : un appelant qui modifie son Agent ne modifie pas le cache
+        self._agent_cache[agent.id] = copy.copy(agent)
+        self._agent_cache.move_to_end(agent.id)
+        if agent.ppr: self._agent_ppr_index[agent.ppr] = agent.id
+        while len(self._agent_cache) > self.AGENT_CACHE_SIZE:
+            _, old = self._agent_cache.popitem(last=False)
+            if old.ppr and self._agent_ppr_index.get(old.ppr) == old.id: del self._agent_ppr_index[old.ppr]
+
+    def _cached_agent(self, agent_id):
+        agent = self._agent_cache.get(agent_id)
+        if agent is None:
+            self.agent_cache_misses += 1
+            return None
+        self._agent_cache.move_to_end(agent_id)
+        self.agent_cache_hits += 1
+        return copy.copy(agent)
+
+    def invalidate_agent_cache(self, agent_id=None):
+        """Retire un agent du cache (ou vide tout le cache si agent_id est None)."""
+        if agent_id is None:
+            self._agent_cache.clear(); self._agent_ppr_index.clear(); return
+        old = self._agent_cache.pop(agent_id, None)
+        if old and old.ppr and self._agent_ppr_index.get(old.ppr) == agent_id: del self._agent_ppr_index[old.ppr]
+
+    def get_agent_cache_stats(self):
+        return {'hits': self.agent_cache_hits, 'misses': self.agent_cache_misses, 'size': len(self._agent_cache)}
+
     def execute_query(self, query, params=(), fetch=None):
         if not self.conn:
             raise sqlite3.Error("Pas de connexion à la base de données.")
@@ -35,15 +220,17 @@ class DatabaseManager:
             cursor.execute(query, params)
             if fetch == "one": return cursor.fetchone()
             if fetch == "all": return cursor.fetchall()
-            self.conn.commit()
+            self.commit()
             return cursor.lastrowid
         except sqlite3.Error as e:
-            self.conn.rollback()
+            self.rollback()
             logging.error(f"Erreur SQL: {query} avec params {params} -> {e}", exc_info=True)
             raise e
 
     def create_db_tables(self):
         try:
+            # Sans effet sur une base existante (voir la migration 003) ; une base neuve naît en mode incrémental
+            self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
             # --- MODIFICATION APPLIQUÉE ICI (PARTIE 1) ---
             # On retire la contrainte UNIQUE directement de la colonne ppr.
             self.execute_query("""
@@ -65,77 +252,177 @@ class DatabaseManager:
                 WHERE ppr IS NOT NULL;
             """)
             
-            self.execute_query("""CREATE TABLE IF NOT EXISTS conges (id INTEGER PRIMARY KEY, agent_id INTEGER NOT NULL, type_conge TEXT NOT NULL, justif TEXT, interim_id INTEGER, date_debut TEXT NOT NULL, date_fin TEXT NOT NULL, jours_pris INTEGER NOT NULL CHECK(jours_pris >= 0), statut TEXT NOT NULL DEFAULT 'Actif', FOREIGN KEY (agent_id) REFERENCES agents(id) ON DELETE CASCADE, FOREIGN KEY (interim_id) REFERENCES agents(id) ON DELETE SET NULL)""")
+            self.create_reference_tables()
+            self.execute_query(self.TABLE_SQL["conges"].format(table="conges"))
             self.execute_query("""CREATE TABLE IF NOT EXISTS jours_feries_personnalises (date TEXT PRIMARY KEY, nom TEXT NOT NULL, type TEXT NOT NULL)""")
-            self.execute_query("""CREATE TABLE IF NOT EXISTS certificats_medicaux (id INTEGER PRIMARY KEY, conge_id INTEGER NOT NULL UNIQUE, nom_medecin TEXT, duree_jours INTEGER, chemin_fichier TEXT NOT NULL, FOREIGN KEY (conge_id) REFERENCES conges(id) ON DELETE CASCADE)""")
+            # État de synchronisation des jours fériés officiels, par année (voir sync_official_holidays)
+            self.execute_query("""CREATE TABLE IF NOT EXISTS jours_feries_sync (annee INTEGER PRIMARY KEY, pays TEXT NOT NULL, version TEXT NOT NULL, empreinte TEXT NOT NULL, synchronise_le TEXT NOT NULL)""")
+            self.execute_query("""CREATE TABLE IF NOT EXISTS certificats_medicaux (id INTEGER PRIMARY KEY, conge_id INTEGER NOT NULL UNIQUE, nom_medecin TEXT, duree_jours INTEGER, chemin_fichier TEXT NOT NULL, sha256 TEXT, FOREIGN KEY (conge_id) REFERENCES conges(id) ON DELETE CASCADE)""")
+            # Colonne sha256 des bases antérieures au magasin de certificats, et son index : migration 002
+
+            # Chaînes de division anciennes, compactées (voir compact_cancelled_chains)
+            self.execute_query(self.TABLE_SQL["conges_historique"].format(table="conges_historique"))
+            self.execute_query("CREATE INDEX IF NOT EXISTS idx_conges_historique_agent ON conges_historique(agent_id, date_debut)")
+            # Archives des années clôturées (voir archive_year) : fichiers, résumé par agent et certificats référencés
+            self.execute_query("""CREATE TABLE IF NOT EXISTS archives (annee INTEGER PRIMARY KEY, fichier TEXT NOT NULL, nb_conges INTEGER NOT NULL, nb_certificats INTEGER NOT NULL, archive_le TEXT NOT NULL)""")
+            self.execute_query(self.TABLE_SQL["archives_resume"].format(table="archives_resume"))
+            self.execute_query("""CREATE TABLE IF NOT EXISTS archives_certificats (conge_id INTEGER PRIMARY KEY, annee INTEGER NOT NULL, chemin_fichier TEXT NOT NULL, sha256 TEXT)""")
+            self.execute_query("CREATE INDEX IF NOT EXISTS idx_archives_certificats_sha256 ON archives_certificats(sha256) WHERE sha256 IS NOT NULL")
+            self.execute_query("CREATE INDEX IF NOT EXISTS idx_archives_certificats_chemin ON archives_certificats(chemin_fichier)")
+
+            self.execute_query("CREATE INDEX IF NOT EXISTS idx_agents_nom_prenom ON agents(nom, prenom)")
+            # Base antérieure aux codes de types : les index des congés sont créés par la migration 004
+            if "type_id" in {row[1] for row in self.conn.execute("PRAGMA table_info(conges)")}:
+                self.create_conges_indexes()
         except sqlite3.Error as e:
             messagebox.showerror("Erreur BD", f"Erreur création des tables : {e}")
 
+    def create_conges_indexes(self):
+        """Index de la table conges (sans commit : la migration 004 les crée dans sa transaction)."""
+        # Index d'intervalles : (agent, début, fin) pour les congés et (intérimaire, début, fin)
+        # pour les remplacements. Ils permettent de savoir en une recherche indexée
+        # si un agent est absent ou déjà intérimaire sur une période donnée.
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_conges_agent_dates ON conges(agent_id, date_debut, date_fin)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_conges_interim_dates ON conges(interim_id, date_debut, date_fin) WHERE interim_id IS NOT NULL")
+        # Congés actifs par type et date de fin : ceux en jours ouvrés qui couvrent un jour férié modifié
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_conges_actifs_type_fin ON conges(type_id, date_fin, date_debut) WHERE statut_id = {self.STATUT_ACTIF}")
+        # Congés actifs par type dans l'ordre du suivi des certificats (pagination par clé)
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_conges_actifs_type_debut ON conges(type_id, date_debut, id) WHERE statut_id = {self.STATUT_ACTIF}")
+        # Congés annulés (parents des divisions) : restauration et compactage
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_conges_annules ON conges(agent_id, date_debut, date_fin) WHERE statut_id = {self.STATUT_ANNULE}")
+
+    # --- Types de congé et statuts (tables de référence) ---
+    def create_reference_tables(self):
+        """Crée et complète types_conge et statuts ; les lignes déjà présentes (règles modifiées) sont conservées."""
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS types_conge (id INTEGER PRIMARY KEY, libelle TEXT NOT NULL UNIQUE, jours_ouvres INTEGER NOT NULL DEFAULT 0,
+                             decompte_solde INTEGER NOT NULL DEFAULT 0, certificat_requis INTEGER NOT NULL DEFAULT 0, duree_defaut INTEGER)""")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS statuts (id INTEGER PRIMARY KEY, libelle TEXT NOT NULL UNIQUE)")
+        conges_config = CONFIG.get('conges') or {}
+        decompte = conges_config.get('types_decompte_solde', ['Congé annuel'])
+        self.conn.executemany("INSERT OR IGNORE INTO types_conge (id, libelle, jours_ouvres, decompte_solde, certificat_requis, duree_defaut) VALUES (?, ?, ?, ?, ?, ?)",
+                              [(code, libelle, ouvres, int(libelle in decompte), certificat, conges_config.get(duree) if duree else None)
+                               for code, libelle, ouvres, certificat, duree in self.TYPES_CONGE_INITIAUX])
+        self.conn.executemany("INSERT OR IGNORE INTO statuts (id, libelle) VALUES (?, ?)", [(self.STATUT_ACTIF, "Actif"), (self.STATUT_ANNULE, "Annulé")])
+        self.commit()
+        self.invalidate_types_cache()
+
+    def invalidate_types_cache(self):
+        self._types = self._statuts = None
+
+    def _load_types(self):
+        if self._types is None:
+            self._types = {r[0]: TypeConge.from_db_row(r) for r in self.conn.execute(
+                "SELECT id, libelle, jours_ouvres, decompte_solde, certificat_requis, duree_defaut FROM types_conge ORDER BY id")}
+            self._types_by_libelle = {t.libelle: t for t in self._types.values()}
+            self._type_libelles = {t.id: t.libelle for t in self._types.values()}
+            self._statuts = dict(self.conn.execute("SELECT id, libelle FROM statuts"))
+        return self._types
+
+    def get_types_conge(self):
+        """Types de congé, dans l'ordre de leur code."""
+        return list(self._load_types().values())
+
+    def get_type_conge(self, libelle):
+        self._load_types()
+        return self._types_by_libelle.get(libelle)
+
+    def type_id(self, libelle):
+        type_conge = self.get_type_conge(libelle)
+        if type_conge is None: raise ValueError(f"Type de congé inconnu : {libelle}")
+        return type_conge.id
+
+    def type_ids_sql(self, flag):
+        """Codes des types ayant ce drapeau, en liste SQL littérale pour une clause IN (ex. "(1, 6)")."""
+        ids = [str(t.id) for t in self.get_types_conge() if getattr(t, flag)]
+        return f"({', '.join(ids)})" if ids else "(NULL)"
+
+    def _conge_from_row(self, row):
+        self._load_types()
+        if row[2] not in self._type_libelles: self.invalidate_types_cache(); self._load_types() # Type ajouté depuis la lecture
+        return Conge.from_db_row(row, self._type_libelles, self._statuts)
+
     def _ajouter_conge_no_commit(self, cursor, conge_model):
-        if conge_model.type_conge in CONFIG['conges']['types_decompte_solde']:
+        if self.is_year_archived(conge_model.date_debut.year):
+            raise sqlite3.Error(f"L'année {conge_model.date_debut.year} est archivée : ses congés ne peuvent plus être modifiés.")
+        type_id = self.type_id(conge_model.type_conge)
+        if self._types[type_id].decompte_solde:
             agent_data = cursor.execute("SELECT solde FROM agents WHERE id=?", (conge_model.agent_id,)).fetchone()
             if agent_data[0] < conge_model.jours_pris:
                 raise sqlite3.Error(f"Solde insuffisant ({agent_data[0]:.1f}j) pour décompter {conge_model.jours_pris}j.")
             cursor.execute("UPDATE agents SET solde = solde - ? WHERE id = ?", (conge_model.jours_pris, conge_model.agent_id))
+            self.invalidate_agent_cache(conge_model.agent_id)
         
-        cursor.execute("INSERT INTO conges (agent_id, type_conge, justif, interim_id, date_debut, date_fin, jours_pris) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                       (conge_model.agent_id, conge_model.type_conge, conge_model.justif, con_model.interim_id, conge_model.date_debut, conge_model.date_fin, conge_model.jours_pris))
-        return cursor.lastrowid
+        cursor.execute("INSERT INTO conges (agent_id, type_id, justif, interim_id, date_debut, date_fin, jours_pris) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       (conge_model.agent_id, type_id, conge_model.justif, conge_model.interim_id, conge_model.date_debut.strftime('%Y-%m-%d'), conge_model.date_fin.strftime('%Y-%m-%d'), conge_model.jours_pris))
+        conge_id = cursor.lastrowid
+        self.queue_event(CongeAdded(conge_model.agent_id, conge_id, conge_model.date_debut.year))
+        return conge_id
 
     def _supprimer_conge_no_commit(self, cursor, conge_id):
-        conge = cursor.execute("SELECT agent_id, type_conge, jours_pris, statut FROM conges WHERE id=?", (conge_id,)).fetchone()
+        conge = cursor.execute("SELECT agent_id, type_id, jours_pris, statut_id, date_debut FROM conges WHERE id=?", (conge_id,)).fetchone()
         if not conge: return
-        agent_id, type_conge, jours_pris, statut = conge
+        agent_id, type_id, jours_pris, statut_id, date_debut = conge
+        type_conge = self._load_types().get(type_id)
         
-        if type_conge in CONFIG['conges']['types_decompte_solde'] and statut == 'Actif':
+        if type_conge and type_conge.decompte_solde and statut_id == self.STATUT_ACTIF:
             cursor.execute("UPDATE agents SET solde = solde + ? WHERE id = ?", (jours_pris, agent_id))
+            self.invalidate_agent_cache(agent_id)
             
-        cert = cursor.execute("SELECT chemin_fichier FROM certificats_medicaux WHERE conge_id = ?", (conge_id,)).fetchone()
-        if cert and cert[0] and os.path.exists(cert[0]):
-            try: os.remove(cert[0])
-            except OSError as e: logging.error(f"Erreur suppression certificat pour conge_id {conge_id}: {e}")
+        cert = cursor.execute("SELECT chemin_fichier, sha256 FROM certificats_medicaux WHERE conge_id = ?", (conge_id,)).fetchone()
+        if cert: self.release_certificat_file(*cert) # Le fichier peut être partagé : vérifié au commit
         
         cursor.execute("DELETE FROM conges WHERE id=?", (conge_id,))
+        self.queue_event(CongeDeleted(agent_id, conge_id, int(date_debut[:4])))
 
     def _add_or_update_certificat_no_commit(self, cursor, conge_id, cert_model):
-        exists = cursor.execute("SELECT id FROM certificats_medicaux WHERE conge_id=?", (conge_id,)).fetchone()
-        if exists: cursor.execute("UPDATE certificats_medicaux SET nom_medecin=?, duree_jours=?, chemin_fichier=? WHERE conge_id=?", (cert_model.nom_medecin, cert_model.duree_jours, cert_model.chemin_fichier, conge_id))
-        else: cursor.execute("INSERT INTO certificats_medicaux (conge_id, nom_medecin, duree_jours, chemin_fichier) VALUES (?, ?, ?, ?)", (conge_id, cert_model.nom_medecin, cert_model.duree_jours, cert_model.chemin_fichier))
+        sha256 = getattr(cert_model, 'sha256', None)
+        exists = cursor.execute("SELECT chemin_fichier, sha256 FROM certificats_medicaux WHERE conge_id=?", (conge_id,)).fetchone()
+        if exists:
+            cursor.execute("UPDATE certificats_medicaux SET nom_medecin=?, duree_jours=?, chemin_fichier=?, sha256=? WHERE conge_id=?", (cert_model.nom_medecin, cert_model.duree_jours, cert_model.chemin_fichier, sha256, conge_id))
+            if exists[0] != cert_model.chemin_fichier: self.release_certificat_file(*exists)
+        else: cursor.execute("INSERT INTO certificats_medicaux (conge_id, nom_medecin, duree_jours, chemin_fichier, sha256) VALUES (?, ?, ?, ?, ?)", (conge_id, cert_model.nom_medecin, cert_model.duree_jours, cert_model.chemin_fichier, sha256))
 
     def ajouter_conge(self, conge_model, cert_model=None):
         try:
             cursor = self.conn.cursor()
             conge_id = self._ajouter_conge_no_commit(cursor, conge_model)
             if cert_model and cert_model.chemin_fichier: self._add_or_update_certificat_no_commit(cursor, conge_id, cert_model)
-            self.conn.commit()
+            self.commit()
             return conge_id
-        except sqlite3.Error as e: self.conn.rollback(); raise e
+        except sqlite3.Error as e: self.rollback(); raise e
 
     def modifier_conge(self, old_conge_id, new_conge_model, cert_model=None):
         try:
             cursor = self.conn.cursor()
+            old_cert = Certificat.from_db_row(cursor.execute("SELECT * FROM certificats_medicaux WHERE conge_id = ?", (old_conge_id,)).fetchone())
             self._supprimer_conge_no_commit(cursor, old_conge_id)
             new_conge_id = self._ajouter_conge_no_commit(cursor, new_conge_model)
             if cert_model and cert_model.chemin_fichier: self._add_or_update_certificat_no_commit(cursor, new_conge_id, cert_model)
-            self.conn.commit()
+            elif old_cert and self.get_type_conge(new_conge_model.type_conge).certificat_requis:
+                # Le certificat suit le congé modifié (qui reçoit un nouvel id)
+                self._add_or_update_certificat_no_commit(cursor, new_conge_id, old_cert)
+            self.commit()
             return new_conge_id
-        except sqlite3.Error as e: self.conn.rollback(); raise e
+        except sqlite3.Error as e: self.rollback(); raise e
 
     def supprimer_conge(self, conge_id):
         try:
             cursor = self.conn.cursor()
             self._supprimer_conge_no_commit(cursor, conge_id)
-            self.conn.commit()
+            self.commit()
             return True
-        except sqlite3.Error as e: self.conn.rollback(); raise e
+        except sqlite3.Error as e: self.rollback(); raise e
     
-    def get_agents(self, term=None, limit=None, offset=None, exclude_id=None):
-        q = "SELECT id, nom, prenom, ppr, grade, solde FROM agents"
-        p, c = [], []
+    def _agents_search_clause(self, term, c, p):
         if term:
             t = f"%{term.lower()}%"
             c.append("(LOWER(nom) LIKE ? OR LOWER(prenom) LIKE ? OR LOWER(ppr) LIKE ?)")
             p.extend([t, t, t])
+
+    def get_agents(self, term=None, limit=None, offset=None, exclude_id=None):
+        q = "SELECT id, nom, prenom, ppr, grade, solde FROM agents"
+        p, c = [], []
+        self._agents_search_clause(term, c, p)
         if exclude_id is not None:
             c.append("id != ?"); p.append(exclude_id)
         if c: q += " WHERE " + " AND ".join(c)
@@ -144,56 +431,543 @@ class DatabaseManager:
         return [Agent.from_db_row(r) for r in self.execute_query(q, tuple(p), fetch="all") if r]
 
     def get_agents_count(self, term=None):
-        q, p = "SELECT COUNT(*) FROM agents", []
-        if term:
-            t = f"%{term.lower()}%"
-            q += " WHERE LOWER(nom) LIKE ? OR LOWER(prenom) LIKE ? OR LOWER(ppr) LIKE ?"
-            p.extend([t, t, t])
+        q, p, c = "SELECT COUNT(*) FROM agents", [], []
+        self._agents_search_clause(term, c, p)
+        if c: q += " WHERE " + " AND ".join(c)
         return self.execute_query(q, tuple(p), fetch="one")[0]
 
+    def get_agents_disponibles(self, start_date, end_date, exclude_id=None, grade=None, term=None, limit=None, conge_id_exclu=None):
+        """
+        Agents libres sur [start_date, end_date] : ni en congé actif, ni déjà intérimaire
+        sur un congé actif qui chevauche la période. Chaque agent candidat est vérifié par
+        deux recherches sur les index d'intervalles (agent et intérimaire).
+        """
+        debut, fin = start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+        q = "SELECT a.id, a.nom, a.prenom, a.ppr, a.grade, a.solde FROM agents a"
+        p, c = [], []
+        self._agents_search_clause(term, c, p)
+        if exclude_id is not None:
+            c.append("a.id != ?"); p.append(exclude_id)
+        if grade:
+            c.append("a.grade = ?"); p.append(grade)
+        c.append(f"""NOT EXISTS (SELECT 1 FROM conges c WHERE c.agent_id = a.id AND c.date_debut <= ? AND c.date_fin >= ? AND c.statut_id = {self.STATUT_ACTIF})""")
+        p.extend([fin, debut])
+        interim_clause = f"""NOT EXISTS (SELECT 1 FROM conges c WHERE c.interim_id = a.id AND c.date_debut <= ? AND c.date_fin >= ? AND c.statut_id = {self.STATUT_ACTIF}"""
+        p.extend([fin, debut])
+        if conge_id_exclu:
+            interim_clause += " AND c.id != ?"; p.append(conge_id_exclu)
+        c.append(interim_clause + ")")
+        q += " WHERE " + " AND ".join(c) + " ORDER BY a.nom, a.prenom"
+        if limit is not None: q += " LIMIT ?"; p.append(limit)
+        return [Agent.from_db_row(r) for r in self.execute_query(q, tuple(p), fetch="all") if r]
+
+    def is_agent_disponible(self, agent_id, start_date, end_date, conge_id_exclu=None):
+        """Vérifie qu'un agent peut assurer l'intérim sur la période (mêmes critères que get_agents_disponibles)."""
+        debut, fin = start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+        q = """SELECT EXISTS (SELECT 1 FROM conges WHERE agent_id = ? AND date_debut <= ? AND date_fin >= ? AND statut_id = {actif})
+                   OR EXISTS (SELECT 1 FROM conges WHERE interim_id = ? AND date_debut <= ? AND date_fin >= ? AND statut_id = {actif}{excl})"""
+        p = [agent_id, fin, debut, agent_id, fin, debut]
+        if conge_id_exclu: p.append(conge_id_exclu)
+        q = q.format(actif=self.STATUT_ACTIF, excl=" AND id != ?" if conge_id_exclu else "")
+        return not self.execute_query(q, tuple(p), fetch="one")[0]
+
     def get_agent_by_id(self, agent_id):
+        self._check_data_version()
+        agent = self._cached_agent(agent_id)
+        if agent: return agent
         r = self.execute_query("SELECT id, nom, prenom, ppr, grade, solde FROM agents WHERE id=?", (agent_id,), fetch="one")
-        return Agent.from_db_row(r) if r else None
+        if not r: return None
+        agent = Agent.from_db_row(r)
+        self._cache_agent(agent)
+        return agent
+
+    def get_agents_by_ids(self, agent_ids):
+        """Retourne {id: Agent} ; seuls les agents absents du cache sont lus, par lots."""
+        self._check_data_version()
+        result, missing = {}, []
+        for agent_id in set(agent_ids):
+            if agent_id is None: continue
+            agent = self._cached_agent(agent_id)
+            if agent: result[agent_id] = agent
+            else: missing.append(agent_id)
+        for i in range(0, len(missing), 500):
+            chunk = missing[i:i + 500]
+            q = f"SELECT id, nom, prenom, ppr, grade, solde FROM agents WHERE id IN ({','.join('?' * len(chunk))})"
+            for r in self.execute_query(q, tuple(chunk), fetch="all"):
+                agent = Agent.from_db_row(r)
+                self._cache_agent(agent)
+                result[agent.id] = agent
+        return result
         
     def get_conges(self, agent_id=None):
-        q, p = "SELECT id, agent_id, type_conge, justif, interim_id, date_debut, date_fin, jours_pris, statut FROM conges", ()
+        """Tous les congés (d'un agent ou de tous), y compris ceux des années archivées, du plus récent au plus ancien."""
+        archived = self.get_archived_years()
+        if len(archived) > self.MAX_ATTACHED_ARCHIVES:
+            return self._get_conges_by_source(agent_id, archived)
+        source = "conges"
+        if archived:
+            self.attach_archives(archived); source = "conges_tous"
+        q, p = f"SELECT {self.CONGE_COLUMNS} FROM {source}", ()
         if agent_id: q += " WHERE agent_id=? ORDER BY date_debut DESC"; p = (agent_id,)
         else: q += " ORDER BY date_debut DESC"
-        return [Conge.from_db_row(r) for r in self.execute_query(q, p, fetch="all") if r]
+        return [self._conge_from_row(r) for r in self.execute_query(q, p, fetch="all") if r]
+
+    def _get_conges_by_source(self, agent_id, archived):
+        """Trop d'archives pour une seule vue : chaque base est lue à son tour, puis les listes triées sont fusionnées."""
+        where, p = (" WHERE agent_id=?", (agent_id,)) if agent_id else ("", ())
+        sources = [self.execute_query(f"SELECT {self.CONGE_COLUMNS} FROM main.conges{where} ORDER BY date_debut DESC", p, fetch="all")]
+        for year in archived:
+            schema = self.attach_archives([year])[year]
+            sources.append(self.execute_query(f"SELECT {self.CONGE_COLUMNS} FROM {schema}.conges{where} ORDER BY date_debut DESC", p, fetch="all"))
+        return [self._conge_from_row(r) for r in heapq.merge(*sources, key=lambda r: r[5], reverse=True)]
+
+    def get_conges_annees(self, agent_id, type_conge=None):
+        """
+        Résumé annuel des congés d'un agent, en une seule agrégation sur l'index (agent_id, date_debut) :
+        liste de (année, nombre de congés, jours actifs décomptés du solde), de la plus récente à la plus ancienne.
+        Les années archivées viennent du résumé archives_resume, sans ouvrir les archives ; les chaînes
+        de division compactées (conges_historique) comptent chacune pour un congé, sans jour actif.
+        """
+        type_clause = " AND type_id = ?" if type_conge else ""
+        parts = [f"""SELECT CAST(substr(date_debut, 1, 4) AS INTEGER) AS annee, COUNT(*) AS nb,
+                            COALESCE(SUM(CASE WHEN type_id IN {self.type_ids_sql('decompte_solde')} AND statut_id = {self.STATUT_ACTIF} THEN jours_pris END), 0) AS jours
+                     FROM conges WHERE agent_id = ?{type_clause} GROUP BY annee""",
+                 f"SELECT CAST(substr(date_debut, 1, 4) AS INTEGER) AS annee, COUNT(*), 0 FROM conges_historique WHERE agent_id = ?{type_clause} GROUP BY annee"]
+        if self.get_archived_years():
+            parts.append(f"SELECT annee, SUM(nb), SUM(jours_annuels_actifs) FROM archives_resume WHERE agent_id = ?{type_clause} GROUP BY annee")
+        p = ([agent_id] + ([self.type_id(type_conge)] if type_conge else [])) * len(parts)
+        q = f"SELECT annee, SUM(nb), SUM(jours) FROM ({' UNION ALL '.join(parts)}) GROUP BY annee ORDER BY annee DESC"
+        return self.execute_query(q, tuple(p), fetch="all")
+
+    def get_conges_for_year(self, agent_id, year, type_conge=None):
+        """
+        Congés d'un agent commençant dans l'année donnée (recherche par plage sur l'index),
+        avec pour chacun la présence d'un certificat : liste de (Conge, a_certificat).
+        Une année archivée est lue à travers les vues conges_tous / certificats_tous.
+        """
+        conges, certificats = "conges", "certificats_medicaux"
+        if self.is_year_archived(year):
+            self.attach_archives([year]); conges, certificats = "conges_tous", "certificats_tous"
+        q = f"""SELECT c.id, c.agent_id, c.type_id, c.justif, c.interim_id, c.date_debut, c.date_fin, c.jours_pris, c.statut_id,
+                       EXISTS (SELECT 1 FROM {certificats} cm WHERE cm.conge_id = c.id)
+                FROM {conges} c WHERE c.agent_id = ? AND c.date_debut >= ? AND c.date_debut < ?"""
+        p = [agent_id, f"{int(year):04d}-01-01", f"{int(year) + 1:04d}-01-01"]
+        if type_conge: q += " AND c.type_id = ?"; p.append(self.type_id(type_conge))
+        q += " ORDER BY c.date_debut"
+        return [(self._conge_from_row(r), bool(r[9])) for r in self.execute_query(q, tuple(p), fetch="all")]
+
+    def get_conges_ouvres_actifs_couvrant(self, dates):
+        """
+        Congés actifs comptés en jours ouvrés dont l'intervalle contient au moins une des dates (AAAA-MM-JJ) données :
+        une seule lecture de l'index sur l'intervalle [première date, dernière date], puis filtrage par date.
+        """
+        dates = sorted(dates)
+        if not dates: return []
+        q = f"""SELECT {self.CONGE_COLUMNS} FROM conges
+                WHERE type_id IN {self.type_ids_sql('jours_ouvres')} AND statut_id = {self.STATUT_ACTIF} AND date_fin >= ? AND date_debut <= ?"""
+        conges = []
+        for r in self.execute_query(q, (dates[0], dates[-1]), fetch="all"):
+            i = bisect.bisect_left(dates, r[5]) # Première date >= début du congé
+            if i < len(dates) and dates[i] <= r[6]: conges.append(self._conge_from_row(r))
+        return conges
+
+    # --- Suivi des certificats médicaux manquants ---
+    # Anti-jointure sur l'index partiel idx_conges_actifs_type_debut (types à certificat requis)
+    # et l'index unique de certificats_medicaux(conge_id). Un congé est "en retard" lorsque son début
+    # remonte à plus de delai_jours jours sans certificat ; la date limite est calculée par SQLite.
+    def _maladies_sans_certificat(self):
+        return f"""c.type_id IN {self.type_ids_sql('certificat_requis')} AND c.statut_id = {self.STATUT_ACTIF}
+               AND NOT EXISTS (SELECT 1 FROM certificats_medicaux cm WHERE cm.conge_id = c.id)"""
+
+    def _maladies_where(self, delai_jours, en_retard_seulement, agent_id=None):
+        c, p = [self._maladies_sans_certificat()], []
+        if en_retard_seulement:
+            c.append("c.date_debut < date('now', 'localtime', ?)"); p.append(f"-{int(delai_jours)} days")
+        if agent_id is not None:
+            c.append("c.agent_id = ?"); p.append(agent_id)
+        return " AND ".join(c), p
+
+    def get_maladies_sans_certificat(self, delai_jours=2, en_retard_seulement=False, agent_id=None, limit=100, apres=None):
+        """
+        Congés de maladie actifs sans certificat, du plus récent au plus ancien, par pages de `limit`.
+        `apres` est la clé (date_debut, id) de la dernière ligne de la page précédente (pagination par clé).
+        Lignes : (nom, prénom, ppr, début, fin, jours pris, conge_id, agent_id, jours écoulés, en retard).
+        """
+        where, p = self._maladies_where(delai_jours, en_retard_seulement, agent_id)
+        if apres is not None:
+            where += " AND (c.date_debut, c.id) < (?, ?)"; p.extend(apres)
+        q = f"""SELECT a.nom, a.prenom, a.ppr, c.date_debut, c.date_fin, c.jours_pris, c.id, c.agent_id,
+                       CAST(julianday('now', 'localtime', 'start of day') - julianday(c.date_debut) AS INTEGER),
+                       c.date_debut < date('now', 'localtime', ?)
+                FROM conges c JOIN agents a ON a.id = c.agent_id
+                WHERE {where} ORDER BY c.date_debut DESC, c.id DESC LIMIT ?"""
+        return self.execute_query(q, (f"-{int(delai_jours)} days", *p, limit), fetch="all")
+
+    def count_maladies_sans_certificat(self, delai_jours=2):
+        """(total, en retard) des congés de maladie actifs sans certificat."""
+        q = f"""SELECT COUNT(*), COALESCE(SUM(c.date_debut < date('now', 'localtime', ?)), 0)
+                FROM conges c WHERE {self._maladies_sans_certificat()}"""
+        return self.execute_query(q, (f"-{int(delai_jours)} days",), fetch="one")
+
+    def get_maladies_sans_certificat_par_agent(self, delai_jours=2, en_retard_seulement=False):
+        """Par agent : (agent_id, nom, prénom, ppr, nombre, dont en retard, plus ancien début), les plus nombreux d'abord."""
+        where, p = self._maladies_where(delai_jours, en_retard_seulement)
+        q = f"""SELECT a.id, a.nom, a.prenom, a.ppr, m.nb, m.en_retard, m.plus_ancien
+                FROM (SELECT c.agent_id, COUNT(*) AS nb, SUM(c.date_debut < date('now', 'localtime', ?)) AS en_retard,
+                             MIN(c.date_debut) AS plus_ancien
+                      FROM conges c WHERE {where} GROUP BY c.agent_id) m
+                JOIN agents a ON a.id = m.agent_id ORDER BY m.nb DESC, a.nom, a.prenom"""
+        return self.execute_query(q, (f"-{int(delai_jours)} days", *p), fetch="all")
+
+    def get_leave_frame(self, conn=None, token=None):
+        """
+        Instantané colonnaire (LeaveFrame) des congés de la base principale, relu seulement si la base
+        a changé depuis (change_token). Depuis un thread de fond : passer une connexion de lecture et
+        le jeton relevé dans le thread principal avant le lancement de la tâche.
+        """
+        from db.leave_frame import LeaveFrame # NumPy n'est chargé qu'au premier besoin
+        token = token if token is not None else self.change_token()
+        cached = self._leave_frame
+        if cached is not None and cached[0] == token: return cached[1]
+        frame = LeaveFrame.load(conn or self.conn)
+        self._leave_frame = (token, frame)
+        return frame
+
+    def get_conges_stats(self, conn=None, token=None):
+        """
+        Agrégats des statistiques globales : (nombre d'agents, [(type, nombre, jours)] des congés actifs).
+        Regroupés sur l'instantané colonnaire s'il est à jour (déjà chargé pour les prévisions), sinon par
+        SQLite : après une écriture, un GROUP BY coûte moins que le rechargement de tout l'instantané.
+        conn et token permettent le calcul depuis un thread de fond (voir get_leave_frame).
+        """
+        conn = conn or self.conn
+        token = token if token is not None else self.change_token()
+        nb_agents = conn.execute("SELECT COUNT(*) FROM agents").fetchone()[0]
+        cached = self._leave_frame
+        if cached is not None and cached[0] == token:
+            frame = cached[1].statut(self.STATUT_ACTIF)
+            type_ids, counts, jours = frame.group_by("type_id")
+            par_type = sorted(((frame.type_libelle(t), int(n), int(j)) for t, n, j in zip(type_ids, counts, jours)), key=lambda r: -r[1])
+        else:
+            par_type = conn.execute(f"""SELECT t.libelle, s.nb, s.jours FROM (SELECT type_id, COUNT(*) AS nb, COALESCE(SUM(jours_pris), 0) AS jours FROM conges
+                                        WHERE statut_id = {self.STATUT_ACTIF} GROUP BY type_id) s JOIN types_conge t ON t.id = s.type_id ORDER BY s.nb DESC""").fetchall()
+        return nb_agents, par_type
+
+    def get_agents_rows(self, conn=None):
+        """Tous les agents en lignes brutes (id, nom, prénom, ppr, grade, solde) triées par id, sans objets Agent ni cache."""
+        return (conn or self.conn).execute("SELECT id, nom, prenom, ppr, grade, solde FROM agents ORDER BY id").fetchall()
+
+    def get_fiches_annuelles_data(self, year, conn=None):
+        """
+        Données des fiches de congés annuelles de tous les agents, en trois lectures ensemblistes :
+        types {code: (libellé, décompte du solde, certificat requis)}, agents [(id, nom, prénom, ppr, grade, solde)]
+        et congés actifs commençant dans l'année [(agent_id, id, type_id, début, fin, jours, justif, interim_id, a_certificat)],
+        triés par agent puis date. Pour une année archivée, son archive (attachée le temps de la lecture)
+        complète les congés de l'année restés dans la base principale.
+        Utilisable depuis un thread de fond avec une connexion de lecture (conn).
+        """
+        conn = conn or self.conn
+        types = {r[0]: (r[1], bool(r[2]), bool(r[3])) for r in conn.execute("SELECT id, libelle, decompte_solde, certificat_requis FROM types_conge")}
+        agents = self.get_agents_rows(conn)
+        archive = conn.execute("SELECT fichier FROM archives WHERE annee = ?", (int(year),)).fetchone()
+        columns = "c.agent_id, c.id, c.type_id, c.date_debut, c.date_fin, c.jours_pris, c.justif, c.interim_id"
+        where = f"c.statut_id = {self.STATUT_ACTIF} AND c.date_debut >= ? AND c.date_debut < ?"
+        p = (f"{int(year):04d}-01-01", f"{int(year) + 1:04d}-01-01")
+        q = f"""SELECT {columns}, EXISTS (SELECT 1 FROM main.certificats_medicaux cm WHERE cm.conge_id = c.id)
+                FROM main.conges c WHERE {where}"""
+        if archive:
+            path = os.path.join(self.archive_dir, archive[0])
+            if not os.path.exists(path): raise sqlite3.Error(f"Archive introuvable : {path}")
+            conn.execute("ATTACH DATABASE ? AS archive_fiches", (path,))
+            # Les congés de l'année restés dans la base principale (à cheval sur l'année suivante, chaînes de division) comptent aussi
+            q += f"""
+                UNION ALL SELECT {columns}, EXISTS (SELECT 1 FROM archive_fiches.certificats_medicaux cm WHERE cm.conge_id = c.id)
+                FROM archive_fiches.conges c WHERE {where}"""
+            p = p * 2
+        try:
+            conges = conn.execute(q + " ORDER BY 1, 4, 2", p).fetchall()
+        finally:
+            if archive: conn.execute("DETACH DATABASE archive_fiches")
+        return types, agents, conges
 
     def get_conge_by_id(self, conge_id):
-        r = self.execute_query("SELECT id, agent_id, type_conge, justif, interim_id, date_debut, date_fin, jours_pris, statut FROM conges WHERE id=?", (conge_id,), fetch="one")
-        return Conge.from_db_row(r) if r else None
+        r = self.execute_query(f"SELECT {self.CONGE_COLUMNS} FROM conges WHERE id=?", (conge_id,), fetch="one")
+        return self._conge_from_row(r) if r else None
 
     def ajouter_agent(self, nom, prenom, ppr, grade, solde):
         try:
-            self.execute_query("INSERT INTO agents (nom, prenom, ppr, grade, solde) VALUES (?, ?, ?, ?, ?)",(nom, prenom, ppr, grade, solde))
+            cursor = self.conn.cursor()
+            cursor.execute("INSERT INTO agents (nom, prenom, ppr, grade, solde) VALUES (?, ?, ?, ?, ?)",(nom, prenom, ppr, grade, solde))
+            self.queue_event(AgentAdded(cursor.lastrowid))
+            self.commit()
             return True
-        except sqlite3.IntegrityError: return False
+        except sqlite3.IntegrityError: self.rollback(); return False
 
     def modifier_agent(self, agent_id, nom, prenom, ppr, grade, solde):
+        self.invalidate_agent_cache(agent_id)
         try:
+            self.queue_event(AgentUpdated(agent_id))
             self.execute_query("UPDATE agents SET nom=?, prenom=?, ppr=?, grade=?, solde=? WHERE id=?",(nom, prenom, ppr, grade, solde, agent_id))
             return True
         except sqlite3.IntegrityError: return False
 
     def supprimer_agent(self, agent_id):
+        self.invalidate_agent_cache(agent_id)
+        self.queue_event(AgentDeleted(agent_id))
         self.execute_query("DELETE FROM agents WHERE id=?", (agent_id,)); return True
 
+    def add_holiday(self, date_sql, nom, type_jour):
+        try:
+            self.queue_event(HolidaysChanged((date_sql,)))
+            self.execute_query("INSERT INTO jours_feries_personnalises (date, nom, type) VALUES (?, ?, ?)", (date_sql, nom, type_jour))
+            return True
+        except sqlite3.IntegrityError: return False
+
+    def delete_holiday(self, date_sql):
+        try:
+            self.queue_event(HolidaysChanged((date_sql,)))
+            self.execute_query("DELETE FROM jours_feries_personnalises WHERE date = ?", (date_sql,))
+            return True
+        except sqlite3.Error: return False
+
+    def get_holidays_in_range(self, start_sql, end_sql):
+        """Jours fériés enregistrés avec start_sql <= date < end_sql (recherche par plage sur la clé primaire)."""
+        return self.execute_query("SELECT date, nom, type FROM jours_feries_personnalises WHERE date >= ? AND date < ? ORDER BY date", (start_sql, end_sql), fetch="all")
+
     def get_holidays_for_year(self, year):
-        return self.execute_query("SELECT date, nom, type FROM jours_feries_personnalises WHERE strftime('%Y', date) = ? ORDER BY date", (str(year),), fetch="all")
+        return self.get_holidays_in_range(f"{int(year):04d}-01-01", f"{int(year) + 1:04d}-01-01")
+
+    def sync_official_holidays(self, years, force=False):
+        """
+        Enregistre les jours fériés officiels (bibliothèque holidays) des années données, type 'Automatique'.
+        Une année n'est relue que si le pays ou la version de la bibliothèque a changé depuis sa dernière
+        synchronisation (table jours_feries_sync) ; seules les lignes différentes sont écrites, en un
+        executemany. Les jours personnalisés ne sont jamais écrasés. Renvoie les dates modifiées.
+        """
+        import holidays # Chargé au premier besoin : l'import de la bibliothèque est lent
+        country = CONFIG['conges'].get('holidays_country', 'MA')
+        version = getattr(holidays, '__version__', '')
+        years = sorted({int(y) for y in years})
+        if not years: return []
+        placeholders = ','.join('?' * len(years))
+        states = {r[0]: r[1:] for r in self.execute_query(f"SELECT annee, pays, version, empreinte FROM jours_feries_sync WHERE annee IN ({placeholders})", tuple(years), fetch="all")}
+        if not force:
+            years = [y for y in years if states.get(y, (None, None))[:2] != (country, version)]
+            if not years: return []
+
+        official = holidays.country_holidays(country, years=years)
+        by_year = {y: {} for y in years}
+        for date_obj, name in official.items():
+            by_year[date_obj.year][date_obj.strftime('%Y-%m-%d')] = name
+        fingerprints = {y: hashlib.sha256(repr(sorted(days.items())).encode('utf-8')).hexdigest() for y, days in by_year.items()}
+        # Même contenu qu'à la dernière synchronisation : seul l'état est mis à jour
+        changed_years = [y for y in years if force or y not in states or states[y][0] != country or states[y][2] != fingerprints[y]]
+
+        upserts, deletes = [], []
+        if changed_years:
+            existing = {r[0]: (r[1], r[2]) for r in self.get_holidays_in_range(f"{changed_years[0]:04d}-01-01", f"{changed_years[-1] + 1:04d}-01-01")}
+            for y in changed_years:
+                for date_sql, name in by_year[y].items():
+                    if date_sql not in existing or (existing[date_sql][1] == 'Automatique' and existing[date_sql][0] != name):
+                        upserts.append((date_sql, name))
+                deletes.extend((d,) for d, (_, type_jour) in existing.items()
+                               if type_jour == 'Automatique' and int(d[:4]) == y and d not in by_year[y])
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            cursor = self.conn.cursor()
+            cursor.executemany("""INSERT INTO jours_feries_personnalises (date, nom, type) VALUES (?, ?, 'Automatique')
+                                  ON CONFLICT(date) DO UPDATE SET nom = excluded.nom WHERE type = 'Automatique'""", upserts)
+            cursor.executemany("DELETE FROM jours_feries_personnalises WHERE date = ? AND type = 'Automatique'", deletes)
+            cursor.executemany("INSERT OR REPLACE INTO jours_feries_sync (annee, pays, version, empreinte, synchronise_le) VALUES (?, ?, ?, ?, ?)",
+                               [(y, country, version, fingerprints[y], now) for y in years])
+            changed = sorted({d for d, _ in upserts} | {d for d, in deletes})
+            if changed: self.queue_event(HolidaysChanged(tuple(changed)))
+            self.commit()
+            if changed: logging.info(f"Jours fériés officiels synchronisés ({', '.join(map(str, years))}) : {len(changed)} date(s) modifiée(s).")
+            return changed
+        except sqlite3.Error as e: self.rollback(); raise e
         
-    def get_certificat_for_conge(self, conge_id):
-        return self.execute_query("SELECT * FROM certificats_medicaux WHERE conge_id = ?", (conge_id,), fetch="one")
+    def get_certificat_for_conge(self, conge_id, year=None):
+        source = "certificats_medicaux"
+        if year is not None and self.is_year_archived(year):
+            self.attach_archives([year]); source = "certificats_tous"
+        return self.execute_query(f"SELECT {self.CERTIFICAT_COLUMNS} FROM {source} WHERE conge_id = ?", (conge_id,), fetch="one")
+
+    # --- Compactage des chaînes de division ---
+    def compact_cancelled_chains(self, before_sql):
+        """
+        Remplace chaque chaîne de congés annulés décomptés du solde (le congé divisé et les segments eux-mêmes
+        redivisés qu'il contient) terminée avant before_sql par une ligne de conges_historique.
+        Les segments actifs et le congé qui a provoqué la division ne sont pas touchés ; seule la
+        restauration de ces anciennes divisions n'est plus possible. Renvoie (chaînes, lignes supprimées).
+        Seuls les congés annulés terminés avant before_sql et non contenus dans un congé annulé plus récent
+        sont lus : de quoi reconstituer les chaînes à compacter, sans charger tout l'historique.
+        """
+        decompte = self.type_ids_sql('decompte_solde')
+        rows = self.conn.execute(f"""SELECT id, agent_id, date_debut, date_fin, jours_pris, type_id FROM conges c
+                                     WHERE statut_id = {self.STATUT_ANNULE} AND type_id IN {decompte} AND date_fin < ?
+                                       AND NOT EXISTS (SELECT 1 FROM conges p WHERE p.agent_id = c.agent_id AND p.statut_id = {self.STATUT_ANNULE}
+                                                       AND p.type_id IN {decompte} AND p.date_debut <= c.date_debut AND p.date_fin >= ?)
+                                     ORDER BY agent_id, date_debut, date_fin DESC""", (before_sql, before_sql)).fetchall()
+        chains, root = [], None
+        for row in rows:
+            if root and row[1] == root[0][1] and row[3] <= root[0][3]: root.append(row) # Contenu dans le congé racine
+            else: root = [row]; chains.append(root)
+        if not chains: return 0, 0
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            cursor = self.conn.cursor()
+            cursor.executemany("""INSERT INTO conges_historique (agent_id, type_id, date_debut, date_fin, jours_pris, nb_lignes, details, compacte_le)
+                                  VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                               [(c[0][1], c[0][5], c[0][2], c[0][3], c[0][4], len(c), json.dumps([[r[0], r[2], r[3], r[4]] for r in c]), now) for c in chains])
+            ids = [(r[0],) for chain in chains for r in chain]
+            cursor.executemany("DELETE FROM conges WHERE id = ?", ids)
+            self.queue_event(HistoriqueCompacte(tuple(sorted({c[0][1] for c in chains})), len(chains), len(ids)))
+            self.commit()
+        except sqlite3.Error as e: self.rollback(); raise e
+        logging.info(f"Historique compacté : {len(chains)} chaîne(s) de division terminées avant le {before_sql}, {len(ids)} congé(s) annulé(s) supprimé(s).")
+        return len(chains), len(ids)
+
+    def get_historique_compacte(self, agent_id=None, year=None, type_conge=None):
+        """
+        Chaînes de division compactées, pour l'historique et les exports : liste de (id de conges_historique, Conge)
+        où le Conge, sans id, porte le congé racine de la chaîne au statut « Compacté » et le détail dans justif.
+        """
+        q, c, p = "SELECT id, agent_id, type_id, date_debut, date_fin, jours_pris, nb_lignes, compacte_le FROM conges_historique", [], []
+        if agent_id: c.append("agent_id = ?"); p.append(agent_id)
+        if year is not None: c.append("date_debut >= ? AND date_debut < ?"); p.extend([f"{int(year):04d}-01-01", f"{int(year) + 1:04d}-01-01"])
+        if type_conge: c.append("type_id = ?"); p.append(self.type_id(type_conge))
+        if c: q += " WHERE " + " AND ".join(c)
+        result = []
+        for r in self.execute_query(q + " ORDER BY agent_id, date_debut", tuple(p), fetch="all"):
+            conge = self._conge_from_row((None, r[1], r[2], f"Division compactée le {r[7][:10]} ({r[6]} congé(s) annulé(s))", None, r[3], r[4], r[5], self.STATUT_ANNULE))
+            conge.statut = self.STATUT_COMPACTE
+            result.append((r[0], conge))
+        return result
+
+    # --- Archives des années clôturées ---
+    def _archives(self):
+        if self._archive_years is None:
+            self._archive_years = dict(self.conn.execute("SELECT annee, fichier FROM archives").fetchall())
+        return self._archive_years
+
+    def get_archived_years(self):
+        return sorted(self._archives(), reverse=True)
+
+    def is_year_archived(self, year):
+        return year is not None and int(year) in self._archives()
+
+    def attach_archives(self, years):
+        """
+        Attache (ATTACH DATABASE) les archives des années demandées, en détachant au besoin les moins
+        récemment utilisées, puis reconstruit les vues temporaires conges_tous et certificats_tous
+        (base principale UNION ALL archives attachées). Renvoie {année: schéma}.
+        """
+        years = [int(y) for y in years if self.is_year_archived(y)]
+        if len(years) > self.MAX_ATTACHED_ARCHIVES:
+            raise ValueError(f"Au plus {self.MAX_ATTACHED_ARCHIVES} archives peuvent être ouvertes ensemble.")
+        changed = False
+        for year in years:
+            if year in self._attached_archives:
+                self._attached_archives.move_to_end(year); continue
+            while len(self._attached_archives) >= self.MAX_ATTACHED_ARCHIVES:
+                victim = next(y for y in self._attached_archives if y not in years)
+                self.conn.execute(f"DETACH DATABASE {self._attached_archives.pop(victim)}")
+            path = os.path.join(self.archive_dir, self._archives()[year])
+            if not os.path.exists(path): raise sqlite3.Error(f"Archive introuvable : {path}")
+            self.conn.execute(f"ATTACH DATABASE ? AS archive_{year}", (path,))
+            self._attached_archives[year] = f"archive_{year}"
+            changed = True
+        if changed: self._rebuild_archive_views()
+        return {year: self._attached_archives[year] for year in years}
+
+    def _rebuild_archive_views(self):
+        schemas = ["main"] + list(self._attached_archives.values())
+        for view, table, columns in (("conges_tous", "conges", self.CONGE_COLUMNS), ("certificats_tous", "certificats_medicaux", self.CERTIFICAT_COLUMNS)):
+            self.conn.execute(f"DROP VIEW IF EXISTS temp.{view}")
+            self.conn.execute(f"CREATE TEMP VIEW {view} AS " + " UNION ALL ".join(f"SELECT {columns} FROM {schema}.{table}" for schema in schemas))
+
+    def get_archivable_years(self):
+        """Années clôturées (antérieures à l'année en cours) ayant encore des congés dans la base principale."""
+        row = self.conn.execute("SELECT MIN(date_debut) FROM conges").fetchone()
+        if not row[0]: return []
+        return [y for y in range(int(row[0][:4]), datetime.now().year) if not self.is_year_archived(y)
+                and self.conn.execute("SELECT 1 FROM conges WHERE date_debut >= ? AND date_debut < ? LIMIT 1", (f"{y:04d}-01-01", f"{y + 1:04d}-01-01")).fetchone()]
+
+    def archive_year(self, year):
+        """
+        Déplace les congés contenus dans l'année (et leurs certificats) vers archives/archive_AAAA.db,
+        en une transaction sur les deux bases. La base principale garde un résumé par agent et les
+        chemins des certificats (comptage des références). Renvoie le nombre de congés archivés.
+        """
+        year = int(year)
+        if year >= datetime.now().year: raise ValueError("Seules les années clôturées peuvent être archivées.")
+        if self.is_year_archived(year): raise ValueError(f"L'année {year} est déjà archivée.")
+        debut, fin = f"{year:04d}-01-01", f"{year + 1:04d}-01-01"
+        fichier = f"archive_{year}.db"
+        path = os.path.join(self.archive_dir, fichier)
+        if os.path.exists(path): raise ValueError(f"Le fichier {path} existe déjà.")
+        os.makedirs(self.archive_dir, exist_ok=True)
+        schema = f"archive_{year}"
+        self.conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+        try:
+            self.conn.execute(self.TABLE_SQL["conges_archive"].format(table=f"{schema}.conges"))
+            self.conn.execute(f"CREATE INDEX {schema}.idx_conges_agent_dates ON conges(agent_id, date_debut, date_fin)")
+            self.conn.execute(f"""CREATE TABLE {schema}.certificats_medicaux (id INTEGER PRIMARY KEY, conge_id INTEGER NOT NULL UNIQUE, nom_medecin TEXT,
+                                  duree_jours INTEGER, chemin_fichier TEXT NOT NULL, sha256 TEXT)""")
+            cursor = self.conn.cursor()
+            # Les congés qui débordent sur l'année suivante restent dans la base principale : les contrôles de
+            # chevauchement et de disponibilité des intérims ne lisent qu'elle. De même pour les chaînes de division
+            # à cheval sur une année voisine (congé annulé, segments, maladie), pour que leur restauration reste
+            # possible ; la vue conges_tous les montre avec l'année
+            cursor.execute("DROP TABLE IF EXISTS temp.archivage_ids")
+            cursor.execute(f"""CREATE TEMP TABLE archivage_ids AS SELECT id FROM main.conges WHERE date_debut >= ? AND date_debut < ? AND date_fin < ?
+                              EXCEPT SELECT c.id FROM main.conges p JOIN main.conges c
+                                     ON c.agent_id = p.agent_id AND c.date_debut >= p.date_debut AND c.date_fin <= p.date_fin
+                              WHERE p.statut_id = {self.STATUT_ANNULE} AND p.type_id IN {self.type_ids_sql('decompte_solde')}
+                                AND ((p.date_debut < ? AND p.date_fin >= ?) OR (p.date_debut >= ? AND p.date_debut < ? AND p.date_fin >= ?))""",
+                           (debut, fin, fin, debut, debut, debut, fin, fin))
+            in_year = "SELECT id FROM temp.archivage_ids"
+            nb = cursor.execute(f"INSERT INTO {schema}.conges SELECT {self.CONGE_COLUMNS} FROM main.conges WHERE id IN ({in_year})").rowcount
+            nb_cert = cursor.execute(f"INSERT INTO {schema}.certificats_medicaux SELECT {self.CERTIFICAT_COLUMNS} FROM main.certificats_medicaux WHERE conge_id IN ({in_year})").rowcount
+            cursor.execute(f"INSERT INTO archives_certificats (conge_id, annee, chemin_fichier, sha256) SELECT conge_id, ?, chemin_fichier, sha256 FROM {schema}.certificats_medicaux", (year,))
+            cursor.execute(f"""INSERT INTO archives_resume (agent_id, annee, type_id, nb, jours_annuels_actifs)
+                               SELECT agent_id, ?, type_id, COUNT(*), COALESCE(SUM(CASE WHEN type_id IN {self.type_ids_sql('decompte_solde')} AND statut_id = {self.STATUT_ACTIF} THEN jours_pris END), 0)
+                               FROM {schema}.conges GROUP BY agent_id, type_id""", (year,))
+            cursor.execute("INSERT INTO archives (annee, fichier, nb_conges, nb_certificats, archive_le) VALUES (?, ?, ?, ?, ?)",
+                           (year, fichier, nb, nb_cert, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            cursor.execute(f"DELETE FROM main.certificats_medicaux WHERE conge_id IN ({in_year})")
+            cursor.execute(f"DELETE FROM main.conges WHERE id IN ({in_year})")
+            cursor.execute("DROP TABLE temp.archivage_ids")
+            self.commit()
+        except (sqlite3.Error, OSError):
+            if self.conn.in_transaction: self.rollback()
+            self.conn.execute(f"DETACH DATABASE {schema}")
+            if os.path.exists(path): os.remove(path)
+            raise
+        self.conn.execute(f"DETACH DATABASE {schema}")
+        self._archive_years = None
+        logging.info(f"Année {year} archivée dans {path} : {nb} congé(s), {nb_cert} certificat(s).")
+        return nb
     
     def get_agent_by_ppr(self, ppr):
         if not ppr:
             return None
+        self._check_data_version()
+        agent_id = self._agent_ppr_index.get(ppr)
+        if agent_id is not None:
+            agent = self._cached_agent(agent_id)
+            if agent: return agent
+        else: self.agent_cache_misses += 1
         query = "SELECT id, nom, prenom, ppr, grade, solde FROM agents WHERE ppr = ?"
-        return self.execute_query(query, (ppr,), fetch="one")
+        r = self.execute_query(query, (ppr,), fetch="one")
+        if not r: return None
+        agent = Agent.from_db_row(r)
+        self._cache_agent(agent)
+        return agent
 
     def get_overlapping_leaves(self, agent_id, start_date, end_date, conge_id_exclu=None):
-        q = "SELECT * FROM conges WHERE agent_id=? AND date_fin >= ? AND date_debut <= ? AND statut = 'Actif'"
+        q = f"SELECT {self.CONGE_COLUMNS} FROM conges WHERE agent_id=? AND date_fin >= ? AND date_debut <= ? AND statut_id = {self.STATUT_ACTIF}"
         p = [agent_id, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')]
         if conge_id_exclu: q += " AND id != ?"; p.append(conge_id_exclu)
-        return [Conge.from_db_row(r) for r in self.execute_query(q, tuple(p), fetch="all") if r]
\ No newline at end of file
+        return [self._conge_from_row(r) for r in self.execute_query(q, tuple(p), fetch="all") if r]
\ No newline at end of file
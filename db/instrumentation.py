@@ -0,0 +1,250 @@
+# db/instrumentation.py
+import csv
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+
+_RE_STRING = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_IN_LIST = re.compile(r"IN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_RE_SPACES = re.compile(r"\s+")
+
+def normalize_sql(sql):
+    """Forme canonique d'une requête : littéraux remplacés par ?, listes IN repliées, espaces réduits."""
+    sql = _RE_STRING.sub("?", sql)
+    sql = _RE_NUMBER.sub("?", sql)
+    sql = _RE_IN_LIST.sub("IN (?...)", sql)
+    return _RE_SPACES.sub(" ", sql).strip()
+
+
+class QueryStat:
+    """Agrégat des exécutions d'une requête normalisée."""
+    __slots__ = ("sql", "count", "total", "max", "rows", "slow")
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.slow = 0
+
+    def as_dict(self):
+        return {"sql": self.sql, "count": self.count, "total_ms": round(self.total * 1000, 3),
+                "avg_ms": round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+                "max_ms": round(self.max * 1000, 3), "rows": self.rows, "slow": self.slow}
+
+
+class QueryProfiler:
+    """
+    Collecte les temps d'exécution de toutes les requêtes passant par une InstrumentedConnection.
+    Le temps d'une requête inclut la lecture de ses lignes (fetch), SQLite ne calculant
+    les résultats qu'au fil de la lecture. Au-delà de slow_query_ms, la requête est
+    journalisée avec son plan d'exécution (EXPLAIN QUERY PLAN).
+    """
+    MAX_SLOW_QUERIES = 200
+
+    def __init__(self, enabled=False, slow_query_ms=200, explain_slow=True):
+        self.enabled = enabled
+        self.slow_query_s = slow_query_ms / 1000.0
+        self.explain_slow = explain_slow
+        self._stats = {}
+        self._slow_queries = deque(maxlen=self.MAX_SLOW_QUERIES)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        conf = (config.get('db') or {}).get('profiling') or {}
+        return cls(enabled=conf.get('enabled', False), slow_query_ms=conf.get('slow_query_ms', 200),
+                   explain_slow=conf.get('explain_slow', True))
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._slow_queries.clear()
+
+    def _stat(self, sql):
+        stat = self._stats.get(sql)
+        if stat is None:
+            stat = self._stats[sql] = QueryStat(normalize_sql(sql))
+        return stat
+
+    def record_execute(self, sql, duration, rows):
+        with self._lock:
+            stat = self._stat(sql)
+            stat.count += 1
+            stat.total += duration
+            stat.max = max(stat.max, duration)
+            stat.rows += max(rows, 0)
+
+    def record_fetch(self, sql, duration, rows, statement_total):
+        """Ajoute le temps de lecture à la requête ; met à jour son maximum avec son temps cumulé."""
+        with self._lock:
+            stat = self._stat(sql)
+            stat.total += duration
+            stat.rows += rows
+            stat.max = max(stat.max, statement_total)
+
+    def record_slow(self, conn, sql, params, duration, executions=None):
+        """executions : nombre de jeux de paramètres d'un executemany (le plan est celui du premier)."""
+        plan = self._explain(conn, sql, params) if self.explain_slow else []
+        entry = {"sql": normalize_sql(sql), "duration_ms": round(duration * 1000, 3), "plan": plan, "at": time.strftime("%Y-%m-%d %H:%M:%S")}
+        if executions is not None: entry["executions"] = executions
+        with self._lock:
+            self._stat(sql).slow += 1
+            self._slow_queries.append(entry)
+        many = f", executemany de {executions} jeu(x) de paramètres" if executions is not None else ""
+        logging.warning(f"Requête lente ({duration * 1000:.1f} ms{many}): {normalize_sql(sql)}"
+                        + ("\n  Plan: " + "\n        ".join(plan) if plan else ""))
+
+    @staticmethod
+    def _explain(conn, sql, params):
+        if not sql.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT", "REPLACE", "WITH")):
+            return []
+        try:
+            # Curseur de base : l'EXPLAIN lui-même n'est pas mesuré
+            rows = sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+            return [row[-1] for row in rows]
+        except sqlite3.Error as e:
+            return [f"(plan indisponible : {e})"]
+
+    # --- Rapport ---
+    def report(self):
+        """Statistiques par requête normalisée, triées par temps total décroissant."""
+        with self._lock:
+            merged = {}
+            for stat in self._stats.values():
+                entry = merged.setdefault(stat.sql, {"sql": stat.sql, "count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "slow": 0})
+                d = stat.as_dict()
+                entry["count"] += d["count"]; entry["total_ms"] += d["total_ms"]; entry["rows"] += d["rows"]; entry["slow"] += d["slow"]
+                entry["max_ms"] = max(entry["max_ms"], d["max_ms"])
+            slow = list(self._slow_queries)
+        for entry in merged.values():
+            entry["total_ms"] = round(entry["total_ms"], 3)
+            entry["avg_ms"] = round(entry["total_ms"] / entry["count"], 3) if entry["count"] else 0.0
+        return sorted(merged.values(), key=lambda e: e["total_ms"], reverse=True), slow
+
+    def format_report(self, limit=20):
+        stats, slow = self.report()
+        lines = [f"{'Total ms':>10} {'Nb':>7} {'Moy ms':>9} {'Max ms':>9} {'Lignes':>9}  Requête"]
+        for e in stats[:limit]:
+            lines.append(f"{e['total_ms']:>10.1f} {e['count']:>7} {e['avg_ms']:>9.2f} {e['max_ms']:>9.1f} {e['rows']:>9}  {e['sql'][:150]}")
+        lines.append(f"{len(slow)} requête(s) lente(s) (> {self.slow_query_s * 1000:.0f} ms) enregistrée(s).")
+        return "\n".join(lines)
+
+    def export_report(self, path):
+        """Exporte le rapport en JSON (statistiques + requêtes lentes) ou en CSV selon l'extension."""
+        stats, slow = self.report()
+        if path.lower().endswith(".csv"):
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=["sql", "count", "total_ms", "avg_ms", "max_ms", "rows", "slow"])
+                writer.writeheader()
+                writer.writerows(stats)
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"slow_query_ms": self.slow_query_s * 1000, "queries": stats, "slow_queries": slow}, f, ensure_ascii=False, indent=2)
+        return path
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Curseur qui mesure chaque exécution et la lecture de ses résultats."""
+    _sql = None
+    _params = ()
+    _elapsed = 0.0
+    _flagged = False
+
+    def execute(self, sql, parameters=()):
+        profiler = self.connection.profiler
+        if not profiler.enabled:
+            return super().execute(sql, parameters)
+        t0 = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - t0
+            self._sql, self._params, self._elapsed, self._flagged = sql, parameters, elapsed, False
+            profiler.record_execute(sql, elapsed, self.rowcount)
+            self._check_slow(profiler)
+
+    def executemany(self, sql, seq_of_parameters):
+        profiler = self.connection.profiler
+        if not profiler.enabled:
+            return super().executemany(sql, seq_of_parameters)
+        seen = {"first": (), "count": 0}
+        def counted(params): # Premier jeu de paramètres (pour l'EXPLAIN) et nombre d'exécutions, sans copier la séquence
+            for p in params:
+                if not seen["count"]: seen["first"] = p
+                seen["count"] += 1
+                yield p
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(sql, counted(seq_of_parameters))
+        finally:
+            elapsed = time.perf_counter() - t0
+            self._sql, self._params, self._elapsed, self._flagged = sql, seen["first"], elapsed, True
+            profiler.record_execute(sql, elapsed, self.rowcount)
+            if elapsed >= profiler.slow_query_s:
+                profiler.record_slow(self.connection, sql, seen["first"], elapsed, executions=seen["count"])
+
+    def _timed_fetch(self, method, *args):
+        profiler = self.connection.profiler
+        if not profiler.enabled or self._sql is None:
+            return method(*args)
+        t0 = time.perf_counter()
+        result = method(*args)
+        elapsed = time.perf_counter() - t0
+        self._elapsed += elapsed
+        rows = len(result) if isinstance(result, list) else (1 if result is not None else 0)
+        profiler.record_fetch(self._sql, elapsed, rows, self._elapsed)
+        self._check_slow(profiler)
+        return result
+
+    def _check_slow(self, profiler):
+        if not self._flagged and self._elapsed >= profiler.slow_query_s:
+            self._flagged = True
+            profiler.record_slow(self.connection, self._sql, self._params, self._elapsed)
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, size if size is not None else self.arraysize)
+
+    def __next__(self):
+        row = self._timed_fetch(super().fetchone)
+        if row is None: raise StopIteration
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connexion dont tous les curseurs (y compris ceux de conn.execute) sont instrumentés."""
+    profiler = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connect(db_file, profiler, **kwargs):
+    """
+    Ouvre une connexion SQLite, instrumentée seulement si le profileur est actif :
+    sans profilage, on garde une connexion standard, sans aucun surcoût.
+    """
+    if not (profiler and profiler.enabled):
+        return sqlite3.connect(db_file, **kwargs)
+    conn = sqlite3.connect(db_file, factory=InstrumentedConnection, **kwargs)
+    conn.profiler = profiler
+    return conn
@@ -0,0 +1,103 @@
+# db/leave_frame.py
+"""
+Instantané colonnaire des congés pour les analyses (statistiques, rapports) : la table conges
+est lue en un seul parcours de curseur dans des tableaux NumPy (une colonne par attribut, dates
+en ordinaux de jours), sans créer d'objet Conge. Regroupements, filtres et calculs d'intervalles
+sont vectorisés. Voir DatabaseManager.get_leave_frame pour le cache (jeton de version de la base).
+"""
+import numpy as np
+
+from db.models import TypeConge
+
+# date.toordinal() d'une date 'AAAA-MM-JJ', calculé par SQLite : julianday('0001-01-01') = 1721425.5
+_ORDINAL_SQL = "CAST(julianday({col}) - 1721424.5 AS INTEGER)"
+_EPOCH_ORDINAL = 719163 # date(1970, 1, 1).toordinal()
+
+
+class LeaveFrame:
+    DTYPE = np.dtype([("id", np.int32), ("agent_id", np.int32), ("type_id", np.int16), ("debut", np.int32),
+                      ("fin", np.int32), ("jours_pris", np.int32), ("statut_id", np.int8)])
+    BINCOUNT_MAX_KEY = 1 << 22 # Au-delà, les regroupements passent par np.unique (tri)
+
+    def __init__(self, columns, types):
+        for name in self.DTYPE.names:
+            setattr(self, name, columns[name])
+        self.types = types # code -> TypeConge
+
+    def __len__(self):
+        return len(self.id)
+
+    @classmethod
+    def load(cls, conn):
+        """Lit conges (base principale) et types_conge sur conn ; utilisable depuis un thread de fond avec sa propre connexion."""
+        types = {r[0]: TypeConge.from_db_row(r) for r in conn.execute(
+            "SELECT id, libelle, jours_ouvres, decompte_solde, certificat_requis, duree_defaut FROM types_conge")}
+        cursor = conn.execute(f"""SELECT id, agent_id, type_id, {_ORDINAL_SQL.format(col='date_debut')}, {_ORDINAL_SQL.format(col='date_fin')},
+                                         jours_pris, statut_id FROM conges ORDER BY id""")
+        rows = np.fromiter(cursor, dtype=cls.DTYPE) # Une seule requête : lecture cohérente, sans COUNT préalable
+        # Colonnes contiguës : les opérations vectorisées ne parcourent que la colonne utile
+        return cls({name: np.ascontiguousarray(rows[name]) for name in cls.DTYPE.names}, types)
+
+    # --- Filtres ---
+    def filter(self, mask):
+        """Nouvel instantané restreint aux lignes où mask (tableau booléen ou d'indices) est vrai."""
+        return LeaveFrame({name: getattr(self, name)[mask] for name in self.DTYPE.names}, self.types)
+
+    def statut(self, statut_id):
+        return self.filter(self.statut_id == statut_id)
+
+    def type_ids(self, flag):
+        """Codes des types ayant ce drapeau (jours_ouvres, decompte_solde, certificat_requis)."""
+        return np.array([t.id for t in self.types.values() if getattr(t, flag)], dtype=self.type_id.dtype)
+
+    def of_types(self, flag):
+        return self.filter(np.isin(self.type_id, self.type_ids(flag)))
+
+    # --- Intervalles (bornes incluses, en ordinaux ou en dates) ---
+    @staticmethod
+    def ordinal(day):
+        return day if isinstance(day, (int, np.integer)) else day.toordinal()
+
+    def overlapping(self, start, end):
+        """Masque des congés qui chevauchent [start, end]."""
+        return (self.debut <= self.ordinal(end)) & (self.fin >= self.ordinal(start))
+
+    def days_in(self, start, end):
+        """Jours calendaires de chaque congé compris dans [start, end] (0 hors période)."""
+        start, end = self.ordinal(start), self.ordinal(end)
+        return np.clip(np.minimum(self.fin, end) - np.maximum(self.debut, start) + 1, 0, None)
+
+    def absences_per_day(self, start, end):
+        """Nombre de congés en cours pour chaque jour de [start, end] (tableau de end - start + 1 valeurs)."""
+        start, end = self.ordinal(start), self.ordinal(end)
+        mask = self.overlapping(start, end)
+        first = np.maximum(self.debut[mask], start) - start
+        after = np.minimum(self.fin[mask], end) - start + 1
+        size = end - start + 2
+        return np.cumsum(np.bincount(first, minlength=size) - np.bincount(after, minlength=size))[:-1]
+
+    def years(self):
+        """Année de début de chaque congé."""
+        return (self.debut - _EPOCH_ORDINAL).astype("datetime64[D]").astype("datetime64[Y]").astype(np.int32) + 1970
+
+    # --- Regroupements ---
+    def group_by(self, keys, values="jours_pris"):
+        """
+        Regroupe par une colonne (nom) ou un tableau de clés : renvoie (clés, nombre, somme de values),
+        dans l'ordre croissant des clés.
+        """
+        keys = getattr(self, keys) if isinstance(keys, str) else np.asarray(keys)
+        weights = getattr(self, values) if isinstance(values, str) else values
+        if not len(keys):
+            return keys, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        if keys.min() >= 0 and keys.max() < self.BINCOUNT_MAX_KEY:
+            counts = np.bincount(keys)
+            sums = np.bincount(keys, weights=weights)
+            present = np.flatnonzero(counts)
+            return present, counts[present], sums[present].astype(np.int64)
+        unique, inverse = np.unique(keys, return_inverse=True)
+        return unique, np.bincount(inverse), np.bincount(inverse, weights=weights).astype(np.int64)
+
+    def type_libelle(self, type_id):
+        type_conge = self.types.get(int(type_id))
+        return type_conge.libelle if type_conge else str(type_id)
@@ -0,0 +1,145 @@
+# db/maintenance.py
+"""
+Entretien de la base, limité dans le temps : statistiques du planificateur (PRAGMA optimize,
+ANALYZE borné par analysis_limit), récupération des pages libres (incremental_vacuum, la base
+étant en auto_vacuum INCREMENTAL depuis la migration 003) et contrôle rapide (quick_check).
+
+Chaque étape reçoit le temps restant ; une étape trop longue est interrompue par un
+gestionnaire de progression SQLite, sans rien laisser à moitié (les transactions sont courtes).
+Utilise sa propre connexion : peut tourner dans un thread de fond. La date de la dernière
+exécution est enregistrée dans la base (table maintenance_etat) : l'intervalle entre deux
+entretiens est respecté d'une session de l'application à l'autre.
+
+    python -m db.maintenance [--budget 30]
+"""
+import logging
+import sqlite3
+import time
+from datetime import datetime
+
+try:
+    from utils.config_loader import CONFIG
+except ImportError:
+    CONFIG = {}
+
+
+class MaintenanceManager:
+    STEPS = ("optimize", "vacuum", "check")
+    ANALYSIS_LIMIT = 1000   # Lignes échantillonnées par index pour ANALYZE
+    VACUUM_CHUNK = 256      # Pages libérées par transaction
+    PROGRESS_OPS = 10000    # Instructions VM entre deux vérifications du délai
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+
+    @staticmethod
+    def _ensure_state_table(conn):
+        conn.execute("CREATE TABLE IF NOT EXISTS maintenance_etat (cle TEXT PRIMARY KEY, valeur TEXT NOT NULL)")
+
+    def last_run(self):
+        """Date de la dernière exécution (datetime), ou None si l'entretien n'a jamais tourné."""
+        conn = sqlite3.connect(self.db_file, timeout=1.0)
+        try:
+            self._ensure_state_table(conn)
+            row = conn.execute("SELECT valeur FROM maintenance_etat WHERE cle = 'derniere_execution'").fetchone()
+        finally:
+            conn.close()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def is_due(self, interval_hours):
+        last = self.last_run()
+        return last is None or (datetime.now() - last).total_seconds() >= interval_hours * 3600
+
+    def _size(self, conn):
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return (conn.execute("PRAGMA page_count").fetchone()[0] * page_size,
+                conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size)
+
+    @staticmethod
+    def _deadline_guard(conn, deadline):
+        """Interrompt la requête en cours (OperationalError 'interrupted') une fois le délai dépassé."""
+        conn.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, MaintenanceManager.PROGRESS_OPS)
+
+    def _optimize(self, conn, deadline):
+        conn.execute(f"PRAGMA analysis_limit = {self.ANALYSIS_LIMIT}")
+        if conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()[0] == 0:
+            conn.execute("ANALYZE") # Première fois : PRAGMA optimize ne l'aurait fait que pour les tables déjà interrogées
+        else:
+            conn.execute("PRAGMA optimize")
+        conn.commit()
+        return "ok"
+
+    def _vacuum(self, conn, deadline):
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return "auto_vacuum non incrémental (migration 003 non appliquée)"
+        pages = 0
+        while time.monotonic() < deadline:
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if not free: break
+            # executescript exécute le PRAGMA jusqu'au bout (execute() n'en fait qu'un pas : une seule page)
+            conn.executescript(f"PRAGMA incremental_vacuum({self.VACUUM_CHUNK});")
+            pages += free - conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return f"{pages} page(s) rendue(s)"
+
+    def _check(self, conn, deadline):
+        result = [row[0] for row in conn.execute("PRAGMA quick_check").fetchall()]
+        if result != ["ok"]:
+            logging.error("quick_check : base incohérente :\n" + "\n".join(result[:20]))
+        return "ok" if result == ["ok"] else f"{len(result)} problème(s)"
+
+    def run(self, budget_seconds=5.0, steps=STEPS):
+        """Exécute les étapes dans le temps imparti ; renvoie un rapport {étape: résultat, ...}."""
+        started = time.monotonic()
+        deadline = started + budget_seconds
+        report = {}
+        conn = sqlite3.connect(self.db_file, timeout=1.0)
+        try:
+            size_before, free_before = self._size(conn)
+            for step in steps:
+                if time.monotonic() >= deadline:
+                    report[step] = "non exécuté (délai écoulé)"
+                    continue
+                step_started = time.monotonic()
+                self._deadline_guard(conn, deadline)
+                try:
+                    report[step] = getattr(self, f"_{step}")(conn, deadline)
+                except sqlite3.OperationalError as e:
+                    conn.rollback()
+                    report[step] = "interrompu (délai écoulé)" if "interrupt" in str(e) else f"échec : {e}"
+                finally:
+                    conn.set_progress_handler(None, 0)
+                report[f"{step}_s"] = round(time.monotonic() - step_started, 3)
+            size_after, free_after = self._size(conn)
+            if any(f"{step}_s" in report for step in steps):
+                self._ensure_state_table(conn)
+                conn.execute("INSERT OR REPLACE INTO maintenance_etat (cle, valeur) VALUES ('derniere_execution', ?)",
+                             (datetime.now().isoformat(timespec="seconds"),))
+                conn.commit()
+        finally:
+            conn.close()
+        report.update(taille_avant=size_before, taille_apres=size_after, libre_avant=free_before, libre_apres=free_after,
+                      recupere=size_before - size_after, duree_s=round(time.monotonic() - started, 3))
+        logging.info(f"Maintenance de la base : {size_before / 1024 / 1024:.1f} Mo -> {size_after / 1024 / 1024:.1f} Mo "
+                     f"({report['recupere'] / 1024:.0f} Ko récupérés, {free_after / 1024:.0f} Ko encore libres) en {report['duree_s']:.1f} s ; "
+                     + ", ".join(f"{step}: {report[step]}" for step in steps))
+        return report
+
+
+def main(argv=None):
+    import argparse
+    import os
+    from utils.config_loader import load_config
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    load_config(os.path.join(base_dir, "config.yaml"))
+
+    parser = argparse.ArgumentParser(description="Entretien de la base (statistiques, pages libres, contrôle).")
+    parser.add_argument("--db", default=os.path.join(base_dir, CONFIG['db']['filename']))
+    parser.add_argument("--budget", type=float, default=60.0, help="Durée maximale (s)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    report = MaintenanceManager(args.db).run(args.budget)
+    return 1 if "problème" in report.get("check", "") else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
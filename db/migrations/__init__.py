@@ -0,0 +1,103 @@
+# db/migrations/__init__.py
+"""
+Migrations du schéma, numérotées et appliquées dans l'ordre d'après PRAGMA user_version.
+
+Chaque module mNNN_*.py définit VERSION, DESCRIPTION et upgrade(ctx). Les reprises de
+données volumineuses passent par ctx.backfill() : traitement par tranches de lignes (une
+transaction courte par tranche, la base n'est jamais verrouillée longtemps), avec la
+dernière clé traitée enregistrée dans migrations_progression. Une migration interrompue
+reprend là où elle s'était arrêtée ; user_version n'avance qu'une fois la migration terminée.
+
+    python migration_soldes.py [--status] [--batch 5000]
+"""
+import logging
+import time
+from datetime import datetime
+
+from db.migrations import m001_dates_iso, m002_certificats_sha256, m003_auto_vacuum, m004_codes_types_statuts
+
+MIGRATIONS = sorted([m001_dates_iso, m002_certificats_sha256, m003_auto_vacuum, m004_codes_types_statuts], key=lambda module: module.VERSION)
+LATEST_VERSION = MIGRATIONS[-1].VERSION
+DEFAULT_BATCH_SIZE = 5000
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def pending_migrations(conn):
+    version = get_schema_version(conn)
+    return [module for module in MIGRATIONS if module.VERSION > version]
+
+
+class MigrationContext:
+    """Passé à upgrade() : connexion, taille des tranches et suivi de progression."""
+    def __init__(self, db_manager, migration, batch_size=DEFAULT_BATCH_SIZE, pause=0.0, progress=None):
+        self.db = db_manager
+        self.conn = db_manager.conn
+        self.migration = migration
+        self.batch_size = batch_size
+        self.pause = pause # s entre deux tranches : laisse passer les écritures des autres connexions
+        self.progress = progress or (lambda name, done, total: None)
+
+    def _progress_key(self, name):
+        return f"{self.migration.VERSION:03d}:{name}"
+
+    def backfill(self, name, table, chunk):
+        """
+        Applique chunk(cursor, premier_id, dernier_id) -> nb de lignes modifiées sur table, par tranches
+        de batch_size lignes dans l'ordre de la clé primaire. chunk peut aussi être une requête SQL
+        recevant (premier_id, dernier_id) en paramètres. Renvoie le nombre total de lignes modifiées.
+        """
+        key = self._progress_key(name)
+        row = self.conn.execute("SELECT dernier_id, lignes FROM migrations_progression WHERE nom = ?", (key,)).fetchone()
+        last_id, changed = row if row else (0, 0)
+        if last_id: logging.info(f"Migration {key} : reprise après l'id {last_id}.")
+        total = self.conn.execute(f"SELECT COUNT(*) FROM {table} WHERE id > ?", (last_id,)).fetchone()[0]
+        done = 0
+        while True:
+            bounds = self.conn.execute(f"SELECT MIN(id), MAX(id), COUNT(*) FROM (SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT ?)",
+                                       (last_id, self.batch_size)).fetchone()
+            if not bounds[2]: break
+            first, last, rows = bounds
+            try:
+                cursor = self.conn.cursor()
+                if isinstance(chunk, str): n = cursor.execute(chunk, (first, last)).rowcount
+                else: n = chunk(cursor, first, last)
+                changed += max(n or 0, 0)
+                cursor.execute("""INSERT INTO migrations_progression (nom, dernier_id, lignes, maj_le) VALUES (?, ?, ?, ?)
+                                  ON CONFLICT(nom) DO UPDATE SET dernier_id = excluded.dernier_id, lignes = excluded.lignes, maj_le = excluded.maj_le""",
+                               (key, last, changed, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+                self.db.commit()
+            except Exception:
+                self.db.rollback()
+                raise
+            last_id = last
+            done += rows
+            self.progress(key, done, total)
+            if self.pause: time.sleep(self.pause)
+        return changed
+
+
+def _ensure_progress_table(db_manager):
+    db_manager.conn.execute("""CREATE TABLE IF NOT EXISTS migrations_progression (nom TEXT PRIMARY KEY, dernier_id INTEGER NOT NULL,
+                                lignes INTEGER NOT NULL DEFAULT 0, maj_le TEXT NOT NULL)""")
+    db_manager.commit()
+
+
+def migrate(db_manager, batch_size=DEFAULT_BATCH_SIZE, pause=0.0, progress=None, target=None):
+    """Applique les migrations en attente (jusqu'à target si précisé) ; renvoie les versions appliquées."""
+    _ensure_progress_table(db_manager)
+    applied = []
+    for module in pending_migrations(db_manager.conn):
+        if target is not None and module.VERSION > target: break
+        started = time.perf_counter()
+        logging.info(f"Migration {module.VERSION:03d} : {module.DESCRIPTION}")
+        module.upgrade(MigrationContext(db_manager, module, batch_size, pause, progress))
+        # user_version et nettoyage de la progression dans la même transaction
+        db_manager.conn.execute("DELETE FROM migrations_progression WHERE nom LIKE ?", (f"{module.VERSION:03d}:%",))
+        db_manager.conn.execute(f"PRAGMA user_version = {int(module.VERSION)}")
+        db_manager.commit()
+        applied.append(module.VERSION)
+        logging.info(f"Migration {module.VERSION:03d} terminée en {time.perf_counter() - started:.1f} s.")
+    return applied
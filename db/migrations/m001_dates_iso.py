@@ -0,0 +1,13 @@
+# db/migrations/m001_dates_iso.py
+"""
+Les premières versions inséraient des objets datetime : les dates étaient stockées
+'AAAA-MM-JJ HH:MM:SS'. Comparées comme chaînes aux bornes 'AAAA-MM-JJ' des requêtes
+(chevauchements, années), ces lignes donnent des résultats faux ('2020-03-01 00:00:00' > '2020-03-01').
+"""
+VERSION = 1
+DESCRIPTION = "Dates des congés au format AAAA-MM-JJ"
+
+
+def upgrade(ctx):
+    ctx.backfill("conges", "conges", """UPDATE conges SET date_debut = substr(date_debut, 1, 10), date_fin = substr(date_fin, 1, 10)
+                                        WHERE id BETWEEN ? AND ? AND (length(date_debut) > 10 OR length(date_fin) > 10)""")
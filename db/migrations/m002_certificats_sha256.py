@@ -0,0 +1,36 @@
+# db/migrations/m002_certificats_sha256.py
+"""
+Empreinte des certificats joints avant le magasin par contenu : sans elle, un fichier
+n'est compté que par son chemin avant suppression (voir DatabaseManager.count_certificat_references).
+La colonne sha256 et son index sont ajoutés aux bases qui ne les ont pas encore, puis les fichiers
+sont lus hors transaction ; seule la mise à jour de la tranche prend le verrou d'écriture.
+"""
+import logging
+import os
+
+from core.conges.certificats import CertificateStore
+
+VERSION = 2
+DESCRIPTION = "Empreinte sha256 des certificats existants"
+
+
+def _hash_chunk(cursor, first_id, last_id):
+    rows = cursor.execute("SELECT id, chemin_fichier FROM certificats_medicaux WHERE id BETWEEN ? AND ? AND sha256 IS NULL",
+                          (first_id, last_id)).fetchall()
+    updates = []
+    for cert_id, chemin in rows:
+        if not chemin or not os.path.isfile(chemin): continue # Fichier absent : signalé par le contrôle des certificats
+        try:
+            updates.append((CertificateStore.hash_file(chemin), cert_id))
+        except OSError as e:
+            logging.warning(f"Empreinte impossible pour {chemin}: {e}")
+    cursor.executemany("UPDATE certificats_medicaux SET sha256 = ? WHERE id = ?", updates)
+    return len(updates)
+
+
+def upgrade(ctx):
+    if "sha256" not in {row[1] for row in ctx.conn.execute("PRAGMA table_info(certificats_medicaux)")}:
+        ctx.conn.execute("ALTER TABLE certificats_medicaux ADD COLUMN sha256 TEXT")
+    ctx.conn.execute("CREATE INDEX IF NOT EXISTS idx_certificats_sha256 ON certificats_medicaux(sha256) WHERE sha256 IS NOT NULL")
+    ctx.db.commit()
+    ctx.backfill("certificats_medicaux", "certificats_medicaux", _hash_chunk)
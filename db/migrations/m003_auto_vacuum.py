@@ -0,0 +1,18 @@
+# db/migrations/m003_auto_vacuum.py
+"""
+Passage en auto_vacuum INCREMENTAL : les pages libérées par les suppressions (divisions,
+annulations) sont ensuite rendues au système par db.maintenance (PRAGMA incremental_vacuum).
+Sur une base existante, le changement ne prend effet qu'après un VACUUM complet, exécuté
+une seule fois ici (les bases neuves sont créées directement en mode incrémental).
+"""
+VERSION = 3
+DESCRIPTION = "auto_vacuum incrémental"
+
+
+def upgrade(ctx):
+    if ctx.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2: return
+    ctx.db.commit()
+    ctx.progress("003:vacuum", 0, 1)
+    ctx.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    ctx.conn.execute("VACUUM") # Hors transaction
+    ctx.progress("003:vacuum", 1, 1)
@@ -0,0 +1,126 @@
+# db/migrations/m004_codes_types_statuts.py
+"""
+Les types et statuts des congés, jusque-là des libellés répétés sur chaque ligne, deviennent
+des codes entiers renvoyant aux tables types_conge et statuts (règles de calcul par type :
+jours ouvrés, décompte du solde, certificat requis). Lignes et index plus petits, regroupements
+plus rapides, et un nouveau type de congé n'est plus qu'une ligne de types_conge.
+
+SQLite ne sait pas changer le type d'une colonne : conges est recopiée par tranches dans
+conges_codes, tenue à jour par des déclencheurs pendant la copie (écritures d'une autre
+instance), puis substituée à l'ancienne table en une transaction courte. Les petites tables
+(archives_resume, conges_historique) et les bases d'archives sont reconstruites d'un coup.
+L'espace de l'ancienne table est rendu par l'entretien (incremental_vacuum).
+"""
+import logging
+import os
+
+VERSION = 4
+DESCRIPTION = "Codes des types et statuts de congé (tables types_conge et statuts)"
+
+_COLONNES = "id, agent_id, type_id, justif, interim_id, date_debut, date_fin, jours_pris, statut_id"
+_CODES = """c.id, c.agent_id, (SELECT id FROM {main}types_conge WHERE libelle = c.type_conge), c.justif, c.interim_id,
+            c.date_debut, c.date_fin, c.jours_pris, (SELECT id FROM {main}statuts WHERE libelle = c.statut)"""
+
+
+def _columns(conn, table, schema="main"):
+    return {row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")}
+
+
+def _add_libelles(conn, table):
+    """Les libellés inconnus des tables de référence (types ajoutés à la main) y entrent avec les règles par défaut."""
+    conn.execute(f"INSERT OR IGNORE INTO types_conge (libelle) SELECT DISTINCT type_conge FROM {table}")
+    if "statut" in _columns(conn, table):
+        conn.execute(f"INSERT OR IGNORE INTO statuts (libelle) SELECT DISTINCT statut FROM {table}")
+
+
+def _convert_archives(ctx):
+    """Bases d'archives (archive_AAAA.db) : leur table conges est petite, reconstruite en une transaction chacune."""
+    conn = ctx.conn
+    for annee, fichier in conn.execute("SELECT annee, fichier FROM archives ORDER BY annee").fetchall():
+        path = os.path.join(ctx.db.archive_dir, fichier)
+        if not os.path.exists(path):
+            logging.warning(f"Migration 004 : archive {annee} introuvable ({path}), non convertie.")
+            continue
+        conn.execute("ATTACH DATABASE ? AS archive_migration", (path,))
+        try:
+            if "type_conge" in _columns(conn, "conges", "archive_migration"):
+                conn.execute("BEGIN")
+                conn.execute("INSERT OR IGNORE INTO main.types_conge (libelle) SELECT DISTINCT type_conge FROM archive_migration.conges")
+                conn.execute("INSERT OR IGNORE INTO main.statuts (libelle) SELECT DISTINCT statut FROM archive_migration.conges")
+                conn.execute(ctx.db.TABLE_SQL["conges_archive"].format(table="archive_migration.conges_codes"))
+                conn.execute(f"INSERT INTO archive_migration.conges_codes ({_COLONNES}) SELECT {_CODES.format(main='main.')} FROM archive_migration.conges c")
+                conn.execute("DROP TABLE archive_migration.conges")
+                conn.execute("ALTER TABLE archive_migration.conges_codes RENAME TO conges")
+                conn.execute("CREATE INDEX archive_migration.idx_conges_agent_dates ON conges(agent_id, date_debut, date_fin)")
+                ctx.db.commit()
+        except Exception:
+            if conn.in_transaction: ctx.db.rollback()
+            raise
+        finally:
+            conn.execute("DETACH DATABASE archive_migration")
+
+
+def _create_sync_triggers(conn):
+    """Reportent dans conges_codes les écritures faites sur conges pendant la copie."""
+    upsert = f"""INSERT OR IGNORE INTO types_conge (libelle) VALUES (NEW.type_conge);
+                 INSERT OR IGNORE INTO statuts (libelle) VALUES (NEW.statut);
+                 INSERT OR REPLACE INTO conges_codes ({_COLONNES}) SELECT {_CODES.format(main='')} FROM conges c WHERE c.id = NEW.id;"""
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS conges_codes_ai AFTER INSERT ON conges BEGIN {upsert} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS conges_codes_au AFTER UPDATE ON conges BEGIN DELETE FROM conges_codes WHERE id = OLD.id; {upsert} END")
+    conn.execute("CREATE TRIGGER IF NOT EXISTS conges_codes_ad AFTER DELETE ON conges BEGIN DELETE FROM conges_codes WHERE id = OLD.id; END")
+
+
+def _swap(ctx, old_tables):
+    """Remplace les anciennes tables par les nouvelles, clés étrangères suspendues (DROP TABLE conges supprimerait les certificats)."""
+    conn = ctx.conn
+    ctx.db.commit()
+    conn.execute("PRAGMA foreign_keys = OFF") # Sans effet dans une transaction
+    try:
+        conn.execute("BEGIN")
+        if "conges" in old_tables:
+            for trigger in ("conges_codes_ai", "conges_codes_au", "conges_codes_ad"):
+                conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            conn.execute("DROP TABLE conges")
+            conn.execute("ALTER TABLE conges_codes RENAME TO conges")
+            ctx.db.create_conges_indexes()
+        if "archives_resume" in old_tables:
+            conn.execute(ctx.db.TABLE_SQL["archives_resume"].format(table="archives_resume_codes"))
+            conn.execute("""INSERT INTO archives_resume_codes (agent_id, annee, type_id, nb, jours_annuels_actifs)
+                            SELECT r.agent_id, r.annee, t.id, r.nb, r.jours_annuels_actifs FROM archives_resume r JOIN types_conge t ON t.libelle = r.type_conge""")
+            conn.execute("DROP TABLE archives_resume")
+            conn.execute("ALTER TABLE archives_resume_codes RENAME TO archives_resume")
+        if "conges_historique" in old_tables:
+            conn.execute(ctx.db.TABLE_SQL["conges_historique"].format(table="conges_historique_codes"))
+            conn.execute("""INSERT INTO conges_historique_codes (id, agent_id, type_id, date_debut, date_fin, jours_pris, nb_lignes, details, compacte_le)
+                            SELECT h.id, h.agent_id, t.id, h.date_debut, h.date_fin, h.jours_pris, h.nb_lignes, h.details, h.compacte_le
+                            FROM conges_historique h JOIN types_conge t ON t.libelle = h.type_conge""")
+            conn.execute("DROP TABLE conges_historique")
+            conn.execute("ALTER TABLE conges_historique_codes RENAME TO conges_historique")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_conges_historique_agent ON conges_historique(agent_id, date_debut)")
+        violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+        if violations:
+            raise RuntimeError(f"Migration 004 : {len(violations)} référence(s) invalide(s) après substitution, ex. {violations[0]}")
+        ctx.db.commit()
+    except Exception:
+        if conn.in_transaction: ctx.db.rollback()
+        raise
+    finally:
+        conn.execute("PRAGMA foreign_keys = ON")
+
+
+def upgrade(ctx):
+    conn = ctx.conn
+    ctx.db.create_reference_tables()
+    old_tables = [table for table in ("conges", "archives_resume", "conges_historique") if "type_conge" in _columns(conn, table)]
+    for table in old_tables:
+        _add_libelles(conn, table)
+    ctx.db.commit()
+    _convert_archives(ctx)
+    if "conges" in old_tables:
+        conn.execute(ctx.db.TABLE_SQL["conges"].format(table="conges_codes"))
+        _create_sync_triggers(conn)
+        ctx.db.commit()
+        ctx.backfill("conges", "conges", f"""INSERT OR REPLACE INTO conges_codes ({_COLONNES})
+                                             SELECT {_CODES.format(main='')} FROM conges c WHERE c.id BETWEEN ? AND ?""")
+    if old_tables: _swap(ctx, old_tables)
+    ctx.db.invalidate_types_cache()
@@ -40,19 +40,60 @@ class Conge:
         return f"Congé {self.type_conge} du {debut_str} au {fin_str} ({self.jours_pris} jours)"
 
     @classmethod
-    def from_db_row(cls, row):
-        """Crée une instance de Conge à partir d'une ligne de la base de données."""
+    def from_db_row(cls, row, types=None, statuts=None):
+        """
+        Crée une instance de Conge à partir d'une ligne de la base de données.
+        types et statuts traduisent les codes des colonnes type_id et statut_id en libellés.
+        """
         if not row:
             return None
         # L'ordre des colonnes doit correspondre à la requête SELECT
         return cls(
             id=row[0], 
             agent_id=row[1], 
-            type_conge=row[2], 
+            type_conge=types[row[2]] if types is not None else row[2], 
             justif=row[3], 
             interim_id=row[4], 
             date_debut=row[5], 
             date_fin=row[6], 
             jours_pris=row[7],
-            statut=row[8]
-        )
\ No newline at end of file
+            statut=statuts[row[8]] if statuts is not None else row[8]
+        )
+
+class TypeConge:
+    """Type de congé (table types_conge) et ses règles : un nouveau type ne demande qu'une ligne de plus."""
+    def __init__(self, id, libelle, jours_ouvres, decompte_solde, certificat_requis, duree_defaut=None):
+        self.id = id
+        self.libelle = libelle
+        self.jours_ouvres = bool(jours_ouvres)           # Durée en jours ouvrés (sinon calendaires)
+        self.decompte_solde = bool(decompte_solde)       # Décompté du solde de l'agent
+        self.certificat_requis = bool(certificat_requis) # Suivi des certificats médicaux
+        self.duree_defaut = duree_defaut                 # Durée proposée par le formulaire
+
+    def __str__(self):
+        return self.libelle
+
+    @classmethod
+    def from_db_row(cls, row):
+        """Crée une instance de TypeConge à partir d'une ligne de la base de données."""
+        if not row:
+            return None
+        return cls(id=row[0], libelle=row[1], jours_ouvres=row[2], decompte_solde=row[3], certificat_requis=row[4], duree_defaut=row[5])
+
+class Certificat:
+    """Représente un certificat médical rattaché à un congé de maladie."""
+    def __init__(self, id, conge_id, nom_medecin, duree_jours, chemin_fichier, sha256=None):
+        self.id = id
+        self.conge_id = conge_id
+        self.nom_medecin = nom_medecin
+        self.duree_jours = duree_jours
+        self.chemin_fichier = chemin_fichier
+        self.sha256 = sha256 # Empreinte du contenu (magasin de certificats), None pour les anciens fichiers
+
+    @classmethod
+    def from_db_row(cls, row):
+        """Crée une instance de Certificat à partir d'une ligne de la base de données."""
+        if not row:
+            return None
+        return cls(id=row[0], conge_id=row[1], nom_medecin=row[2], duree_jours=row[3], chemin_fichier=row[4],
+                   sha256=row[5] if len(row) > 5 else None)
@@ -1,10 +1,36 @@
 # main.py
+import time
+_T0 = time.perf_counter() # Référence pour --profile-startup
+
 import tkinter as tk
 from tkinter import messagebox
+import importlib.util
+import multiprocessing
+import sqlite3
 import sys
 import os
 import logging
 
+# --- Étape 0 : Profilage optionnel du démarrage ---
+PROFILE_STARTUP = "--profile-startup" in sys.argv
+_startup_phases = []
+
+def _mark(phase, start):
+    """Enregistre la durée d'une phase de démarrage et renvoie l'instant courant."""
+    now = time.perf_counter()
+    _startup_phases.append((phase, now - start))
+    return now
+
+def _print_startup_profile():
+    total = time.perf_counter() - _T0
+    label_total = "Total jusqu'au premier affichage"
+    print("--- Profil de démarrage ---")
+    for phase, duration in _startup_phases:
+        print(f"  {phase:<32}: {duration * 1000:8.1f} ms")
+    print(f"  {label_total:<32}: {total * 1000:8.1f} ms")
+
+_t = _mark("Imports de base (tkinter)", _T0)
+
 # --- Étape 1 : Définir les chemins de base ---
 # C'est la clé pour que l'application trouve ses fichiers, peu importe d'où elle est lancée.
 try:
@@ -14,7 +40,26 @@ except NameError:
 
 CONFIG_PATH = os.path.join(BASE_DIR, "config.yaml")
 
-# --- Étape 2 : Charger la configuration AVANT tout le reste ---
+# --- Étape 2 : Vérifier les dépendances externes ---
+# find_spec vérifie qu'un module est installé sans l'importer : les bibliothèques
+# lourdes (openpyxl, holidays, tkcalendar, numpy) ne sont chargées qu'au premier usage.
+# (nom du module, nom du paquet pip)
+REQUIRED_PACKAGES = [
+    ("tkcalendar", "tkcalendar"),
+    ("dateutil", "python-dateutil"),
+    ("holidays", "holidays"),
+    ("yaml", "pyyaml"),
+    ("openpyxl", "openpyxl"),
+    ("numpy", "numpy"),
+]
+missing = [pip_name for module, pip_name in REQUIRED_PACKAGES if importlib.util.find_spec(module) is None]
+if missing:
+    root = tk.Tk(); root.withdraw()
+    messagebox.showerror("Bibliothèque Manquante", f"Bibliothèque(s) nécessaire(s) manquante(s) : {', '.join(missing)}.\n\nVeuillez les installer en ouvrant un terminal et en tapant :\npip install {' '.join(missing)}")
+    sys.exit(1)
+_t = _mark("Vérification des dépendances", _t)
+
+# --- Étape 3 : Charger la configuration AVANT tout le reste ---
 # C'est crucial car tous les autres modules dépendent de CONFIG.
 try:
     from utils.config_loader import load_config, CONFIG
@@ -27,57 +72,86 @@ except ImportError:
     root = tk.Tk(); root.withdraw()
     messagebox.showerror("Erreur de Structure", "Le fichier 'utils/config_loader.py' est introuvable ou corrompu.")
     sys.exit(1)
+_t = _mark("Chargement de la configuration", _t)
 
 
-# --- Étape 3 : Importer les autres composants de l'architecture ---
+# --- Étape 4 : Importer les autres composants de l'architecture ---
 # On ne peut le faire qu'après le chargement de la configuration.
 from db.database import DatabaseManager
+from db.migrations import migrate, pending_migrations
+_t = _mark("Import db.database", _t)
 from core.conges.manager import CongeManager
+_t = _mark("Import core.conges.manager", _t)
 from ui.main_window import MainWindow
+_t = _mark("Import ui.main_window", _t)
+
+# Au-delà de cette taille de base, les migrations en attente s'exécutent dans un thread, avec une fenêtre de progression
+MIGRATION_WINDOW_MIN_BYTES = 20 * 1024 * 1024
+
+def apply_migrations(db_manager):
+    """Applique les migrations en attente : directement sur une petite base, sinon sans bloquer l'affichage (MigrationWindow)."""
+    pending = pending_migrations(db_manager.conn)
+    if not pending: return []
+    page_count, page_size = (db_manager.conn.execute(f"PRAGMA {pragma}").fetchone()[0] for pragma in ("page_count", "page_size"))
+    if page_count * page_size < MIGRATION_WINDOW_MIN_BYTES:
+        return migrate(db_manager)
+    from ui.migration_window import MigrationWindow
+    applied = MigrationWindow(db_manager.db_file, pending, CONFIG['app']['title']).run()
+    db_manager.invalidate_types_cache() # Tables de référence modifiées par une autre connexion
+    return applied
 
 
 if __name__ == "__main__":
-    # --- Étape 4 : Vérifier les dépendances externes ---
-    try:
-        import tkcalendar
-        import dateutil
-        import holidays
-        import yaml
-        import openpyxl
-    except ImportError as e:
-        root = tk.Tk(); root.withdraw()
-        messagebox.showerror("Bibliothèque Manquante", f"Une bibliothèque nécessaire est manquante : {e.name}.\n\nVeuillez l'installer en ouvrant un terminal et en tapant :\npip install {e.name}")
-        sys.exit(1)
+    # Processus de travail des fiches annuelles (ProcessPoolExecutor) dans un exécutable figé
+    multiprocessing.freeze_support()
 
     # --- Étape 5 : Préparer l'environnement ---
     CERTIFICATS_DIR_ABS = os.path.join(BASE_DIR, CONFIG['db']['certificates_dir'])
     if not os.path.exists(CERTIFICATS_DIR_ABS):
         os.makedirs(CERTIFICATS_DIR_ABS)
-        
+
     DB_PATH_ABS = os.path.join(BASE_DIR, CONFIG['db']['filename'])
-    
+
     # Configuration du logging (le fichier log sera aussi à la racine du projet)
     LOG_FILE_PATH = os.path.join(BASE_DIR, "conges.log")
     logging.basicConfig(filename=LOG_FILE_PATH, level=logging.INFO,
                         format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
 
     # --- Étape 6 : Initialiser les composants principaux dans le bon ordre ---
-    
+
     # 6.1. Créer le gestionnaire de base de données
     db_manager = DatabaseManager(DB_PATH_ABS)
-    
+
     # 6.2. Tenter la connexion à la base de données
     if not db_manager.connect():
         # Si la connexion échoue, un message d'erreur est déjà affiché. On arrête.
         sys.exit(1)
-        
-    # 6.3. S'assurer que les tables existent
+
+    # 6.3. S'assurer que les tables existent, puis appliquer les migrations en attente
     db_manager.create_db_tables()
-    
+    try:
+        apply_migrations(db_manager)
+    except (sqlite3.Error, RuntimeError) as e:
+        logging.error(f"Échec de la migration du schéma : {e}", exc_info=True)
+        root = tk.Tk(); root.withdraw()
+        messagebox.showerror("Erreur Base de Données", f"La mise à niveau de la base a échoué : {e}\n\nElle reprendra au prochain lancement (ou via migration_soldes.py).")
+        sys.exit(1)
+    _t = _mark("Connexion et schéma BD", _t)
+
     # 6.4. Créer le "cerveau" de l'application
     conge_manager = CongeManager(db_manager, CERTIFICATS_DIR_ABS)
-    
+
     # 6.5. Créer et lancer la fenêtre principale
     print(f"--- Lancement de {CONFIG['app']['title']} v{CONFIG['app']['version']} ---")
     app = MainWindow(conge_manager)
-    app.mainloop()
\ No newline at end of file
+    _t = _mark("MainWindow.__init__", _t)
+
+    if PROFILE_STARTUP:
+        def _on_first_map(event):
+            if event.widget is not app: return
+            app.unbind("<Map>")
+            _mark("Premier affichage (mainloop)", _t)
+            _print_startup_profile()
+        app.bind("<Map>", _on_first_map)
+
+    app.mainloop()
@@ -0,0 +1,63 @@
+# migration_soldes.py
+"""
+Mise à niveau d'une base existante (à lancer application fermée de préférence,
+notamment pour les grosses bases : l'application applique sinon les migrations au démarrage).
+
+    python migration_soldes.py                 # base de config.yaml
+    python migration_soldes.py autre.db --batch 20000
+    python migration_soldes.py --status
+
+Interrompue (Ctrl+C, coupure), la migration reprend à la dernière tranche validée.
+"""
+import argparse
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+from utils.config_loader import CONFIG, load_config
+load_config(os.path.join(BASE_DIR, "config.yaml"))
+
+from db.database import DatabaseManager
+from db.migrations import DEFAULT_BATCH_SIZE, LATEST_VERSION, MIGRATIONS, get_schema_version, migrate, pending_migrations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Applique les migrations de schéma en attente.")
+    parser.add_argument("db_file", nargs="?", default=os.path.join(BASE_DIR, CONFIG['db']['filename']))
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH_SIZE, help="Lignes par transaction")
+    parser.add_argument("--pause", type=float, default=0.0, help="Pause (s) entre deux tranches")
+    parser.add_argument("--status", action="store_true", help="Affiche la version du schéma sans rien modifier")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db_file):
+        print(f"Base introuvable : {args.db_file}")
+        return 1
+    db = DatabaseManager(args.db_file)
+    if not db.connect(): return 1
+    try:
+        if args.status:
+            print(f"Version du schéma : {get_schema_version(db.conn)} / {LATEST_VERSION}")
+            for module in pending_migrations(db.conn):
+                print(f"  en attente : {module.VERSION:03d} {module.DESCRIPTION}")
+            return 0
+        db.create_db_tables()
+        t0 = time.perf_counter()
+        descriptions = {module.VERSION: module.DESCRIPTION for module in MIGRATIONS}
+        applied = migrate(db, batch_size=args.batch, pause=args.pause,
+                          progress=lambda name, done, total: print(f"\r{name:<28} {done}/{total}", end="", flush=True))
+        if applied: print()
+        for version in applied:
+            print(f"  appliquée : {version:03d} {descriptions[version]}")
+        print(f"Schéma à jour (version {get_schema_version(db.conn)}) en {time.perf_counter() - t0:.1f} s.")
+        return 0
+    except KeyboardInterrupt:
+        print("\nInterrompu : relancer la commande pour reprendre.")
+        return 1
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
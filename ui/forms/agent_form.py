@@ -108,7 +108,6 @@ class AgentForm(tk.Toplevel):
             if success:
                 message = "Agent modifié avec succès." if self.is_modification else "Agent ajouté avec succès."
                 self.parent.set_status(message)
-                self.parent.refresh_all(self.agent_id) # Rafraîchir et sélectionner l'agent
                 self.destroy()
             else:
                 messagebox.showerror("Erreur", f"Le PPR '{agent_data['ppr']}' est déjà utilisé.", parent=self)
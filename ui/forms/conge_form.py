@@ -4,10 +4,7 @@ from tkinter import ttk, messagebox, filedialog
 import os
 
 # Import des composants de l'architecture
-from core.conges.strategies import (
-    CongeAnnuelStrategy, CongeMaladieStrategy, CongeMaterniteStrategy,
-    CongePaterniteStrategy, CongeCalendaireStrategy
-)
+from core.conges.strategies import strategy_for_type
 from ui.widgets.date_picker import DatePickerWindow
 from utils.date_utils import validate_date, format_date_for_display, get_holidays_set_for_period
 from utils.config_loader import CONFIG
@@ -15,15 +12,10 @@ from utils.config_loader import CONFIG
 class CongeForm(tk.Toplevel):
     """
     Fenêtre de formulaire pour ajouter ou modifier un congé.
-    Elle est pilotée par des stratégies et communique avec le manager.
+    Elle est pilotée par des stratégies (une par type de la table types_conge) et communique avec le manager.
     """
-    STRATEGIES = {
-        "Congé annuel": CongeAnnuelStrategy(),
-        "Congé exceptionnel": CongeCalendaireStrategy(),
-        "Congé de maladie": CongeMaladieStrategy(),
-        "Congé de maternité": CongeMaterniteStrategy(),
-        "Congé de paternité": CongePaterniteStrategy(),
-    }
+    INTERIM_SEARCH_LIMIT = 50  # Nombre max. d'intérimaires proposés par recherche
+    INTERIM_SEARCH_DELAY = 300  # ms d'attente après la frappe avant d'interroger la base
 
     def __init__(self, parent, manager, agent_id, conge_id=None):
         super().__init__(parent)
@@ -36,6 +28,7 @@ class CongeForm(tk.Toplevel):
         
         self.current_strategy = None
         self.original_cert_path = None
+        self.strategies = {t.libelle: strategy_for_type(t) for t in self.manager.get_types_conge()}
         
         agent_data = self.manager.get_agent_by_id(self.agent_id)
         self.agent_ppr = agent_data.ppr
@@ -48,18 +41,21 @@ class CongeForm(tk.Toplevel):
 
         self._create_variables()
         self._create_widgets()
-        self._load_interim_agents()
         
         if self.is_modification:
             self._populate_data()
         else:
-            self.type_var.set("Congé annuel") # Déclenche _on_type_change via le trace
+            self.type_var.set(next(iter(self.strategies))) # Déclenche _on_type_change via le trace
 
     def _create_variables(self):
         self.type_var = tk.StringVar()
         self.days_var = tk.StringVar(value='1')
         self.interim_var = tk.StringVar()
+        self.interim_grade_var = tk.StringVar(value="Tous")
         self.cert_path_var = tk.StringVar()
+        # Libellé affiché -> id, alimenté au fil des recherches (chargement paresseux)
+        self.interim_agents = {}
+        self._interim_search_job = None
     
     def _create_widgets(self):
         main_frame = ttk.Frame(self, padding=20)
@@ -67,29 +63,35 @@ class CongeForm(tk.Toplevel):
         form_frame = ttk.Frame(main_frame)
         form_frame.pack(fill="x")
         
-        labels = ["Type de congé:", "Date de début:", "Durée (jours):", "Date de fin:", "Justification:", "Intérimaire:"]
+        labels = ["Type de congé:", "Date de début:", "Durée (jours):", "Date de fin:", "Justification:", "Grade intérimaire:", "Intérimaire:"]
         for i, text in enumerate(labels):
             ttk.Label(form_frame, text=text).grid(row=i, column=0, sticky="w", padx=5, pady=8)
 
-        self.type_combo = ttk.Combobox(form_frame, textvariable=self.type_var, values=list(self.STRATEGIES.keys()), state="readonly", width=38)
+        self.type_combo = ttk.Combobox(form_frame, textvariable=self.type_var, values=list(self.strategies), state="readonly", width=38)
         self.type_combo.grid(row=0, column=1, sticky="ew", columnspan=2)
         
         self.start_date_entry = ttk.Entry(form_frame, width=30)
         self.start_date_entry.grid(row=1, column=1)
-        ttk.Button(form_frame, text="📅", width=2, command=lambda: DatePickerWindow(self, self.start_date_entry, self.db, self.type_var.get())).grid(row=1, column=2)
+        ttk.Button(form_frame, text="📅", width=2, command=lambda: DatePickerWindow.show(self, self.start_date_entry, self.db, self.type_var.get())).grid(row=1, column=2)
 
         self.days_spinbox = ttk.Spinbox(form_frame, from_=0, to=365, textvariable=self.days_var, width=10, command=self._update_end_date_from_days)
         self.days_spinbox.grid(row=2, column=1, sticky="w")
         
         self.end_date_entry = ttk.Entry(form_frame, width=30)
         self.end_date_entry.grid(row=3, column=1)
-        ttk.Button(form_frame, text="📅", width=2, command=lambda: DatePickerWindow(self, self.end_date_entry, self.db, self.type_var.get())).grid(row=3, column=2)
+        ttk.Button(form_frame, text="📅", width=2, command=lambda: DatePickerWindow.show(self, self.end_date_entry, self.db, self.type_var.get())).grid(row=3, column=2)
 
         self.justif_entry = ttk.Entry(form_frame, width=40)
         self.justif_entry.grid(row=4, column=1, columnspan=2, sticky="ew")
 
-        self.interim_combo = ttk.Combobox(form_frame, textvariable=self.interim_var, state="readonly", width=38)
-        self.interim_combo.grid(row=5, column=1, columnspan=2, sticky="ew")
+        self.interim_grade_combo = ttk.Combobox(form_frame, textvariable=self.interim_grade_var, values=["Tous"] + CONFIG['ui']['grades'], state="readonly", width=38)
+        self.interim_grade_combo.grid(row=5, column=1, columnspan=2, sticky="ew")
+        self.interim_grade_combo.bind("<<ComboboxSelected>>", lambda e: self._load_interim_agents())
+
+        # Combobox éditable : la saisie sert de recherche, la liste n'est chargée qu'à l'ouverture.
+        self.interim_combo = ttk.Combobox(form_frame, textvariable=self.interim_var, width=38, postcommand=self._load_interim_agents)
+        self.interim_combo.grid(row=6, column=1, columnspan=2, sticky="ew")
+        self.interim_combo.bind("<KeyRelease>", self._on_interim_search)
 
         self.cert_frame = ttk.LabelFrame(main_frame, text="Certificat Médical", padding=10)
         self.cert_file_label = ttk.Label(self.cert_frame, text="Aucun fichier attaché.", anchor="w", wraplength=350)
@@ -117,7 +119,7 @@ class CongeForm(tk.Toplevel):
     def _on_type_change(self, event=None):
         type_conge = self.type_var.get()
         if not type_conge: return
-        self.current_strategy = self.STRATEGIES[type_conge]
+        self.current_strategy = self.strategies[type_conge]
         self.current_strategy.configure_ui(self)
         
         # ================== MODIFICATION APPLIQUÉE ICI ==================
@@ -175,14 +177,42 @@ class CongeForm(tk.Toplevel):
         self.days_var.set(str(conge.jours_pris))
         
         if conge.interim_id:
-            for name, id_ in self.interim_agents.items():
-                if id_ == conge.interim_id:
-                    self.interim_var.set(name); break
+            interim = self.manager.get_agent_by_id(conge.interim_id)
+            if interim:
+                label = self._interim_label(interim)
+                self.interim_agents[label] = interim.id
+                self.interim_var.set(label)
+
+    @staticmethod
+    def _interim_label(agent):
+        return f"{agent.nom} {agent.prenom} (PPR: {agent.ppr})"
+
+    def _on_interim_search(self, event=None):
+        if event is not None and event.keysym in ("Up", "Down", "Return", "Escape", "Tab"): return
+        if self._interim_search_job: self.after_cancel(self._interim_search_job)
+        self._interim_search_job = self.after(self.INTERIM_SEARCH_DELAY, self._load_interim_agents)
 
     def _load_interim_agents(self):
-        agents = self.manager.db.get_agents(exclude_id=self.agent_id)
-        self.interim_agents = {f"{a.nom} {a.prenom} (PPR: {a.ppr})": a.id for a in agents}
-        self.interim_combo['values'] = [""] + sorted(list(self.interim_agents.keys()))
+        """Propose uniquement les agents libres sur la période saisie (filtrés par grade et par la recherche)."""
+        self._interim_search_job = None
+        start_date = validate_date(self.start_date_entry.get())
+        end_date = validate_date(self.end_date_entry.get())
+        if not start_date or not end_date or end_date < start_date:
+            self.interim_combo['values'] = [""]
+            return
+        text = self.interim_var.get().strip()
+        term = None if not text or text in self.interim_agents else text
+        grade = self.interim_grade_var.get()
+        agents = self.manager.get_agents_disponibles(
+            start_date, end_date, exclude_id=self.agent_id, grade=None if grade == "Tous" else grade,
+            term=term, limit=self.INTERIM_SEARCH_LIMIT, conge_id_exclu=self.conge_id
+        )
+        labels = []
+        for a in agents:
+            label = self._interim_label(a)
+            self.interim_agents[label] = a.id
+            labels.append(label)
+        self.interim_combo['values'] = [""] + labels
 
     def _attach_certificate(self):
         # La configuration des types de fichiers est maintenant lue depuis config.yaml
@@ -199,6 +229,9 @@ class CongeForm(tk.Toplevel):
     
     def _on_validate(self):
         try:
+            interim_label = self.interim_var.get().strip()
+            if interim_label and interim_label not in self.interim_agents:
+                raise ValueError("Veuillez choisir l'intérimaire dans la liste proposée.")
             form_data = {
                 'agent_id': self.agent_id,
                 'agent_ppr': self.agent_ppr,
@@ -208,7 +241,7 @@ class CongeForm(tk.Toplevel):
                 'date_fin': self.end_date_entry.get(),
                 'jours_pris': int(self.days_var.get()),
                 'justif': self.justif_entry.get().strip(),
-                'interim_id': self.interim_agents.get(self.interim_var.get()),
+                'interim_id': self.interim_agents.get(interim_label),
                 'cert_path': self.cert_path_var.get(),
                 'original_cert_path': self.original_cert_path,
             }
@@ -218,7 +251,6 @@ class CongeForm(tk.Toplevel):
             if success:
                 message = "Congé modifié avec succès." if self.is_modification else "Congé ajouté avec succès."
                 self.parent.set_status(message)
-                self.parent.refresh_all(self.agent_id)
                 self.destroy()
         except Exception as e:
             messagebox.showerror("Erreur de Validation", str(e), parent=self)
\ No newline at end of file
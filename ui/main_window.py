@@ -1,24 +1,33 @@
 # Fichier : ui/main_window.py (Version finale avec le tri et le format de date corrigés)
 
 import tkinter as tk
-from tkinter import ttk, messagebox
-from collections import defaultdict, Counter
+from tkinter import ttk, messagebox, simpledialog
 from dateutil import parser
 import logging
 import os
 import sqlite3
+import time
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime
 
 # Import des composants de votre architecture
 from core.conges.manager import CongeManager
+from core.events import AgentAdded, AgentUpdated, AgentDeleted, CongeAdded, CongeUpdated, CongeDeleted, HolidaysChanged, HistoriqueCompacte, JoursPrisRecalcules
+from db.backup import BackupScheduler
+from db.database import DatabaseManager
+from db.maintenance import MaintenanceManager
 from db.models import Agent, Conge
 from ui.forms.agent_form import AgentForm
 from ui.forms.conge_form import CongeForm
-from ui.widgets.secondary_windows import HolidaysManagerWindow, JustificatifsWindow 
+from ui.widgets.secondary_windows import DoublonsWindow, HolidaysManagerWindow, JustificatifsWindow, PrevisionSoldesWindow, StallReportWindow
+from ui.watchdog import MainLoopWatchdog
 from ui.widgets.arabic_keyboard import ArabicKeyboard
 from ui.widgets.date_picker import DatePickerWindow
 from utils.file_utils import export_agents_to_excel, export_all_conges_to_excel, import_agents_from_excel
-from utils.date_utils import format_date_for_display
+from utils.date_utils import format_date_for_display, invalidate_holidays_cache
 from utils.config_loader import CONFIG
+from utils.background import BackgroundTask
 
 # --- MODIFICATION N°1 : Ajout d'une fonction de formatage courte ---
 def format_date_for_display_short(date_obj):
@@ -51,9 +60,13 @@ def treeview_sort_column(tv, col, reverse):
 
 
 class MainWindow(tk.Tk):
+    MAINTENANCE_TICK_MS = 60000 # Vérification de l'inactivité pour l'entretien de la base
+    STATS_DEBOUNCE_MS = 800 # Statistiques recalculées une fois, après une série d'écritures
+
     def __init__(self, manager: CongeManager):
         super().__init__()
         self.manager = manager
+        self.manager.set_ui(self)
         self.db = self.manager.db
 
         self.title(f"{CONFIG['app']['title']} - v{CONFIG['app']['version']}")
@@ -63,15 +76,98 @@ class MainWindow(tk.Tk):
         self.current_page = 1
         self.items_per_page = 50
         self.total_pages = 1
+        # Congés déjà chargés, par agent puis par (filtre, année) ; vidé quand les données de l'agent changent
+        self._conges_cache = {}
+        self._displayed_agent_id = None
+        self._pending_updates = set()
+        self._stats_task = None
+        self._stats_dirty = False
+        self._stats_after = None
+        self._statements_task = None
+        
+        self.watchdog = None
+        watchdog_conf = CONFIG['ui'].get('watchdog') or {}
+        if watchdog_conf.get('enabled', False):
+            self.watchdog = MainLoopWatchdog(self, watchdog_conf.get('threshold_ms', 500), watchdog_conf.get('interval_ms', 100))
+            self.watchdog.start()
         
+        self.backup_scheduler = BackupScheduler.from_config(self.db.db_file)
+        if self.backup_scheduler: self.backup_scheduler.start()
+        # Entretien de la base : en fond après une période d'inactivité, et brièvement à la fermeture
+        self.maintenance_conf = CONFIG['db'].get('maintenance') or {}
+        self.maintenance = MaintenanceManager(self.db.db_file) if self.maintenance_conf.get('enabled', False) else None
+        self._maintenance_task = None
+        self._last_activity = time.monotonic()
+        if self.maintenance:
+            for sequence in ("<Any-KeyPress>", "<Any-ButtonPress>"):
+                self.bind_all(sequence, self._note_activity, add="+")
+            self.after(self.MAINTENANCE_TICK_MS, self._maintenance_tick)
+
         self.create_widgets()
-        self.refresh_all()
+        self._subscribe_events()
+        # La fenêtre s'affiche d'abord ; les agents, les statistiques et le sélecteur
+        # de date sont chargés juste après le premier affichage.
+        self.set_status("Chargement...")
+        self.after_idle(lambda: self.after(20, self._deferred_init))
+
+    def _deferred_init(self):
+        with self.ui_action("Chargement initial"):
+            self.refresh_all()
+        self.after_idle(lambda: DatePickerWindow.prewarm(self, self.db))
+
+    def ui_action(self, name):
+        """Contexte nommant l'action en cours pour le watchdog (sans effet s'il est désactivé)."""
+        return self.watchdog.action(name) if self.watchdog else nullcontext()
 
     def on_close(self):
         if messagebox.askokcancel("Quitter", "Voulez-vous vraiment quitter ?"):
+            if self.watchdog: self.watchdog.stop()
+            if self.backup_scheduler: self.backup_scheduler.stop()
+            if self.maintenance and not (self._maintenance_task and self._maintenance_task.is_alive()):
+                # Fenêtre masquée d'abord : l'entretien écourté (close_budget_seconds) ne la fige pas à l'écran
+                self.withdraw()
+                try:
+                    if self.maintenance.is_due(self.maintenance_conf.get('interval_hours', 24)):
+                        self.maintenance.run(self.maintenance_conf.get('close_budget_seconds', 2))
+                except sqlite3.Error as e: logging.error(f"Maintenance à la fermeture impossible : {e}")
             self.db.close()
             self.destroy()
 
+    # --- Entretien de la base ---
+    def _note_activity(self, event=None):
+        self._last_activity = time.monotonic()
+
+    def _maintenance_tick(self):
+        # La dernière exécution est lue dans la base : un entretien jamais fait (ou d'une session précédente) est dû
+        idle = time.monotonic() - self._last_activity >= self.maintenance_conf.get('idle_minutes', 10) * 60
+        busy = (self._maintenance_task and self._maintenance_task.is_alive()) or (self.backup_scheduler and self.backup_scheduler.running)
+        try:
+            due = idle and not busy and self.maintenance.is_due(self.maintenance_conf.get('interval_hours', 24))
+        except sqlite3.Error as e:
+            logging.error(f"Lecture de la date du dernier entretien impossible : {e}"); due = False
+        if due:
+            self._maintenance_task = BackgroundTask(self, self._maintenance_job, self.maintenance_conf.get('budget_seconds', 10),
+                                                    on_done=self._on_maintenance_done,
+                                                    on_error=lambda e: logging.error(f"Échec de la maintenance de la base : {e}")).start()
+        self.after(self.MAINTENANCE_TICK_MS, self._maintenance_tick)
+
+    def _maintenance_job(self, budget_seconds):
+        """Thread de fond : compactage de l'historique puis entretien, chacun sur sa propre connexion."""
+        db = DatabaseManager(self.db.db_file)
+        compactages = []
+        db.events.subscribe(HistoriqueCompacte, compactages.append) # Republiés sur le bus de l'interface (on_done)
+        try:
+            if db.connect(): self.manager.compacter_historique(db=db)
+        except sqlite3.Error as e:
+            logging.error(f"Échec du compactage de l'historique : {e}")
+        finally:
+            db.close()
+        self.maintenance.run(budget_seconds)
+        return compactages
+
+    def _on_maintenance_done(self, compactages):
+        for event in compactages: self.db.events.publish(event)
+
     def set_status(self, message):
         self.status_var.set(message)
         self.update_idletasks()
@@ -114,11 +210,12 @@ class MainWindow(tk.Tk):
         io_frame_agents = ttk.Frame(agents_frame); io_frame_agents.pack(fill=tk.X, padx=5, pady=(5, 5))
         ttk.Button(io_frame_agents, text="Importer Agents (Excel)", command=self.import_agents).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
         ttk.Button(io_frame_agents, text="Exporter Agents (Excel)", command=self.export_agents).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
+        ttk.Button(io_frame_agents, text="Doublons", command=self.open_doublons).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
 
         right_pane = ttk.PanedWindow(main_pane, orient=tk.VERTICAL); main_pane.add(right_pane, weight=3)
         conges_frame = ttk.LabelFrame(right_pane, text="Congés de l'agent sélectionné"); right_pane.add(conges_frame, weight=3)
         filter_frame = ttk.Frame(conges_frame); filter_frame.pack(fill=tk.X, padx=5, pady=5); ttk.Label(filter_frame, text="Filtrer par type:").pack(side=tk.LEFT, padx=(0, 5))
-        self.conge_filter_var = tk.StringVar(value="Tous"); conge_filter_combo = ttk.Combobox(filter_frame, textvariable=self.conge_filter_var, values=["Tous"] + CONFIG['ui']['types_conge'], state="readonly"); conge_filter_combo.pack(side=tk.LEFT, fill=tk.X, expand=True); conge_filter_combo.bind("<<ComboboxSelected>>", self.on_agent_select)
+        self.conge_filter_var = tk.StringVar(value="Tous"); conge_filter_combo = ttk.Combobox(filter_frame, textvariable=self.conge_filter_var, values=["Tous"] + [t.libelle for t in self.manager.get_types_conge()], state="readonly"); conge_filter_combo.pack(side=tk.LEFT, fill=tk.X, expand=True); conge_filter_combo.bind("<<ComboboxSelected>>", lambda e: self.on_agent_select(force=True))
         
         cols_conges = ("CongeID", "Certificat", "Type", "Début", "Fin", "Jours", "Justification", "Intérimaire");
         self.list_conges = ttk.Treeview(conges_frame, columns=cols_conges, show="headings", selectmode="browse")
@@ -127,7 +224,9 @@ class MainWindow(tk.Tk):
         self.list_conges.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         self.list_conges.tag_configure("summary", background="#e6f2ff", font=("Helvetica", 10, "bold"))
         self.list_conges.tag_configure("annule", foreground="grey", font=('Helvetica', 10, 'overstrike'))
+        self.list_conges.tag_configure("archive", foreground="#555555", background="#f4f4f4")
         self.list_conges.bind("<Double-1>", lambda e: self.on_conge_double_click())
+        self.list_conges.bind("<<TreeviewOpen>>", self.on_year_open)
         
         btn_frame_conges = ttk.Frame(conges_frame); btn_frame_conges.pack(fill=tk.X, padx=5, pady=(0, 5));
         ttk.Button(btn_frame_conges, text="Ajouter", command=self.add_conge_ui).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
@@ -144,6 +243,11 @@ class MainWindow(tk.Tk):
         ttk.Button(global_actions_frame, text="Suivi Justificatifs", command=self.open_justificatifs_suivi).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
         ttk.Button(global_actions_frame, text="Gérer les Jours Fériés", command=self.open_holidays_manager).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
         ttk.Button(global_actions_frame, text="Exporter Tous les Congés", command=self.export_conges).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
+        ttk.Button(global_actions_frame, text="Archiver une année", command=self.archive_year_ui).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
+        ttk.Button(global_actions_frame, text="Prévision des soldes", command=self.open_prevision_soldes).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
+        ttk.Button(global_actions_frame, text="Fiches annuelles", command=self.generate_statements_ui).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
+        if self.watchdog:
+            ttk.Button(global_actions_frame, text="Diagnostic", command=self.open_stall_report).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
         
         self.status_var = tk.StringVar(value="Prêt."); status_bar = ttk.Label(self, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W); status_bar.pack(side=tk.BOTTOM, fill=tk.X)
 
@@ -156,7 +260,7 @@ class MainWindow(tk.Tk):
         if not selection: return None
         item = self.list_conges.item(selection[0])
         
-        if "summary" in item["tags"]:
+        if "summary" in item["tags"] or "chargement" in item["tags"] or "compacte" in item["tags"]:
             return None
             
         return int(item["values"][0]) if item["values"] else None
@@ -171,29 +275,223 @@ class MainWindow(tk.Tk):
         if not agent_id: messagebox.showwarning("Aucune sélection", "Veuillez sélectionner un agent à supprimer."); return
         agent = self.manager.get_agent_by_id(agent_id)
         if agent and self.manager.delete_agent_with_confirmation(agent.id, f"{agent.nom} {agent.prenom}"):
-            self.set_status(f"Agent '{agent.nom} {agent.prenom}' supprimé."); self.refresh_all()
+            self.set_status(f"Agent '{agent.nom} {agent.prenom}' supprimé.")
     def add_conge_ui(self):
         agent_id = self.get_selected_agent_id()
         if agent_id: CongeForm(self, self.manager, agent_id)
         else: messagebox.showwarning("Aucun agent", "Veuillez sélectionner un agent.")
+    def _warn_if_archived(self):
+        selection = self.list_conges.selection()
+        if selection and "archive" in self.list_conges.item(selection[0], "tags"):
+            messagebox.showinfo("Congé archivé", "Ce congé appartient à une année archivée : il peut être consulté mais plus modifié.", parent=self)
+            return True
+        return False
     def modify_selected_conge(self):
+        if self._warn_if_archived(): return
         agent_id = self.get_selected_agent_id(); conge_id = self.get_selected_conge_id()
         if agent_id and conge_id: CongeForm(self, self.manager, agent_id, conge_id=conge_id)
         else: messagebox.showwarning("Aucune sélection", "Veuillez sélectionner un congé à modifier.")
     def delete_selected_conge(self):
+        if self._warn_if_archived(): return
         conge_id = self.get_selected_conge_id(); agent_id = self.get_selected_agent_id()
         if conge_id and self.manager.delete_conge_with_confirmation(conge_id):
-            self.set_status("Congé supprimé."); self.refresh_all(agent_id)
+            self.set_status("Congé supprimé.")
         elif not conge_id: messagebox.showwarning("Aucune sélection", "Veuillez sélectionner un congé à supprimer.")
-    def export_agents(self): export_agents_to_excel(self, self.db)
-    def export_conges(self): export_all_conges_to_excel(self, self.db)
+    def export_agents(self):
+        with self.ui_action("Export des agents"): export_agents_to_excel(self, self.db)
+    def export_conges(self):
+        with self.ui_action("Export de tous les congés"): export_all_conges_to_excel(self, self.db)
     def import_agents(self): 
-        import_agents_from_excel(self, self.db)
+        with self.ui_action("Import des agents"): import_agents_from_excel(self, self.db)
+    def archive_year_ui(self):
+        years = self.db.get_archivable_years()
+        if not years:
+            messagebox.showinfo("Archivage", "Aucune année clôturée à archiver.", parent=self); return
+        year = simpledialog.askinteger("Archivage", f"Année clôturée à archiver ({years[0]} à {years[-1]}) :", parent=self,
+                                       initialvalue=years[0], minvalue=years[0], maxvalue=years[-1])
+        if year is None or year not in years: return
+        if not messagebox.askyesno("Archivage", f"Déplacer tous les congés de {year} dans une archive ?\n\n"
+                                   "Ils resteront consultables et exportables, mais ne pourront plus être modifiés.", parent=self): return
+        self.config(cursor="watch"); self.update_idletasks()
+        try:
+            with self.ui_action(f"Archivage de {year}"): nb = self.db.archive_year(year)
+        except (ValueError, sqlite3.Error, OSError) as e:
+            messagebox.showerror("Archivage", f"Archivage de {year} impossible :\n{e}", parent=self)
+        else:
+            self.refresh_all()
+            messagebox.showinfo("Archivage", f"{nb} congé(s) de {year} archivé(s).", parent=self)
+        finally:
+            self.config(cursor="")
+
+    def generate_statements_ui(self):
+        """Fiches de congés annuelles de tous les agents, écrites en fond (seules les fiches modifiées sont refaites)."""
+        if self._statements_task is not None and self._statements_task.is_alive():
+            messagebox.showinfo("Fiches annuelles", "Une génération est déjà en cours.", parent=self); return
+        year = simpledialog.askinteger("Fiches annuelles", "Année des fiches :", parent=self, initialvalue=datetime.now().year, minvalue=1900, maxvalue=2100)
+        if year is None: return
+        from core.conges.fiches import StatementGenerator # multiprocessing n'est chargé qu'au premier usage
+        generator = StatementGenerator.from_config(self.db)
+        self.set_status(f"Fiches {year} : lecture des données...")
+        self._statements_task = BackgroundTask(self, generator.generate, year,
+                                               on_progress=lambda done, total: self.set_status(f"Fiches {year} : {done}/{total} classeur(s) écrit(s)..."),
+                                               on_done=lambda report: self._show_statements_report(generator, report),
+                                               on_error=self._show_statements_error).start()
+
+    def _show_statements_report(self, generator, report):
+        self.set_status("Prêt.")
+        message = (f"{report['generes']} classeur(s) écrit(s), {report['inchanges']} inchangé(s), {report['supprimes']} supprimé(s)\n"
+                   f"en {report['duree_s']} s ({report['classeurs_par_s']} classeurs/s, {report['processus']} processus).\n\n"
+                   f"Dossier : {generator.year_dir(report['annee'])}")
+        if report['erreurs']:
+            messagebox.showwarning("Fiches annuelles", message + f"\n\n{len(report['erreurs'])} erreur(s), dont :\n" + "\n".join(report['erreurs'][:5]), parent=self)
+        else:
+            messagebox.showinfo("Fiches annuelles", message, parent=self)
+
+    def _show_statements_error(self, error):
+        self.set_status("Prêt.")
+        messagebox.showerror("Fiches annuelles", f"Génération des fiches impossible :\n{error}", parent=self)
     def open_holidays_manager(self): HolidaysManagerWindow(self, self.db)
-    def open_justificatifs_suivi(self): JustificatifsWindow(self, self.db)
+    def open_justificatifs_suivi(self): JustificatifsWindow(self, self.db, self.manager.certificats)
+    def open_stall_report(self): StallReportWindow(self, self.watchdog)
+    def open_prevision_soldes(self): PrevisionSoldesWindow(self, self.manager)
+    def open_doublons(self): DoublonsWindow(self, self.db)
+
+    # --- Mises à jour ciblées à partir des événements du DatabaseManager ---
+    def _subscribe_events(self):
+        bus = self.db.events
+        bus.subscribe(AgentAdded, self._on_agent_added)
+        bus.subscribe(AgentUpdated, self._on_agent_updated)
+        bus.subscribe(AgentDeleted, self._on_agent_deleted)
+        for event_type in (CongeAdded, CongeUpdated, CongeDeleted):
+            bus.subscribe(event_type, self._on_conge_changed)
+        bus.subscribe(HolidaysChanged, self._on_holidays_changed)
+        bus.subscribe(JoursPrisRecalcules, self._on_jours_pris_recalcules)
+        bus.subscribe(HistoriqueCompacte, self._on_historique_compacte)
+
+    def _schedule(self, key, callback):
+        """Regroupe les mises à jour : un seul appel par clé, au prochain passage au repos de la boucle Tk."""
+        if key in self._pending_updates: return
+        self._pending_updates.add(key)
+        def run():
+            self._pending_updates.discard(key)
+            callback()
+        self.after_idle(run)
+
+    def _schedule_stats(self):
+        """Relance le délai : les statistiques ne sont recalculées qu'après STATS_DEBOUNCE_MS sans nouvelle écriture."""
+        if self._stats_after: self.after_cancel(self._stats_after)
+        self._stats_after = self.after(self.STATS_DEBOUNCE_MS, self._debounced_stats)
+
+    def _debounced_stats(self):
+        self._stats_after = None
+        self.refresh_stats()
+
+    def _on_agent_added(self, event):
+        self._schedule("agents", lambda: self.refresh_agents_list(self.get_selected_agent_id()))
+        self._schedule_stats()
+
+    def _on_agent_updated(self, event):
+        self._schedule(("agent", event.agent_id), lambda: self._update_agent_row(event.agent_id))
+
+    def _on_agent_deleted(self, event):
+        self.invalidate_conges_cache(event.agent_id)
+        iid = str(event.agent_id)
+        if self.list_agents.exists(iid):
+            if self._displayed_agent_id == event.agent_id:
+                self._displayed_agent_id = None
+                self.list_conges.delete(*self.list_conges.get_children())
+            self.list_agents.delete(iid)
+        self._schedule_stats()
+
+    def _on_conge_changed(self, event):
+        # Le solde de l'agent a pu changer ; seuls le total de l'année et la ligne du congé sont mis à jour
+        if event.agent_id != self._displayed_agent_id: self.invalidate_conges_cache(event.agent_id)
+        self._schedule(("agent", event.agent_id), lambda: self._update_agent_row(event.agent_id))
+        self._schedule(("annee", event.agent_id, event.annee), lambda: self._refresh_year(event.agent_id, event.annee))
+        self._schedule(("conge", event.conge_id), lambda: self._refresh_conge_row(event.agent_id, event.annee, event.conge_id))
+        self._schedule_stats()
+
+    def _on_holidays_changed(self, event):
+        invalidate_holidays_cache({d[:4] for d in event.dates} if event.dates else None)
+        DatePickerWindow.invalidate_holidays()
+
+    def _on_historique_compacte(self, event):
+        for agent_id in event.agents: self.invalidate_conges_cache(agent_id)
+        if self._displayed_agent_id in event.agents:
+            self._schedule(("conges", self._displayed_agent_id), lambda: self.on_agent_select(force=True))
+
+    def _on_jours_pris_recalcules(self, event):
+        nb_conges = sum(nb for _, nb, _ in event.agents)
+        self.set_status(f"Jours fériés modifiés : {nb_conges} congé(s) en jours ouvrés recalculé(s) pour {len(event.agents)} agent(s).")
+        if event.ignores:
+            motifs = Counter(motif for _, _, motif in event.ignores)
+            detail = "\n".join(f"  - {motif} : {nb}" for motif, nb in motifs.items())
+            messagebox.showwarning("Jours fériés modifiés", f"{len(event.ignores)} congé(s) n'ont pas été recalculés :\n{detail}\n\n"
+                                   "Leur durée et le solde des agents sont inchangés ; le détail figure dans conges.log.", parent=self)
+
+    def _update_agent_row(self, agent_id):
+        iid = str(agent_id)
+        if not self.list_agents.exists(iid): return
+        agent = self.manager.get_agent_by_id(agent_id)
+        if agent: self.list_agents.item(iid, values=self._agent_values(agent))
+
+    def _refresh_year(self, agent_id, annee):
+        """Met à jour le total du seul nœud de l'année concernée (ou le crée, ou le retire) ; ses lignes suivent une à une."""
+        if self._displayed_agent_id != agent_id: return
+        filtre = self.conge_filter_var.get()
+        summaries = {a: total for a, _, total in self.manager.get_conges_annees(agent_id, None if filtre == "Tous" else filtre)}
+        summary_id = f"annee_{annee}"
+        if annee not in summaries:
+            if self.list_conges.exists(summary_id): self.list_conges.delete(summary_id)
+            self._conges_cache.get(agent_id, {}).pop((filtre, annee), None)
+        elif self.list_conges.exists(summary_id):
+            self.list_conges.item(summary_id, values=self._year_values(annee, summaries[annee]))
+        else:
+            index = sum(1 for iid in self.list_conges.get_children() if int(iid.split("_")[1]) > annee)
+            self._insert_year_node(annee, summaries[annee], index)
+
+    def _refresh_conge_row(self, agent_id, annee, conge_id):
+        """
+        Met à jour, insère ou retire la seule ligne du congé (iid conge_<id>) dans l'année déjà chargée, ainsi que
+        l'entrée correspondante du cache des congés. Une année pas encore dépliée sera lue à son ouverture.
+        """
+        if self._displayed_agent_id != agent_id: return
+        filtre = self.conge_filter_var.get()
+        agent_cache = self._conges_cache.get(agent_id, {})
+        for key in [key for key in agent_cache if key[1] == annee and key[0] != filtre]: del agent_cache[key]
+        summary_id, iid = f"annee_{annee}", f"conge_{conge_id}"
+        if not self.list_conges.exists(summary_id):
+            agent_cache.pop((filtre, annee), None); return
+        children = self.list_conges.get_children(summary_id)
+        if children and "chargement" in self.list_conges.item(children[0], "tags"):
+            agent_cache.pop((filtre, annee), None); return
+        rows = agent_cache.get((filtre, annee))
+        if rows is None:
+            # Année affichée sans cache (vidé entre-temps) : relue en entier
+            self.list_conges.delete(*children)
+            self.list_conges.insert(summary_id, "end", values=("", "", "Chargement..."), tags=("chargement",))
+            self._load_year_conges(agent_id, annee, summary_id)
+            return
+
+        conge = self.manager.get_conge_by_id(conge_id)
+        if conge and (conge.agent_id != agent_id or conge.date_debut.year != annee or filtre not in ("Tous", conge.type_conge)):
+            conge = None
+        rows[:] = [row for row in rows if row[0].id != conge_id]
+        if conge is None:
+            if self.list_conges.exists(iid): self.list_conges.delete(iid)
+            return
+        type_conge = self.db.get_type_conge(conge.type_conge)
+        a_certificat = bool(type_conge and type_conge.certificat_requis and self.db.get_certificat_for_conge(conge_id))
+        index = sum(1 for c, _ in rows if c.date_debut <= conge.date_debut)
+        rows.insert(index, (conge, a_certificat))
+        values, tags = self._conge_row(conge, a_certificat, self.db.get_agents_by_ids([conge.interim_id]), annee)
+        if self.list_conges.exists(iid): self.list_conges.item(iid, values=values, tags=tags)
+        else: self.list_conges.insert(summary_id, index, iid=iid, values=values, tags=tags)
 
     def refresh_all(self, agent_to_select_id=None):
         current_selection = agent_to_select_id or self.get_selected_agent_id()
+        self.invalidate_conges_cache()
+        self._displayed_agent_id = None
         self.refresh_agents_list(current_selection)
         self.refresh_stats()
 
@@ -208,7 +506,7 @@ class MainWindow(tk.Tk):
 
         selected_item_id = None
         for agent in agents:
-            item_id = self.list_agents.insert("", "end", values=(agent.id, agent.nom, agent.prenom, agent.ppr, agent.grade, f"{agent.solde:.1f}"))
+            item_id = self.list_agents.insert("", "end", iid=str(agent.id), values=self._agent_values(agent))
             if agent.id == agent_to_select_id:
                 selected_item_id = item_id
 
@@ -222,67 +520,119 @@ class MainWindow(tk.Tk):
         self.next_button.config(state="normal" if self.current_page < self.total_pages else "disabled")
         self.set_status(f"{len(agents)} agents affichés sur {total_items} au total.")
 
+    @staticmethod
+    def _agent_values(agent):
+        return (agent.id, agent.nom, agent.prenom, agent.ppr, agent.grade, f"{agent.solde:.1f}")
+
+    @staticmethod
+    def _year_values(annee, total_jours):
+        return ("", "", f"📅 ANNÉE {annee}", "", "", total_jours, f"{total_jours} jours pris")
+
+    def _insert_year_node(self, annee, total_jours, index="end"):
+        summary_id = self.list_conges.insert("", index, iid=f"annee_{annee}", values=self._year_values(annee, total_jours), tags=("summary",))
+        # Ligne factice pour que l'année soit dépliable avant d'avoir chargé ses congés
+        self.list_conges.insert(summary_id, "end", values=("", "", "Chargement..."), tags=("chargement",))
+        return summary_id
+
+    def invalidate_conges_cache(self, agent_id=None):
+        if agent_id is None: self._conges_cache.clear()
+        else: self._conges_cache.pop(agent_id, None)
+
     def refresh_conges_list(self, agent_id):
+        """Affiche uniquement les lignes de résumé annuel ; les congés d'une année sont chargés à son ouverture."""
         self.list_conges.delete(*self.list_conges.get_children())
         filtre = self.conge_filter_var.get()
-        conges_data = self.manager.get_conges_for_agent(agent_id)
-        
-        conges_par_annee = defaultdict(list)
-        for c in conges_data:
-            if filtre != "Tous" and c.type_conge != filtre: continue
-            try:
-                conges_par_annee[c.date_debut.year].append(c)
-            except AttributeError:
-                logging.warning(f"Date invalide ou nulle pour congé ID {c.id}")
-        
-        for annee in sorted(conges_par_annee.keys(), reverse=True):
-            total_jours = sum(c.jours_pris for c in conges_par_annee[annee] if c.type_conge == 'Congé annuel' and c.statut == 'Actif')
-            summary_id = self.list_conges.insert("", "end", values=("", "", f"📅 ANNÉE {annee}", "", "", total_jours, f"{total_jours} jours pris"), tags=("summary",), open=True)
-            
-            # --- MODIFICATION N°2 : Tri des congés par date de début ---
-            # On parcourt les congés de l'année triés par date
-            for conge in sorted(conges_par_annee[annee], key=lambda c: c.date_debut):
-                cert_status = ""
-                if conge.type_conge == 'Congé de maladie':
-                    cert = self.db.get_certificat_for_conge(conge.id)
-                    cert_status = "✅ Justifié" if cert else "❌ Manquant"
-                
-                interim_info = ""
-                if conge.interim_id:
-                    interim = self.manager.get_agent_by_id(conge.interim_id)
-                    interim_info = f"{interim.nom} {interim.prenom}" if interim else "Agent Supprimé"
-                
-                tags_a_appliquer = ('annule',) if conge.statut == 'Annulé' else ()
-                
-                # --- MODIFICATION N°1 (suite) : Utilisation de la nouvelle fonction ---
-                self.list_conges.insert(summary_id, "end", values=(
-                    conge.id, cert_status, conge.type_conge, 
-                    format_date_for_display_short(conge.date_debut), 
-                    format_date_for_display_short(conge.date_fin), 
-                    conge.jours_pris, conge.justif or "", interim_info
-                ), tags=tags_a_appliquer)
+        type_filtre = None if filtre == "Tous" else filtre
+
+        for i, (annee, nb_conges, total_jours) in enumerate(self.manager.get_conges_annees(agent_id, type_filtre)):
+            summary_id = self._insert_year_node(annee, total_jours)
+            if i == 0:
+                self._load_year_conges(agent_id, annee, summary_id)
+                self.list_conges.item(summary_id, open=True)
+
+    def on_year_open(self, event=None):
+        summary_id = self.list_conges.focus()
+        agent_id = self.get_selected_agent_id()
+        if not agent_id or not summary_id or "summary" not in self.list_conges.item(summary_id, "tags"): return
+        with self.ui_action(f"Ouverture de l'{summary_id.replace('_', ' ')}"):
+            self._load_year_conges(agent_id, int(summary_id.split("_")[1]), summary_id)
+
+    def _load_year_conges(self, agent_id, annee, summary_id):
+        children = self.list_conges.get_children(summary_id)
+        if not (len(children) == 1 and "chargement" in self.list_conges.item(children[0], "tags")): return
+        self.list_conges.delete(children[0])
+
+        filtre = self.conge_filter_var.get()
+        type_filtre = None if filtre == "Tous" else filtre
+        agent_cache = self._conges_cache.setdefault(agent_id, {})
+        rows = agent_cache.get((filtre, annee))
+        if rows is None:
+            rows = agent_cache[(filtre, annee)] = self.manager.get_conges_for_year(agent_id, annee, type_filtre)
+
+        interims = self.db.get_agents_by_ids({conge.interim_id for conge, _ in rows if conge.interim_id})
+        for conge, a_certificat in rows:
+            values, tags = self._conge_row(conge, a_certificat, interims, annee)
+            self.list_conges.insert(summary_id, "end", iid=f"conge_{conge.id}", values=values, tags=tags)
+        # Chaînes de division compactées : en fin d'année, en lecture seule (ni modification ni restauration)
+        for historique_id, conge in self.manager.get_historique_compacte(agent_id, annee, type_filtre):
+            values, tags = self._conge_row(conge, False, {}, annee)
+            self.list_conges.insert(summary_id, "end", iid=f"historique_{historique_id}", values=values, tags=tags + ("compacte",))
+
+    def _conge_row(self, conge, a_certificat, interims, annee):
+        """Valeurs et tags de la ligne d'un congé dans l'arbre des congés."""
+        cert_status = ""
+        type_conge = self.db.get_type_conge(conge.type_conge)
+        if type_conge and type_conge.certificat_requis:
+            cert_status = "✅ Justifié" if a_certificat else "❌ Manquant"
+
+        interim_info = ""
+        if conge.interim_id:
+            interim = interims.get(conge.interim_id)
+            interim_info = f"{interim.nom} {interim.prenom}" if interim else "Agent Supprimé"
+
+        tags = (('annule',) if conge.statut in ('Annulé', self.db.STATUT_COMPACTE) else ()) + (('archive',) if self.db.is_year_archived(annee) else ())
+        values = (conge.id or "", cert_status, conge.type_conge,
+                  format_date_for_display_short(conge.date_debut),
+                  format_date_for_display_short(conge.date_fin),
+                  conge.jours_pris, conge.justif or "", interim_info)
+        return values, tags
 
     def refresh_stats(self):
+        """Calcule les statistiques dans un thread de fond (connexion de lecture dédiée) puis les affiche."""
+        if self._stats_task is not None and self._stats_task.is_alive():
+            self._stats_dirty = True # Un nouveau calcul sera lancé à la fin du calcul en cours
+            return
+        self._stats_dirty = False
+        self._stats_task = BackgroundTask(self, self._load_stats, self.db.change_token(), on_done=self._show_stats, on_error=self._show_stats_error).start()
+
+    def _load_stats(self, token=None):
+        conn = self.db.open_reader_connection()
+        try:
+            return self.db.get_conges_stats(conn, token)
+        finally:
+            conn.close()
+
+    def _show_stats(self, stats):
+        nb_agents, par_type = stats
+        total_conges = sum(count for _, count, _ in par_type)
+        total_jours_pris = sum(jours for _, _, jours in par_type)
         self.text_stats.config(state=tk.NORMAL)
         self.text_stats.delete("1.0", tk.END)
-        try:
-            all_conges = self.manager.db.get_conges()
-            nb_agents = self.manager.db.get_agents_count()
+        label_agents = "Nombre total d'agents"
+        self.text_stats.insert(tk.END, f"{label_agents:<25}: {nb_agents}\n")
+        self.text_stats.insert(tk.END, f"{'Total des jours de congés actifs':<25}: {total_jours_pris}\n\n")
+        self.text_stats.insert(tk.END, "Répartition par type de congé (actifs):\n")
+        for type_conge, count, _ in par_type:
+            self.text_stats.insert(tk.END, f"  - {type_conge:<22}: {count} ({(count / total_conges) * 100:.1f}%)\n")
+        self.text_stats.config(state=tk.DISABLED)
+        if self._stats_dirty: self.refresh_stats()
 
-            active_conges = [c for c in all_conges if c.statut == 'Actif']
-            total_jours_pris = sum(c.jours_pris for c in active_conges)
-            
-            self.text_stats.insert(tk.END, f"{'Nombre total d\'agents':<25}: {nb_agents}\n")
-            self.text_stats.insert(tk.END, f"{'Total des jours de congés actifs':<25}: {total_jours_pris}\n\n")
-            self.text_stats.insert(tk.END, "Répartition par type de congé (actifs):\n")
-            
-            if active_conges:
-                for type_conge, count in Counter(c.type_conge for c in active_conges).most_common():
-                    self.text_stats.insert(tk.END, f"  - {type_conge:<22}: {count} ({(count / len(active_conges)) * 100:.1f}%)\n")
-        except sqlite3.Error as e:
-            self.text_stats.insert(tk.END, f"Erreur de lecture des statistiques: {e}")
-        finally:
-            self.text_stats.config(state=tk.DISABLED)
+    def _show_stats_error(self, error):
+        self.text_stats.config(state=tk.NORMAL)
+        self.text_stats.delete("1.0", tk.END)
+        self.text_stats.insert(tk.END, f"Erreur de lecture des statistiques: {error}")
+        self.text_stats.config(state=tk.DISABLED)
+        if self._stats_dirty: self.refresh_stats()
 
     def on_conge_double_click(self):
         conge_id = self.get_selected_conge_id()
@@ -291,8 +641,10 @@ class MainWindow(tk.Tk):
         item = self.list_conges.item(self.list_conges.selection()[0])
         conge_type = item["values"][2]
 
-        if conge_type == "Congé de maladie":
-            cert = self.db.get_certificat_for_conge(conge_id)
+        type_conge = self.db.get_type_conge(conge_type)
+        if type_conge and type_conge.certificat_requis:
+            parent = self.list_conges.parent(self.list_conges.selection()[0])
+            cert = self.db.get_certificat_for_conge(conge_id, int(parent.split("_")[1]) if parent.startswith("annee_") else None)
             if cert and cert[4] and os.path.exists(cert[4]):
                 try: os.startfile(os.path.realpath(cert[4]))
                 except Exception as e: messagebox.showerror("Erreur d'ouverture", f"Impossible d'ouvrir le fichier:\n{e}", parent=self)
@@ -302,14 +654,21 @@ class MainWindow(tk.Tk):
              self.modify_selected_conge()
 
     def search_agents(self):
-        self.current_page = 1; self.refresh_agents_list()
-    def on_agent_select(self, event=None):
+        self.current_page = 1
+        with self.ui_action(f"Recherche d'agents '{self.search_var.get()}'"): self.refresh_agents_list()
+    def on_agent_select(self, event=None, force=False):
         agent_id = self.get_selected_agent_id()
+        if agent_id == self._displayed_agent_id and not force: return
+        self._displayed_agent_id = agent_id
         if agent_id:
-            self.refresh_conges_list(agent_id)
+            with self.ui_action(f"Congés de l'agent {agent_id}"): self.refresh_conges_list(agent_id)
         else:
             self.list_conges.delete(*self.list_conges.get_children())
     def prev_page(self):
-        if self.current_page > 1: self.current_page -= 1; self.refresh_agents_list(self.get_selected_agent_id())
+        if self.current_page > 1:
+            self.current_page -= 1
+            with self.ui_action(f"Page {self.current_page} des agents"): self.refresh_agents_list(self.get_selected_agent_id())
     def next_page(self):
-        if self.current_page < self.total_pages: self.current_page += 1; self.refresh_agents_list(self.get_selected_agent_id())
\ No newline at end of file
+        if self.current_page < self.total_pages:
+            self.current_page += 1
+            with self.ui_action(f"Page {self.current_page} des agents"): self.refresh_agents_list(self.get_selected_agent_id())
\ No newline at end of file
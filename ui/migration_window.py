@@ -0,0 +1,64 @@
+# ui/migration_window.py
+import tkinter as tk
+from tkinter import ttk
+
+from db.database import DatabaseManager
+from db.migrations import migrate
+from utils.background import BackgroundTask
+
+
+class MigrationWindow(tk.Tk):
+    """
+    Fenêtre de démarrage affichée pendant les migrations longues (grosse base) : elles s'exécutent
+    dans un thread avec leur propre connexion, la fenêtre reste réactive et affiche la progression.
+    Les étapes sans avancement mesurable (VACUUM de la migration 003) animent la barre en continu.
+    """
+    def __init__(self, db_file, pending, title):
+        super().__init__()
+        self.db_file = db_file
+        self.descriptions = {f"{module.VERSION:03d}": module.DESCRIPTION for module in pending}
+        self.applied, self.error = [], None
+        self.title(title)
+        self.resizable(False, False)
+        self.protocol("WM_DELETE_WINDOW", lambda: None) # Une migration interrompue reprendrait, mais pas au milieu d'un VACUUM
+        frame = ttk.Frame(self, padding=15); frame.pack(fill=tk.BOTH, expand=True)
+        ttk.Label(frame, text="Mise à niveau de la base de données, veuillez patienter...", font=("Helvetica", 10, "bold")).pack(anchor="w")
+        self.step_var = tk.StringVar(value="Préparation...")
+        ttk.Label(frame, textvariable=self.step_var, width=60).pack(anchor="w", pady=(8, 4))
+        self.progressbar = ttk.Progressbar(frame, length=400, maximum=100)
+        self.progressbar.pack(fill=tk.X)
+        ttk.Label(frame, text="Pour les très grosses bases, la mise à niveau peut aussi être lancée\n"
+                              "application fermée : python migration_soldes.py", foreground="grey").pack(anchor="w", pady=(8, 0))
+
+    def run(self):
+        """Applique les migrations et renvoie les versions appliquées ; relève l'erreur de la migration en échec."""
+        BackgroundTask(self, self._migrate, on_done=self._on_done, on_error=self._on_error, on_progress=self._on_progress).start()
+        self.mainloop()
+        self.destroy()
+        if self.error: raise self.error
+        return self.applied
+
+    def _migrate(self, progress):
+        db = DatabaseManager(self.db_file) # Connexion propre au thread
+        if not db.connect(): raise RuntimeError(f"Connexion impossible à {self.db_file}")
+        try:
+            return migrate(db, progress=progress)
+        finally:
+            db.close()
+
+    def _on_progress(self, name, done, total):
+        self.step_var.set(f"{self.descriptions.get(name[:3], name)} : {done}/{total}" if total > 1 else self.descriptions.get(name[:3], name))
+        if total > 1 or done >= total:
+            self.progressbar.stop()
+            self.progressbar.config(mode="determinate", value=done * 100 / total if total else 100)
+        elif str(self.progressbar.cget("mode")) != "indeterminate":
+            self.progressbar.config(mode="indeterminate")
+            self.progressbar.start(15)
+
+    def _on_done(self, applied):
+        self.applied = applied
+        self.quit()
+
+    def _on_error(self, error):
+        self.error = error
+        self.quit()
@@ -0,0 +1,88 @@
+# ui/watchdog.py
+import logging
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class MainLoopWatchdog:
+    """
+    Surveille la réactivité de la boucle Tk. Un battement after() met à jour un horodatage ;
+    un thread de surveillance vérifie qu'il avance. Si la boucle est bloquée au-delà du seuil,
+    la pile du thread principal est capturée (sys._current_frames) avec l'action UI en cours.
+    Le blocage est journalisé (conges.log) quand la boucle reprend, avec sa durée totale.
+    """
+    MAX_STALLS = 100
+
+    def __init__(self, root, threshold_ms=500, interval_ms=100):
+        self.root = root
+        self.threshold = threshold_ms / 1000.0
+        self.interval_ms = interval_ms
+        self.stalls = []
+        self._main_thread_id = threading.get_ident()
+        self._actions = []
+        self._last_beat = time.monotonic()
+        self._current_stall = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._watch, name="MainLoopWatchdog", daemon=True)
+
+    def start(self):
+        self._last_beat = time.monotonic()
+        self.root.after(self.interval_ms, self._beat)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    @contextmanager
+    def action(self, name):
+        """Indique l'action UI en cours ; elle est associée aux blocages détectés pendant son exécution."""
+        self._actions.append(name)
+        try:
+            yield
+        finally:
+            self._actions.pop()
+
+    def current_action(self):
+        return " > ".join(self._actions) if self._actions else "(aucune action identifiée)"
+
+    def _beat(self):
+        now = time.monotonic()
+        with self._lock:
+            stall, self._current_stall = self._current_stall, None
+            last_beat, self._last_beat = self._last_beat, now
+        if stall is not None:
+            stall["duration"] = now - last_beat - self.interval_ms / 1000.0
+            self._record(stall)
+        if not self._stop.is_set():
+            self.root.after(self.interval_ms, self._beat)
+
+    def _watch(self):
+        poll = max(self.interval_ms / 2000.0, 0.02)
+        while not self._stop.wait(poll):
+            with self._lock:
+                lag = time.monotonic() - self._last_beat - self.interval_ms / 1000.0
+                if lag < self.threshold or self._current_stall is not None: continue
+                frame = sys._current_frames().get(self._main_thread_id)
+                self._current_stall = {
+                    "at": datetime.now(),
+                    "action": self.current_action(),
+                    "stack": "".join(traceback.format_stack(frame)) if frame else "(pile indisponible)",
+                    "duration": lag,
+                }
+
+    def _record(self, stall):
+        self.stalls.append(stall)
+        if len(self.stalls) > self.MAX_STALLS:
+            self.stalls.sort(key=lambda s: s["duration"], reverse=True)
+            del self.stalls[self.MAX_STALLS:]
+        logging.warning(f"Interface bloquée {stall['duration'] * 1000:.0f} ms pendant : {stall['action']}\n"
+                        f"Pile du thread principal au moment du blocage :\n{stall['stack']}")
+
+    def worst(self, n=20):
+        """Les n blocages les plus longs, du plus long au plus court."""
+        return sorted(self.stalls, key=lambda s: s["duration"], reverse=True)[:n]
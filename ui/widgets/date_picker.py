@@ -1,33 +1,63 @@
 # ui/widgets/date_picker.py
 import tkinter as tk
 from tkinter import ttk
-from tkcalendar import Calendar
-from datetime import datetime
 
 # Import des utilitaires nécessaires
-from utils.date_utils import get_holidays_set_for_period
-from utils.config_loader import CONFIG
+from utils.date_utils import get_holidays_dict_for_year, validate_date
 
 class DatePickerWindow(tk.Toplevel):
     """
-    Crée une fenêtre TopLevel avec un calendrier pour sélectionner une date.
+    Fenêtre TopLevel avec un calendrier pour sélectionner une date.
     Met en évidence les jours fériés pour les types de congés concernés.
+
+    Une seule instance est créée (voir show/prewarm) : elle est masquée au lieu
+    d'être détruite, et les jours fériés ne sont ajoutés au calendrier qu'une fois
+    par année affichée, à partir du cache partagé de utils.date_utils.
     """
-    def __init__(self, parent, entry_field, db_manager, conge_type=None):
-        super().__init__(parent)
-        self.entry_field = entry_field
+    _instance = None
+
+    @classmethod
+    def _get_instance(cls, master, db_manager):
+        if cls._instance is None or not cls._instance.winfo_exists():
+            cls._instance = cls(master._root(), db_manager)
+        return cls._instance
+
+    @classmethod
+    def prewarm(cls, master, db_manager):
+        """Construit la fenêtre (masquée) à l'avance pour que la première ouverture soit immédiate."""
+        picker = cls._get_instance(master, db_manager)
+        picker._load_holidays_for_displayed_month()
+
+    @classmethod
+    def show(cls, parent, entry_field, db_manager, conge_type=None):
+        """Affiche le sélecteur pour remplir entry_field, en réutilisant l'instance existante."""
+        picker = cls._get_instance(parent, db_manager)
+        picker._open(parent, entry_field, conge_type)
+        return picker
+
+    @classmethod
+    def invalidate_holidays(cls):
+        """Retire les jours fériés affichés ; ils seront rechargés depuis le cache à la prochaine ouverture."""
+        if cls._instance is not None and cls._instance.winfo_exists():
+            cls._instance.cal.calevent_remove(tag="holiday")
+            cls._instance._loaded_years.clear()
+
+    def __init__(self, master, db_manager):
+        super().__init__(master)
+        self.withdraw()
         self.db = db_manager
-        self.conge_type = conge_type
-        
+        self.parent = None
+        self.entry_field = None
+        self.conge_type = None
+        self._previous_grab = None
+        self._loaded_years = set()
+
         self.title("📅 Sélection de date")
         self.resizable(False, False)
-        self.transient(parent)
-        self.grab_set()
+        self.protocol("WM_DELETE_WINDOW", self._hide)
 
         self._setup_style()
-        self._load_holidays()
         self._create_widgets()
-        self._position_window(parent)
 
     def _setup_style(self):
         """Configure le style des widgets du calendrier."""
@@ -35,20 +65,21 @@ class DatePickerWindow(tk.Toplevel):
         style.theme_use('clam')
         style.configure('Calendar.TButton', font=('Helvetica', 10), padding=5)
 
-    def _load_holidays(self):
-        """Charge les jours fériés si le type de congé le requiert."""
-        self.holidays_dict = {}
-        types_decompte = CONFIG['conges']['types_decompte_solde']
-        
-        if self.conge_type in types_decompte:
-            year = datetime.now().year
-            # On charge les jours fériés pour l'année en cours, précédente et suivante
-            holidays_set = get_holidays_set_for_period(self.db, year - 1, year + 1)
-            for h_date in holidays_set:
-                self.holidays_dict[h_date] = "Jour Férié"
+    def _highlights_holidays(self):
+        type_conge = self.db.get_type_conge(self.conge_type) if self.conge_type else None
+        return bool(type_conge and type_conge.jours_ouvres)
+
+    def _load_holidays_for_displayed_month(self, event=None):
+        """Ajoute les événements 'holiday' de l'année affichée, si ce n'est pas déjà fait."""
+        _, year = self.cal.get_displayed_month()
+        if year in self._loaded_years: return
+        self._loaded_years.add(year)
+        for date_obj, name in get_holidays_dict_for_year(self.db, year).items():
+            self.cal.calevent_create(date_obj, name, "holiday")
 
     def _create_widgets(self):
         """Crée et configure le widget Calendrier et les boutons."""
+        from tkcalendar import Calendar # Import différé : la fenêtre est construite après le premier affichage
         self.cal = Calendar(
             self,
             selectmode='day',
@@ -61,57 +92,94 @@ class DatePickerWindow(tk.Toplevel):
             selectbackground='#306998'
         )
         self.cal.pack(padx=15, pady=15, fill='both', expand=True)
-
-        # Ajoute les événements pour les jours fériés avec un tag 'holiday'
-        for date_obj, name in self.holidays_dict.items():
-            self.cal.calevent_create(date_obj, name, "holiday")
-        
-        # Configure la couleur de fond pour le tag 'holiday'
-        self.cal.tag_config("holiday", background='#FFCCCB')
+        # Les jours fériés sont chargés à la demande, pour l'année du mois affiché
+        self.cal.bind("<<CalendarMonthChanged>>", self._load_holidays_for_displayed_month)
 
         btn_frame = ttk.Frame(self)
         btn_frame.pack(pady=(0, 10))
-        
+
         ttk.Button(
-            btn_frame, 
-            text="Valider", 
-            style='Calendar.TButton', 
+            btn_frame,
+            text="Valider",
+            style='Calendar.TButton',
             command=self._on_validate
         ).pack(side=tk.LEFT, padx=5)
-        
+
         ttk.Button(
-            btn_frame, 
-            text="Annuler", 
-            style='Calendar.TButton', 
-            command=self.destroy
+            btn_frame,
+            text="Annuler",
+            style='Calendar.TButton',
+            command=self._hide
         ).pack(side=tk.LEFT)
 
+    def _open(self, parent, entry_field, conge_type):
+        self.parent = parent
+        self.entry_field = entry_field
+        self.conge_type = conge_type
+
+        # La couleur du tag 'holiday' dépend du type de congé (les événements restent en place)
+        if self._highlights_holidays():
+            self.cal.tag_config("holiday", background='#FFCCCB', foreground='black')
+        else:
+            self.cal.tag_config("holiday", background='#F0F0F0', foreground='black')
+
+        current = validate_date(entry_field.get())
+        if current:
+            self.cal.selection_set(current)
+            self.cal.see(current)
+        self._load_holidays_for_displayed_month()
+
+        self.transient(parent)
+        self.deiconify()
+        self._position_window(parent)
+        self.lift()
+        self._previous_grab = self.grab_current()
+        self.after_idle(self._grab)
+
+    def _grab(self):
+        try:
+            self.grab_set()
+            self.focus_set()
+        except tk.TclError:
+            pass # Fenêtre pas encore visible ; la saisie reste possible sans grab
+
+    def _hide(self):
+        self.grab_release()
+        self.withdraw()
+        # On rend la main au formulaire modal qui nous a ouvert
+        if self._previous_grab is not None and self._previous_grab.winfo_exists():
+            try: self._previous_grab.grab_set()
+            except tk.TclError: pass
+        self._previous_grab = None
+        self.entry_field = None
+
     def _position_window(self, parent):
         """Centre la fenêtre du calendrier par rapport à sa fenêtre parente."""
         self.update_idletasks() # S'assure que les dimensions sont calculées
-        
+
         parent_x = parent.winfo_rootx()
         parent_y = parent.winfo_rooty()
         parent_width = parent.winfo_width()
         parent_height = parent.winfo_height()
-        
+
         self_width = self.winfo_width()
         self_height = self.winfo_height()
-        
+
         x = parent_x + (parent_width // 2) - (self_width // 2)
         y = parent_y + (parent_height // 2) - (self_height // 2)
-        
+
         self.geometry(f"+{x}+{y}")
 
     def _on_validate(self):
         """
-        Met à jour le champ de saisie avec la date sélectionnée, 
-        déclenche un événement virtuel et ferme la fenêtre.
+        Met à jour le champ de saisie avec la date sélectionnée,
+        déclenche un événement virtuel et masque la fenêtre.
         """
         selected_date = self.cal.selection_get()
-        if selected_date:
-            self.entry_field.delete(0, tk.END)
-            self.entry_field.insert(0, selected_date.strftime("%d/%m/%Y"))
+        entry_field = self.entry_field
+        self._hide()
+        if selected_date and entry_field is not None and entry_field.winfo_exists():
+            entry_field.delete(0, tk.END)
+            entry_field.insert(0, selected_date.strftime("%d/%m/%Y"))
             # Déclencher un événement virtuel pour que le formulaire sache qu'une date a été choisie
-            self.entry_field.event_generate("<<DatePicked>>")
-        self.destroy()
\ No newline at end of file
+            entry_field.event_generate("<<DatePicked>>")
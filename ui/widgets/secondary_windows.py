@@ -2,11 +2,15 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
-import holidays
+import sqlite3
+import time
 
 # Import des composants nécessaires
 from ui.widgets.date_picker import DatePickerWindow
 from utils.date_utils import validate_date, format_date_for_display
+from utils.file_utils import export_previsions_to_excel
+from utils.config_loader import CONFIG
+from utils.background import BackgroundTask
 
 class HolidaysManagerWindow(tk.Toplevel):
     """
@@ -72,7 +76,7 @@ class HolidaysManagerWindow(tk.Toplevel):
         ttk.Label(add_frame, text="Date:").grid(row=0, column=0, sticky="w", pady=2)
         self.date_entry = ttk.Entry(add_frame, width=15)
         self.date_entry.grid(row=0, column=1, padx=5)
-        ttk.Button(add_frame, text="📅", width=2, command=lambda: DatePickerWindow(self, self.date_entry, self.db)).grid(row=0, column=2)
+        ttk.Button(add_frame, text="📅", width=2, command=lambda: DatePickerWindow.show(self, self.date_entry, self.db)).grid(row=0, column=2)
         
         ttk.Label(add_frame, text="Description:").grid(row=1, column=0, sticky="w", pady=2)
         self.desc_entry = ttk.Entry(add_frame, width=30)
@@ -85,13 +89,11 @@ class HolidaysManagerWindow(tk.Toplevel):
             self.holidays_tree.delete(row)
         try:
             year = int(self.year_var.get())
-            # On s'assure que les jours fériés officiels sont dans la DB
-            auto_holidays = holidays.country_holidays('MA', years=year)
-            for date_obj, name in auto_holidays.items():
-                self.db.add_or_update_holiday(date_obj.strftime("%Y-%m-%d"), name, "Automatique")
+            # On s'assure que les jours fériés officiels sont dans la DB (sans écriture si l'année est à jour)
+            self.db.sync_official_holidays([year])
             
             # On affiche tous les jours (officiels et perso)
-            all_holidays = self.db.get_holidays_for_year(str(year))
+            all_holidays = self.db.get_holidays_for_year(year)
             for h_date, h_name, h_type in all_holidays:
                 self.holidays_tree.insert("", "end", values=(format_date_for_display(h_date), h_name, h_type))
         except (tk.TclError, ValueError):
@@ -148,49 +150,434 @@ class HolidaysManagerWindow(tk.Toplevel):
                 messagebox.showerror("Erreur BD", "La suppression a échoué.", parent=self)
 
     def restore_auto_holidays(self):
-        # ... (La logique de cette fonction reste la même que dans la version 2.1.1)
-        pass
+        """Réécrit les jours fériés officiels de l'année affichée (noms modifiés ou jours supprimés)."""
+        try:
+            year = int(self.year_var.get())
+        except ValueError:
+            return
+        try:
+            changed = self.db.sync_official_holidays([year], force=True)
+        except sqlite3.Error as e:
+            messagebox.showerror("Erreur BD", f"Impossible de restaurer les jours fériés: {e}", parent=self)
+            return
+        self.refresh_holidays_list()
+        messagebox.showinfo("Jours automatiques", f"{len(changed)} jour(s) férié(s) officiel(s) restauré(s) pour {year}.", parent=self)
 
 class JustificatifsWindow(tk.Toplevel):
     """
     Fenêtre Toplevel affichant la liste des congés maladie 
     pour lesquels un certificat médical est manquant.
+    La liste est paginée (pagination par clé) et relue seulement si la base a changé.
     """
-    def __init__(self, parent, db_manager):
+    PAGE_SIZE = 100
+    POLL_INTERVAL = 2000  # ms entre deux détections de changement
+
+    def __init__(self, parent, db_manager, store=None):
         super().__init__(parent)
         self.db = db_manager
+        self.store = store # CertificateStore, pour le contrôle des fichiers
+        self._scan_task = None
+        self._page_keys = [None] # Clé de départ de chaque page affichée
+        self._last_key = None
+        self._change_token = None
         
         self.title("Suivi des Justificatifs Médicaux Manquants")
         self.grab_set()
-        self.geometry("800x500")
+        self.geometry("900x600")
 
         self._create_widgets()
         self.refresh_list()
+        self.after(self.POLL_INTERVAL, self._poll_changes)
 
     def _create_widgets(self):
         main_frame = ttk.Frame(self, padding=10)
         main_frame.pack(fill="both", expand=True)
+
+        filter_frame = ttk.Frame(main_frame)
+        filter_frame.pack(fill="x", padx=5)
+        ttk.Label(filter_frame, text="En retard après").pack(side="left")
+        self.delai_var = tk.StringVar(value=str(CONFIG['conges'].get('certificat_delai_jours', 2)))
+        ttk.Spinbox(filter_frame, from_=0, to=365, textvariable=self.delai_var, width=5, command=self.reset_pages).pack(side="left", padx=5)
+        ttk.Label(filter_frame, text="jours").pack(side="left")
+        self.retard_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(filter_frame, text="Seulement les retards", variable=self.retard_var, command=self.reset_pages).pack(side="left", padx=15)
+        self.summary_label = ttk.Label(filter_frame, text="")
+        self.summary_label.pack(side="right")
+
+        panes = ttk.PanedWindow(main_frame, orient=tk.VERTICAL)
+        panes.pack(fill="both", expand=True, pady=5)
         
-        cols = ("Agent", "PPR", "Date Début", "Date Fin", "Jours Pris")
-        self.tree = ttk.Treeview(main_frame, columns=cols, show="headings", height=10)
+        cols = ("Agent", "PPR", "Date Début", "Date Fin", "Jours Pris", "Depuis (j)")
+        self.tree = ttk.Treeview(panes, columns=cols, show="headings", height=12)
         for col in cols:
             self.tree.heading(col, text=col)
             self.tree.column(col, width=120)
-        self.tree.pack(fill="both", expand=True, padx=5, pady=5)
-        
-        ttk.Button(main_frame, text="Actualiser", command=self.refresh_list).pack(pady=5)
+        self.tree.tag_configure("retard", foreground="red")
+        panes.add(self.tree, weight=3)
+
+        agent_cols = ("Agent", "PPR", "Manquants", "En retard", "Plus ancien")
+        self.agents_tree = ttk.Treeview(panes, columns=agent_cols, show="headings", height=6)
+        for col in agent_cols:
+            self.agents_tree.heading(col, text=col)
+            self.agents_tree.column(col, width=120)
+        panes.add(self.agents_tree, weight=1)
+
+        nav_frame = ttk.Frame(main_frame)
+        nav_frame.pack(fill="x")
+        self.prev_button = ttk.Button(nav_frame, text="◀ Précédent", command=self.prev_page)
+        self.prev_button.pack(side="left")
+        self.page_label = ttk.Label(nav_frame, text="Page 1")
+        self.page_label.pack(side="left", padx=10)
+        self.next_button = ttk.Button(nav_frame, text="Suivant ▶", command=self.next_page)
+        self.next_button.pack(side="left")
+        ttk.Button(nav_frame, text="Actualiser", command=self.refresh_list).pack(side="right")
+        if self.store is not None:
+            self.scan_button = ttk.Button(nav_frame, text="Contrôler les fichiers", command=self.scan_files)
+            self.scan_button.pack(side="right", padx=5)
+
+    def _delai(self):
+        try: return max(int(self.delai_var.get()), 0)
+        except ValueError: return CONFIG['conges'].get('certificat_delai_jours', 2)
+
+    def reset_pages(self):
+        self._page_keys = [None]
+        self.refresh_list()
+
+    def prev_page(self):
+        if len(self._page_keys) > 1:
+            self._page_keys.pop()
+            self.refresh_list()
+
+    def next_page(self):
+        if self._last_key is not None:
+            self._page_keys.append(self._last_key)
+            self.refresh_list()
 
     def refresh_list(self):
-        for row in self.tree.get_children():
-            self.tree.delete(row)
+        delai, retard_seulement = self._delai(), self.retard_var.get()
         try:
-            missing_certs = self.db.get_maladies_sans_certificat()
-            for row in missing_certs:
-                agent_nom = f"{row[0]} {row[1]}"
-                ppr = row[2]
-                debut = format_date_for_display(row[3])
-                fin = format_date_for_display(row[4])
-                jours = row[5]
-                self.tree.insert("", "end", values=(agent_nom, ppr, debut, fin, jours))
+            self._change_token = self.db.change_token()
+            rows = self.db.get_maladies_sans_certificat(delai, retard_seulement, limit=self.PAGE_SIZE + 1, apres=self._page_keys[-1])
+            total, en_retard = self.db.count_maladies_sans_certificat(delai)
+            par_agent = self.db.get_maladies_sans_certificat_par_agent(delai, retard_seulement)
         except sqlite3.Error as e:
-            messagebox.showerror("Erreur BD", f"Impossible de charger la liste : {e}", parent=self)
\ No newline at end of file
+            messagebox.showerror("Erreur BD", f"Impossible de charger la liste : {e}", parent=self)
+            return
+
+        has_next = len(rows) > self.PAGE_SIZE
+        rows = rows[:self.PAGE_SIZE]
+        self._last_key = (rows[-1][3], rows[-1][6]) if has_next else None
+        self.tree.delete(*self.tree.get_children())
+        for nom, prenom, ppr, debut, fin, jours, conge_id, _, ecoules, retard in rows:
+            self.tree.insert("", "end", iid=str(conge_id), values=(f"{nom} {prenom}", ppr, format_date_for_display(debut), format_date_for_display(fin), jours, ecoules),
+                             tags=("retard",) if retard else ())
+        self.agents_tree.delete(*self.agents_tree.get_children())
+        for agent_id, nom, prenom, ppr, nb, nb_retard, plus_ancien in par_agent:
+            self.agents_tree.insert("", "end", iid=str(agent_id), values=(f"{nom} {prenom}", ppr, nb, nb_retard, format_date_for_display(plus_ancien)))
+
+        self.summary_label.config(text=f"{total} certificat(s) manquant(s), dont {en_retard} en retard")
+        self.page_label.config(text=f"Page {len(self._page_keys)}")
+        self.prev_button.config(state="normal" if len(self._page_keys) > 1 else "disabled")
+        self.next_button.config(state="normal" if has_next else "disabled")
+
+    def scan_files(self):
+        """Compare le répertoire des certificats à la base, dans un thread de fond."""
+        if self._scan_task and self._scan_task.is_alive(): return
+        self.scan_button.config(state="disabled")
+        self.summary_label.config(text="Contrôle des fichiers en cours...")
+        self._scan_task = BackgroundTask(self, self.store.scan, self.db, on_done=self._show_scan_report, on_error=self._show_scan_error,
+                                         on_progress=lambda n: self.summary_label.config(text=f"Contrôle des fichiers : {n} fichier(s) lus...")).start()
+
+    def _show_scan_report(self, report):
+        self.scan_button.config(state="normal")
+        self.refresh_list()
+        orphelins, manquants = report["orphelins"], report["manquants"]
+        mo = lambda size: f"{size / (1024 * 1024):.1f} Mo"
+        summary = (f"Fichiers dans le répertoire : {report['nb_fichiers']} ({mo(report['taille_totale'])})\n"
+                   f"Certificats enregistrés : {report['nb_references']}\n\n"
+                   f"- Fichiers orphelins : {len(orphelins)} ({mo(report['taille_orphelins'])})\n"
+                   f"- Certificats dont le fichier est introuvable : {len(manquants)}")
+        if report["ignores_recents"]:
+            summary += f"\n- Fichiers récents non contrôlés (copie en cours ?) : {report['ignores_recents']}"
+        if manquants:
+            summary += "\n\nCongés concernés (premiers 5) : " + ", ".join(str(conge_id) for conge_id, _ in manquants[:5])
+        if orphelins and messagebox.askyesno("Contrôle des certificats", summary + "\n\nMettre les fichiers orphelins en quarantaine ?", parent=self):
+            moved = self.store.quarantine((path for path, _ in orphelins), self.db)
+            messagebox.showinfo("Contrôle des certificats", f"{moved} fichier(s) déplacé(s) en quarantaine.", parent=self)
+        elif not orphelins:
+            messagebox.showinfo("Contrôle des certificats", summary, parent=self)
+
+    def _show_scan_error(self, error):
+        self.scan_button.config(state="normal")
+        self.refresh_list()
+        messagebox.showerror("Contrôle des certificats", f"Le contrôle a échoué : {error}", parent=self)
+
+    def _poll_changes(self):
+        """Relit la page courante seulement si une écriture a eu lieu depuis le dernier chargement."""
+        if not self.winfo_exists(): return
+        try:
+            if self.db.change_token() != self._change_token: self.refresh_list()
+        except sqlite3.Error:
+            pass
+        self.after(self.POLL_INTERVAL, self._poll_changes)
+
+class StallReportWindow(tk.Toplevel):
+    """
+    Fenêtre Toplevel listant les blocages de l'interface détectés par le MainLoopWatchdog,
+    du plus long au plus court, avec la pile capturée pour le blocage sélectionné.
+    """
+    def __init__(self, parent, watchdog):
+        super().__init__(parent)
+        self.watchdog = watchdog
+
+        self.title("Diagnostic : blocages de l'interface")
+        self.geometry("900x550")
+
+        self._create_widgets()
+        self.refresh_list()
+
+    def _create_widgets(self):
+        main_frame = ttk.Frame(self, padding=10)
+        main_frame.pack(fill="both", expand=True)
+
+        cols = ("Durée (ms)", "Heure", "Action")
+        self.tree = ttk.Treeview(main_frame, columns=cols, show="headings", height=10)
+        self.tree.column("Durée (ms)", width=90, anchor="center")
+        self.tree.column("Heure", width=150, anchor="center")
+        self.tree.column("Action", width=550)
+        for col in cols:
+            self.tree.heading(col, text=col)
+        self.tree.pack(fill="x", padx=5, pady=5)
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+
+        self.stack_text = tk.Text(main_frame, wrap=tk.NONE, font=('Courier New', 9), height=15)
+        self.stack_text.pack(fill="both", expand=True, padx=5, pady=5)
+        self.stack_text.config(state=tk.DISABLED)
+
+        ttk.Button(main_frame, text="Actualiser", command=self.refresh_list).pack(pady=5)
+
+    def refresh_list(self):
+        self.tree.delete(*self.tree.get_children())
+        self._stalls = self.watchdog.worst()
+        for i, stall in enumerate(self._stalls):
+            self.tree.insert("", "end", iid=str(i), values=(f"{stall['duration'] * 1000:.0f}", stall['at'].strftime("%d/%m/%Y %H:%M:%S"), stall['action']))
+        if not self._stalls:
+            self._show_stack("Aucun blocage détecté depuis le lancement.")
+
+    def _on_select(self, event=None):
+        selection = self.tree.selection()
+        if selection:
+            self._show_stack(self._stalls[int(selection[0])]['stack'])
+
+    def _show_stack(self, text):
+        self.stack_text.config(state=tk.NORMAL)
+        self.stack_text.delete("1.0", tk.END)
+        self.stack_text.insert(tk.END, text)
+        self.stack_text.config(state=tk.DISABLED)
+
+class PrevisionSoldesWindow(tk.Toplevel):
+    """
+    Fenêtre Toplevel de prévision des soldes de tous les agents à une date donnée
+    (calcul vectorisé en fond, voir core/conges/previsions.py). Le tri par colonne se fait
+    sur les tableaux de la prévision ; seule la page affichée est insérée dans la liste.
+    """
+    PAGE_SIZE = 200
+    # Colonne affichée -> colonne de BalanceForecast
+    COLUMNS = {"Nom": "nom", "Prénom": "prenom", "PPR": "ppr", "Grade": "grade", "Solde actuel": "solde",
+               "Congés à venir": "a_venir", "Acquisitions": "acquis", "Solde prévu": "prevu", "Après la date": "apres"}
+
+    def __init__(self, parent, manager):
+        super().__init__(parent)
+        self.manager = manager
+        self.db = manager.db
+        self.forecast = None
+        self._order = None
+        self._sort = ("nom", False)
+        self._page = 0
+        self._task = None
+
+        self.title("Prévision des soldes")
+        self.geometry("1000x600")
+
+        self._create_widgets()
+        self.compute()
+
+    def _create_widgets(self):
+        main_frame = ttk.Frame(self, padding=10)
+        main_frame.pack(fill="both", expand=True)
+
+        top_frame = ttk.Frame(main_frame)
+        top_frame.pack(fill="x", padx=5)
+        ttk.Label(top_frame, text="Solde prévu au (JJ/MM/AAAA) :").pack(side="left")
+        self.date_var = tk.StringVar(value=f"31/12/{datetime.now().year}")
+        date_entry = ttk.Entry(top_frame, textvariable=self.date_var, width=12)
+        date_entry.pack(side="left", padx=5)
+        date_entry.bind("<Return>", lambda e: self.compute())
+        self.compute_button = ttk.Button(top_frame, text="Calculer", command=self.compute)
+        self.compute_button.pack(side="left")
+        self.summary_label = ttk.Label(top_frame, text="")
+        self.summary_label.pack(side="right")
+
+        cols = tuple(self.COLUMNS)
+        self.tree = ttk.Treeview(main_frame, columns=cols, show="headings", height=20)
+        for col in cols:
+            self.tree.heading(col, text=col, command=lambda c=col: self.sort_by(self.COLUMNS[c]))
+            self.tree.column(col, width=100, anchor="w" if self.COLUMNS[col] in ("nom", "prenom", "grade") else "center")
+        self.tree.tag_configure("negatif", foreground="red")
+        self.tree.pack(fill="both", expand=True, pady=5)
+
+        nav_frame = ttk.Frame(main_frame)
+        nav_frame.pack(fill="x")
+        self.prev_button = ttk.Button(nav_frame, text="◀ Précédent", command=lambda: self._show_page(self._page - 1))
+        self.prev_button.pack(side="left")
+        self.page_label = ttk.Label(nav_frame, text="Page 1")
+        self.page_label.pack(side="left", padx=10)
+        self.next_button = ttk.Button(nav_frame, text="Suivant ▶", command=lambda: self._show_page(self._page + 1))
+        self.next_button.pack(side="left")
+        ttk.Button(nav_frame, text="Exporter (Excel)", command=self.export).pack(side="right")
+
+    def compute(self):
+        """Calcule la prévision dans un thread de fond (connexion de lecture dédiée)."""
+        if self._task and self._task.is_alive(): return
+        target = validate_date(self.date_var.get())
+        if not target:
+            messagebox.showwarning("Date invalide", "Veuillez saisir une date au format JJ/MM/AAAA.", parent=self); return
+        self.compute_button.config(state="disabled")
+        self.summary_label.config(text="Calcul en cours...")
+        self._task = BackgroundTask(self, self._load, target.date(), self.db.change_token(), on_done=self._show_forecast, on_error=self._show_error).start()
+
+    def _load(self, target, token):
+        started = time.perf_counter()
+        conn = self.db.open_reader_connection()
+        try:
+            return self.manager.forecast_soldes(target, conn, token), time.perf_counter() - started
+        finally:
+            conn.close()
+
+    def _show_forecast(self, result):
+        self.forecast, duration = result
+        self.compute_button.config(state="normal")
+        self.summary_label.config(text=f"{len(self.forecast)} agent(s), solde prévu total {self.forecast.prevu.sum():.1f} j ({duration * 1000:.0f} ms)")
+        self.sort_by(*self._sort, toggle=False)
+
+    def _show_error(self, error):
+        self.compute_button.config(state="normal")
+        self.summary_label.config(text="")
+        messagebox.showerror("Prévision des soldes", f"Calcul impossible : {error}", parent=self)
+
+    def sort_by(self, column, reverse=None, toggle=True):
+        """Trie toute la prévision sur une colonne (un second clic inverse l'ordre) et revient à la première page."""
+        if reverse is None:
+            reverse = not self._sort[1] if toggle and self._sort[0] == column else False
+        self._sort = (column, reverse)
+        if self.forecast is None: return
+        self._order = self.forecast.order(column, reverse)
+        self._show_page(0)
+
+    def _show_page(self, page):
+        if self.forecast is None: return
+        pages = max((len(self.forecast) + self.PAGE_SIZE - 1) // self.PAGE_SIZE, 1)
+        self._page = min(max(page, 0), pages - 1)
+        self.tree.delete(*self.tree.get_children())
+        for row in self.forecast.rows(self._order[self._page * self.PAGE_SIZE:(self._page + 1) * self.PAGE_SIZE]):
+            agent_id, nom, prenom, ppr, grade, solde, a_venir, acquis, prevu, apres = row
+            self.tree.insert("", "end", iid=str(agent_id), values=(nom, prenom or "", ppr or "", grade or "", f"{solde:.1f}", f"{a_venir:.1f}",
+                                                                    f"{acquis:.1f}", f"{prevu:.1f}", f"{apres:.1f}"), tags=("negatif",) if prevu < 0 else ())
+        self.page_label.config(text=f"Page {self._page + 1} / {pages}")
+        self.prev_button.config(state="normal" if self._page > 0 else "disabled")
+        self.next_button.config(state="normal" if self._page < pages - 1 else "disabled")
+
+    def export(self):
+        if self.forecast is None: return
+        export_previsions_to_excel(self, self.forecast, self._order)
+
+
+class DoublonsWindow(tk.Toplevel):
+    """
+    Fenêtre Toplevel d'audit des doublons probables parmi tous les agents
+    (recherche par blocs en fond, voir core/doublons.py), du plus sûr au moins sûr.
+    """
+    PAGE_SIZE = 200
+
+    def __init__(self, parent, db_manager):
+        super().__init__(parent)
+        self.db = db_manager
+        self.results = []
+        self._page = 0
+        self._task = None
+
+        self.title("Doublons probables")
+        self.geometry("1000x600")
+
+        self._create_widgets()
+        self.audit()
+
+    def _create_widgets(self):
+        main_frame = ttk.Frame(self, padding=10)
+        main_frame.pack(fill="both", expand=True)
+
+        top_frame = ttk.Frame(main_frame)
+        top_frame.pack(fill="x", padx=5)
+        self.audit_button = ttk.Button(top_frame, text="Relancer l'audit", command=self.audit)
+        self.audit_button.pack(side="left")
+        self.summary_label = ttk.Label(top_frame, text="")
+        self.summary_label.pack(side="right")
+
+        cols = ("Score", "Agent A", "PPR A", "Agent B", "PPR B", "Raison")
+        self.tree = ttk.Treeview(main_frame, columns=cols, show="headings", height=20)
+        for col, width in zip(cols, (60, 220, 100, 220, 100, 200)):
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=width, anchor="center" if col in ("Score", "PPR A", "PPR B") else "w")
+        self.tree.pack(fill="both", expand=True, pady=5)
+
+        nav_frame = ttk.Frame(main_frame)
+        nav_frame.pack(fill="x")
+        self.prev_button = ttk.Button(nav_frame, text="◀ Précédent", command=lambda: self._show_page(self._page - 1))
+        self.prev_button.pack(side="left")
+        self.page_label = ttk.Label(nav_frame, text="Page 1")
+        self.page_label.pack(side="left", padx=10)
+        self.next_button = ttk.Button(nav_frame, text="Suivant ▶", command=lambda: self._show_page(self._page + 1))
+        self.next_button.pack(side="left")
+
+    def audit(self):
+        """Lance l'audit dans un thread de fond (connexion de lecture dédiée)."""
+        if self._task and self._task.is_alive(): return
+        self.audit_button.config(state="disabled")
+        self.summary_label.config(text="Audit en cours...")
+        self._task = BackgroundTask(self, self._load, on_done=self._show_results, on_error=self._show_error,
+                                    on_progress=self._show_progress).start()
+
+    def _load(self, progress):
+        from core.doublons import DuplicateDetector
+        started = time.perf_counter()
+        conn = self.db.open_reader_connection()
+        try:
+            rows = self.db.get_agents_rows(conn)
+        finally:
+            conn.close()
+        return DuplicateDetector.from_config().index(rows).audit(progress), len(rows), time.perf_counter() - started
+
+    def _show_progress(self, done, total):
+        self.summary_label.config(text=f"Audit en cours... {done}/{total} bloc(s)")
+
+    def _show_results(self, result):
+        self.results, nb_agents, duration = result
+        self.audit_button.config(state="normal")
+        self.summary_label.config(text=f"{len(self.results)} doublon(s) probable(s) parmi {nb_agents} agent(s) ({duration:.1f} s)")
+        self._show_page(0)
+
+    def _show_error(self, error):
+        self.audit_button.config(state="normal")
+        self.summary_label.config(text="")
+        messagebox.showerror("Doublons probables", f"Audit impossible : {error}", parent=self)
+
+    def _show_page(self, page):
+        pages = max((len(self.results) + self.PAGE_SIZE - 1) // self.PAGE_SIZE, 1)
+        self._page = min(max(page, 0), pages - 1)
+        self.tree.delete(*self.tree.get_children())
+        for score, a, b, raison in self.results[self._page * self.PAGE_SIZE:(self._page + 1) * self.PAGE_SIZE]:
+            self.tree.insert("", "end", values=(f"{score:.0%}", f"{a[1]} {a[2] or ''} (n°{a[0]})", a[3] or "",
+                                                f"{b[1]} {b[2] or ''} (n°{b[0]})", b[3] or "", raison))
+        self.page_label.config(text=f"Page {self._page + 1} / {pages}")
+        self.prev_button.config(state="normal" if self._page > 0 else "disabled")
+        self.next_button.config(state="normal" if self._page < pages - 1 else "disabled")
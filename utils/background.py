@@ -0,0 +1,67 @@
+# utils/background.py
+import logging
+import queue
+import threading
+
+
+class BackgroundTask:
+    """
+    Exécute une fonction dans un thread et rapporte son résultat (ou sa progression)
+    dans la boucle Tk, par scrutation d'une file avec after(). Tkinter n'étant pas
+    thread-safe, les callbacks on_done/on_error/on_progress sont toujours appelés
+    dans le thread principal.
+
+    Si on_progress est fourni, la fonction reçoit un argument nommé `progress`
+    qu'elle peut appeler avec n'importe quelles valeurs.
+    """
+    POLL_INTERVAL = 50  # ms
+
+    def __init__(self, widget, func, *args, on_done=None, on_error=None, on_progress=None, **kwargs):
+        self.widget = widget
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        if on_progress:
+            self.kwargs['progress'] = self.report_progress
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"BackgroundTask-{getattr(func, '__name__', 'task')}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        self.widget.after(self.POLL_INTERVAL, self._poll)
+        return self
+
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    def report_progress(self, *values):
+        self._queue.put(("progress", values))
+
+    def _run(self):
+        try:
+            self._queue.put(("done", self.func(*self.args, **self.kwargs)))
+        except Exception as e:
+            logging.error(f"Erreur dans la tâche de fond {self._thread.name}: {e}", exc_info=True)
+            self._queue.put(("error", e))
+
+    def _poll(self):
+        try:
+            while True:
+                kind, payload = self._queue.get_nowait()
+                if kind == "progress":
+                    if self.on_progress: self.on_progress(*payload)
+                elif kind == "done":
+                    if self.on_done: self.on_done(payload)
+                    return
+                else:
+                    if self.on_error: self.on_error(payload)
+                    return
+        except queue.Empty:
+            pass
+        try:
+            self.widget.after(self.POLL_INTERVAL, self._poll)
+        except Exception:
+            pass # Fenêtre détruite entre-temps : le résultat est abandonné
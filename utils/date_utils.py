@@ -1,7 +1,6 @@
 # utils/date_utils.py
 from datetime import datetime, timedelta, date
 from dateutil import parser
-import holidays
 import sqlite3
 import logging
 from utils.config_loader import CONFIG
@@ -17,25 +16,53 @@ def format_date_for_display(date_str_sql):
 def validate_date(date_str, dayfirst=True):
     """Valide et convertit une chaîne de caractères en objet datetime."""
     if not date_str: return None
+    if isinstance(date_str, datetime): return date_str
+    try:
+        # Format SQL (AAAA-MM-JJ) : lecture directe, sans ambiguïté jour/mois avec dayfirst
+        return datetime.strptime(date_str[:10], '%Y-%m-%d')
+    except (ValueError, TypeError):
+        pass
     try:
         return parser.parse(date_str, dayfirst=dayfirst)
     except (ValueError, TypeError):
         return None
 
+# Cache partagé des jours fériés (officiels et personnalisés) : année -> {date: nom}.
+# Vidé par invalidate_holidays_cache() lorsque les jours fériés personnalisés changent.
+_HOLIDAYS_CACHE = {}
+
+def get_holidays_dict_for_year(db_manager, year):
+    """Retourne les jours fériés d'une année sous forme {date: nom}, depuis le cache si possible."""
+    year = int(year)
+    cached = _HOLIDAYS_CACHE.get(year)
+    if cached is not None:
+        return cached
+    import holidays # Chargé au premier besoin : l'import de la bibliothèque est lent
+    year_h = dict(holidays.country_holidays(CONFIG['conges']['holidays_country'], years=year))
+    if not (db_manager and db_manager.conn):
+        return year_h # Pas de mise en cache sans les jours personnalisés
+    try:
+        for date_str, name, type in db_manager.get_holidays_for_year(str(year)):
+            year_h[validate_date(date_str).date()] = name
+    except sqlite3.Error as e:
+        logging.error(f"Erreur lors du chargement des jours fériés pour l'année {year}: {e}")
+        return year_h
+    _HOLIDAYS_CACHE[year] = year_h
+    return year_h
+
+def invalidate_holidays_cache(years=None):
+    """Oublie les jours fériés mis en cache (toutes les années si years est None)."""
+    if years is None:
+        _HOLIDAYS_CACHE.clear()
+    else:
+        for year in years: _HOLIDAYS_CACHE.pop(int(year), None)
+
 def get_holidays_set_for_period(db_manager, start_year, end_year):
     """Charge les jours fériés (officiels et personnalisés) pour une période donnée."""
-    country_code = CONFIG['conges']['holidays_country']
-    all_h = {}
+    all_h = set()
     for year in range(start_year, end_year + 2): # Prévoir une marge
-        all_h.update(holidays.country_holidays(country_code, years=year))
-        try:
-            if db_manager and db_manager.conn:
-                db_h = db_manager.get_holidays_for_year(str(year))
-                for date_str, name, type in db_h:
-                    all_h[validate_date(date_str).date()] = name
-        except sqlite3.Error as e:
-            logging.error(f"Erreur lors du chargement des jours fériés pour l'année {year}: {e}")
-    return set(all_h.keys())
+        all_h.update(get_holidays_dict_for_year(db_manager, year))
+    return all_h
 
 def jours_ouvres(date_debut, date_fin, holidays_set):
     """Calcule le nombre de jours ouvrés entre deux dates, en excluant les jours fériés."""
@@ -1,16 +1,19 @@
 # utils/file_utils.py
 import tkinter as tk
 from tkinter import filedialog, messagebox
-import openpyxl
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Font
 from datetime import datetime
 import sqlite3
 from utils.config_loader import CONFIG
 from utils.date_utils import format_date_for_display
 
+# openpyxl est importé dans chaque fonction : son chargement est coûteux et il
+# n'est utile qu'au moment d'un import ou d'un export.
+
 def export_agents_to_excel(main_window, db_manager):
     """Exporte la liste complète des agents vers un fichier Excel."""
+    import openpyxl
+    from openpyxl.utils import get_column_letter
+    from openpyxl.styles import Font
     main_window.config(cursor="watch")
     main_window.update_idletasks()
     main_window.set_status("Exportation des agents en cours...")
@@ -58,13 +61,18 @@ def export_agents_to_excel(main_window, db_manager):
 
 def export_all_conges_to_excel(main_window, db_manager):
     """Exporte la liste complète de tous les congés vers un fichier Excel."""
+    import openpyxl
+    from openpyxl.utils import get_column_letter
+    from openpyxl.styles import Font
     main_window.config(cursor="watch")
     main_window.update_idletasks()
     main_window.set_status("Exportation totale en cours...")
     
     try:
-        conges = db_manager.get_conges()
-        agents_cache = {agent.id: agent for agent in db_manager.get_agents()} # Cache pour éviter les requêtes répétées
+        # Chaînes de division compactées comprises (statut « Compacté »), à leur place chronologique
+        conges = sorted(db_manager.get_conges() + [c for _, c in db_manager.get_historique_compacte()], key=lambda c: c.date_debut, reverse=True)
+        # Seuls les agents concernés sont lus ; les autres viennent du cache du DatabaseManager
+        agents_cache = db_manager.get_agents_by_ids({c.agent_id for c in conges} | {c.interim_id for c in conges if c.interim_id})
 
         if not conges:
             messagebox.showinfo("Information", "Aucun congé à exporter.")
@@ -117,7 +125,13 @@ def export_all_conges_to_excel(main_window, db_manager):
         main_window.set_status("Prêt.")
 
 def import_agents_from_excel(main_window, db_manager):
-    """Importe des agents depuis un fichier Excel. Seuls le nom et le prénom sont obligatoires."""
+    """
+    Importe des agents depuis un fichier Excel. Seuls le nom et le prénom sont obligatoires.
+    Un agent dont le PPR n'est pas connu est comparé aux agents existants (et aux lignes déjà lues) :
+    les doublons probables (PPR manquant ou à une faute près, nom proche) sont soumis à confirmation.
+    """
+    import openpyxl
+    from core.doublons import DuplicateDetector
     filename = filedialog.askopenfilename(
         title="Sélectionner un fichier Excel à importer",
         filetypes=[("Fichiers Excel", "*.xlsx")]
@@ -144,9 +158,11 @@ def import_agents_from_excel(main_window, db_manager):
             raise ValueError(f"Le fichier Excel doit contenir au minimum les colonnes : {', '.join(agent_import_headers_obligatoires)}")
 
         col_map = {name: i for i, name in enumerate(header)}
-        added_count, updated_count, error_count = 0, 0, 0
+        added_count, updated_count, error_count, skipped_count = 0, 0, 0, 0
+        detector = DuplicateDetector.from_config().index(db_manager.get_agents_rows())
+        operations, suspects = [], [] # (ligne, agent existant, nom, prénom, ppr, grade, solde) ; suspects : + doublon le plus probable
         
-        db_manager.conn.execute('BEGIN TRANSACTION')
+        # Première passe : lecture et contrôles, rien n'est encore écrit
         for i, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
             try:
                 if all(c is None for c in row): continue
@@ -173,7 +189,45 @@ def import_agents_from_excel(main_window, db_manager):
 
                 agent = db_manager.get_agent_by_ppr(ppr)
                 if agent:
-                    if not db_manager.modifier_agent(agent[0], nom, prenom, ppr, grade, solde):
+                    operations.append((i, agent, nom, prenom, ppr, grade, solde))
+                    continue
+                # Agent inconnu : doublon probable d'un agent existant ou d'une ligne déjà lue ?
+                matches = detector.find(nom, prenom, ppr, limit=1)
+                if matches:
+                    suspects.append((i, None, nom, prenom, ppr, grade, solde, matches[0]))
+                else:
+                    operations.append((i, None, nom, prenom, ppr, grade, solde))
+                detector.add((None, nom, prenom, ppr, grade, solde))
+            except (ValueError, TypeError, IndexError) as ve:
+                errors.append(f"Ligne {i}: {ve}"); error_count += 1
+        
+        if error_count > 0:
+            raise Exception("Des erreurs ont été détectées. L'importation est annulée.")
+
+        if suspects:
+            details = []
+            for i, _, nom, prenom, ppr, _, _, (score, match, raison) in suspects[:10]:
+                existing = f"agent n°{match[0]}" if match[0] is not None else "ligne du fichier"
+                details.append(f"Ligne {i} : {nom} {prenom} ({ppr or 'sans PPR'}) ≈ {existing} {match[1]} {match[2]} "
+                               f"({match[3] or 'sans PPR'}) - {raison}, {score:.0%}")
+            if len(suspects) > 10: details.append(f"... et {len(suspects) - 10} autre(s).")
+            answer = messagebox.askyesnocancel("Doublons probables",
+                f"{len(suspects)} agent(s) du fichier ressemblent à des agents existants :\n\n" + "\n".join(details) +
+                "\n\nOui : les ajouter quand même\nNon : les ignorer\nAnnuler : annuler l'importation")
+            if answer is None:
+                messagebox.showinfo("Rapport d'importation", "Importation annulée. Aucune modification n'a été enregistrée.")
+                return
+            if answer:
+                operations = sorted(operations + [s[:7] for s in suspects], key=lambda op: op[0])
+            else:
+                skipped_count = len(suspects)
+
+        # Seconde passe : écriture
+        db_manager.conn.execute('BEGIN TRANSACTION')
+        for i, agent, nom, prenom, ppr, grade, solde in operations:
+            try:
+                if agent:
+                    if not db_manager.modifier_agent(agent.id, nom, prenom, ppr, grade, solde):
                         raise sqlite3.Error(f"Erreur de mise à jour pour PPR {ppr}.")
                     updated_count += 1
                 else:
@@ -181,20 +235,20 @@ def import_agents_from_excel(main_window, db_manager):
                         # Si l'ajout échoue (par exemple, PPR déjà pris par un autre agent), on le signale.
                         raise sqlite3.Error(f"Erreur d'ajout pour {nom} {prenom} (PPR: {ppr}). Le PPR est peut-être déjà utilisé.")
                     added_count += 1
-            except (ValueError, TypeError, IndexError) as ve:
-                errors.append(f"Ligne {i}: {ve}"); error_count += 1
             except Exception as e:
                 errors.append(f"Ligne {i}: Erreur BD - {e}"); error_count += 1
         
         if error_count > 0:
             raise Exception("Des erreurs ont été détectées. L'importation est annulée.")
         
-        db_manager.conn.commit()
+        db_manager.commit()
         summary = f"Importation réussie !\n\n- Agents ajoutés : {added_count}\n- Agents mis à jour : {updated_count}"
+        if skipped_count:
+            summary += f"\n- Doublons probables ignorés : {skipped_count}"
         messagebox.showinfo("Rapport d'importation", summary)
     except Exception as e:
         if db_manager.conn.in_transaction:
-            db_manager.conn.rollback()
+            db_manager.rollback()
         summary = f"Échec de l'importation: {e}\n\nAucune modification n'a été enregistrée."
         if errors:
             summary += "\n\nDétail des erreurs (premières 5):\n" + "\n".join(errors[:5])
@@ -202,4 +256,43 @@ def import_agents_from_excel(main_window, db_manager):
     finally:
         main_window.config(cursor="")
         main_window.set_status("Prêt.")
-        main_window.refresh_all()
\ No newline at end of file
+
+def export_previsions_to_excel(window, forecast, order=None):
+    """Exporte les soldes prévus (BalanceForecast), dans l'ordre affiché, vers un fichier Excel."""
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    if not len(forecast):
+        messagebox.showinfo("Information", "Aucune prévision à exporter.", parent=window)
+        return
+    filename = filedialog.asksaveasfilename(
+        defaultextension=".xlsx",
+        filetypes=[("Fichiers Excel", "*.xlsx")],
+        title="Exporter la prévision des soldes",
+        initialfile=f"Prevision_Soldes_{forecast.target.strftime('%Y-%m-%d')}.xlsx",
+        parent=window
+    )
+    if not filename: return
+
+    window.config(cursor="watch")
+    window.update_idletasks()
+    try:
+        # Mode écriture seule : lignes écrites au fil de l'eau (plusieurs dizaines de milliers d'agents)
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("Prévision des soldes")
+        for column, width in zip("ABCDEFGHI", (18, 18, 14, 20, 12, 14, 12, 12, 14)):
+            ws.column_dimensions[column].width = width
+        ws.append([f"Soldes prévus au {forecast.target.strftime('%d/%m/%Y')} (calculés le {forecast.today.strftime('%d/%m/%Y')})"])
+        header_font = Font(bold=True)
+        headers = []
+        for header in ["Nom", "Prénom", "PPR", "Grade", "Solde actuel", "Congés à venir", "Acquisitions", "Solde prévu", "Congés après la date"]:
+            cell = WriteOnlyCell(ws, value=header); cell.font = header_font; headers.append(cell)
+        ws.append(headers)
+        for agent_id, nom, prenom, ppr, grade, solde, a_venir, acquis, prevu, apres in forecast.rows(order):
+            ws.append([nom, prenom, ppr, grade, round(solde, 2), round(a_venir, 2), round(acquis, 2), round(prevu, 2), round(apres, 2)])
+        wb.save(filename)
+        messagebox.showinfo("Succès", f"Prévision des soldes exportée avec succès vers\n{filename}", parent=window)
+    except Exception as e:
+        messagebox.showerror("Erreur d'écriture", f"Impossible de sauvegarder le fichier : {e}", parent=window)
+    finally:
+        window.config(cursor="")